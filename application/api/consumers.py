@@ -1,8 +1,15 @@
 # this is for websocket handling
 from channels.generic.websocket import AsyncWebsocketConsumer
 import json
-from .models import StudySession
 from asgiref.sync import sync_to_async
+from .realtime.presence import presence, username_from_token
+from .realtime.roster import roster_cache
+from .realtime.room_activity import room_activity
+from .realtime.typing import typing_coalescer
+from .realtime.batching import (OutboundBatcher, batching_from_query_string, batching_limits,
+                                outbound_stats)
+from .realtime.broadcast import group_broadcast
+from .realtime.encoders import decode_frame, decode_msgpack_frame, msgpack_subscribers, negotiate_codec
 
 class RoomConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
@@ -11,6 +18,18 @@ class RoomConsumer(AsyncWebsocketConsumer):
         self.room_code = None
         self.username = None
         self.list_id = None
+        # senders this socket has sent typing messages for
+        self.typing_senders = set()
+        # set when the client opted in to batched outbound frames
+        self.batcher = None
+        # wire format, JSON unless the client offered the msgpack subprotocol
+        self.codec = None
+        # whether this socket is counted in room_activity
+        self.counted = False
+        # whether this socket is counted in msgpack_subscribers
+        self.msgpack_counted = False
+        # whether this socket is registered in presence
+        self.registered = False
 
     # Methods for joining and leaving the study room
 
@@ -20,54 +39,123 @@ class RoomConsumer(AsyncWebsocketConsumer):
         # Create a name to refer to the room
         self.room_group_name = f"room_{self.room_code}"
 
+        # Clients can ask for batched frames with ?batch=1
+        limits = batching_from_query_string(self.scope.get("query_string", b""))
+        if limits:
+            self.batcher = OutboundBatcher(self.send_frame, *limits)
+
         # Add the user to the room's group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+        self.codec, subprotocol = negotiate_codec(self.scope.get("subprotocols"))
+        await self.accept(subprotocol)
+        # Broadcasts to the room now carry a MessagePack copy too
+        if self.codec.binary:
+            msgpack_subscribers.opened(self.room_code)
+            self.msgpack_counted = True
+
+        # The room isn't reaped while it has sockets (see api/realtime/room_activity.py)
+        room_activity.opened(self.room_code)
+        self.counted = True
+
+        # Register the socket, a participant who was away goes back on the roster
+        self.username = await self.identify()
+        first = presence.connect(self.room_code, self.channel_name, self.username)
+        self.registered = True
+        if first:
+            await presence.arrived(self.room_code, self.username, self.channel_layer)
 
-        # Fetch and broadcast the updated participants list
-        await self.broadcast_participants()
+        # Send the current participants list to this socket only, the others get deltas
+        await self.send_roster()
 
 
     async def disconnect(self, close_code):
         # Remove the user from the room's group
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
-        # Fetch and broadcast the updated participants list
-        await self.broadcast_participants()
+        # Stop showing this socket's users as typing
+        for sender in self.typing_senders:
+            typing_coalescer.stop_typing(self.room_code, sender)
+
+        if self.batcher:
+            self.batcher.close()
+
+        if self.msgpack_counted:
+            msgpack_subscribers.closed(self.room_code)
+            self.msgpack_counted = False
+
+        if self.counted:
+            room_activity.closed(self.room_code)
+            self.counted = False
+
+        # A participant whose last socket this was goes off the roster
+        if self.registered:
+            self.registered = False
+            last = presence.disconnect(self.room_code, self.channel_name)
+            if last:
+                await presence.departed(self.room_code, last, self.channel_layer)
 
         # disconnect from websocket
         await self.close(self)
 
 
-    # Methods for updating the users in the study room for all participants
+    async def identify(self):
+        # The logged in user, clients with a JWT send it in an "authenticate" message instead
+        user = self.scope.get("user")
+        if user is not None and user.is_authenticated:
+            return user.username
+        return None
 
-    @sync_to_async
-    def get_participants(self):
-        # Fetch participants from the StudySession model
-        try:
-            print("Yes")
-            print(StudySession.objects.filter(roomCode=self.room_code))
-            study_session = StudySession.objects.get(roomCode=self.room_code)
-        except StudySession.DoesNotExist:
-            print(f"StudySession with room code {self.room_code} does not exist.")
-            # You can also add some handling logic here, for example:
-            # - Return a message to the user
-            # - Try again or handle the error in a way that doesn't crash the program
-            study_session = None  # Or handle it appropriately
-        participants = study_session.participants.all()
-        
-        return [participant.username for participant in participants]
+    async def authenticate(self, token):
+        # Tokens travel in a message, a ?token= in the URL would end up in access logs
+        if self.username is not None or not self.registered or not isinstance(token, str):
+            return
+        username = await sync_to_async(username_from_token)(token)
+        if username is None:
+            return
+        self.username = username
+        if presence.identify(self.room_code, self.channel_name, username):
+            await presence.arrived(self.room_code, username, self.channel_layer)
+
+    # Methods for sending events to this socket
+
+    async def send_event(self, event):
+        # Every outgoing event goes through here, buffered when the client asked for batching
+        if self.batcher:
+            await self.batcher.add(event)
+        else:
+            await self.send_frame(event)
 
+    async def send_frame(self, payload):
+        # payload is one event, or a list of events when batching
+        if self.codec.binary:
+            await self.send(bytes_data=self.codec.encode(payload))
+        else:
+            await self.send(text_data=self.codec.encode(payload))
+        outbound_stats.record(len(payload) if isinstance(payload, list) else 1)
 
-    async def broadcast_participants(self):
-        participants = await self.get_participants()
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "participants_update",
-                "participants": participants,
-            }
-        )
+    async def set_batching(self, data):
+        if data.get("enabled", True):
+            limits = batching_limits(data.get("max_batch"), data.get("max_delay_ms"))
+            if self.batcher:
+                await self.batcher.flush()
+            self.batcher = OutboundBatcher(self.send_frame, *limits)
+        elif self.batcher:
+            batcher, self.batcher = self.batcher, None
+            await batcher.flush()
+
+    # Methods for updating the users in the study room for all participants
+
+    async def get_roster(self):
+        # Served from the roster cache, only a cold room goes to the database
+        if roster_cache.is_local:
+            snapshot = roster_cache.cached_snapshot(self.room_code)
+            if snapshot is not None:
+                return snapshot
+        return await sync_to_async(roster_cache.snapshot)(self.room_code)
+
+    async def send_roster(self):
+        version, participants = await self.get_roster()
+        await self.roster_sync({"participants": participants, "version": version})
 
    # Method to send to-do list updates to all group participants
     async def broadcast_todo_list(self, text_data):
@@ -108,125 +196,156 @@ class RoomConsumer(AsyncWebsocketConsumer):
                 }
             )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        # Binary frames are MessagePack, text frames JSON
+        if bytes_data is not None:
+            data = decode_msgpack_frame(bytes_data)
+        else:
+            data = decode_frame(text_data)
         message_type = data.get("type")
 
         if message_type == "chat_message":
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "chat_message",
-                    "message": data["message"],
-                    "sender": data["sender"],
-                }
-            )
+            await group_broadcast(self.room_code, {
+                "type": "chat_message",
+                "message": data["message"],
+                "sender": data["sender"],
+            }, self.channel_layer)
+        elif message_type == "batching":
+            # Turn batched outbound frames on or off for this socket
+            await self.set_batching(data)
+        elif message_type == "authenticate":
+            # Sent first by clients that log in with a JWT access token
+            await self.authenticate(data.get("token"))
+        elif message_type == "heartbeat":
+            # Sockets that send heartbeats are closed once they stop (see api/realtime/presence.py)
+            if presence.heartbeat(self.room_code, self.channel_name):
+                presence.watch()
+        elif message_type == "roster_sync":
+            # The client missed a roster version and wants the full list
+            await self.send_roster()
         elif message_type == "study_update":
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "study_update",
-                    "update": data["update"],
-                }
-            )
+            await group_broadcast(self.room_code, {
+                "type": "study_update",
+                "update": data["update"],
+            }, self.channel_layer)
         elif message_type == "typing":
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "typing",
-                    "sender":data["sender"],
-                }
-            )
+            # Coalesced into one typing_batch per room every TYPING_BATCH_INTERVAL
+            self.typing_senders.add(data["sender"])
+            typing_coalescer.typing(self.room_code, data["sender"])
 
         elif message_type == "file_uploaded":
             # Broadcast the new file to all the users in the study room
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type" : "file_uploaded",
-                    "file" : data["file"],
-                }
-            )
+            await group_broadcast(self.room_code, {
+                "type" : "file_uploaded",
+                "file" : data["file"],
+            }, self.channel_layer)
         elif message_type == "file_deleted":
             # Broadcast the new file to all the users in the study room
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type" : "file_deleted",
-                    "fileName" : data["fileName"],
-                }
-            )
+            await group_broadcast(self.room_code, {
+                "type" : "file_deleted",
+                "fileName" : data["fileName"],
+            }, self.channel_layer)
 
-    # Method to send an updated list of participants when someone joins or leaves
-    async def participants_update(self, event):
-        await self.send(text_data=json.dumps({
-            "type": "participants_update",
+    # Group broadcasts arrive already encoded (see api/realtime/broadcast.py)
+    async def encoded_event(self, event):
+        await self.send_event(self.codec.pre_encoded(event))
+
+    # Several events for this room published together (see api/realtime/publisher.py)
+    async def encoded_events(self, event):
+        for message in event["events"]:
+            await self.send_event(self.codec.pre_encoded(message))
+
+    # Methods to update the list of participants when someone joins or leaves
+    async def participant_joined(self, event):
+        await self.send_event({
+            "type": "participant_joined",
+            "usernames": event["usernames"],
+            "version": event["version"],
+        })
+
+    async def participant_left(self, event):
+        await self.send_event({
+            "type": "participant_left",
+            "usernames": event["usernames"],
+            "version": event["version"],
+        })
+
+    async def roster_sync(self, event):
+        await self.send_event({
+            "type": "roster_sync",
             "participants": event["participants"],
-        }))
+            "version": event["version"],
+        })
+
+    # Sent by the presence sweep when this socket's heartbeats stopped
+    async def presence_expired(self, event):
+        self.registered = False
+        await self.close()
 
     # Methods for chat functionality
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "chat_message",
             "message": event["message"],
             "sender": event["sender"],
-        }))
+        })
 
     async def study_update(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "study_update",
             "update": event["update"],
-        }))
+        })
 
-    async def typing(self, event):
-        await self.send(text_data=json.dumps({
-            "type": "typing",
-            "sender" : event["sender"],
-        }))
+    async def typing_batch(self, event):
+        await self.send_event({
+            "type": "typing_batch",
+            "worker": event["worker"],
+            "senders": event["senders"],
+        })
 
 
     # Methods TO SEND SIGNALS for to do list
     async def add_task(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "add_task",
             "task": event["task"],
-        }))
+        })
 
     async def remove_task(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "remove_task",
             "task_id": event["task_id"],
-        }))
+        })
 
     async def toggle_task(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "toggle_task",
             "task_id": event["task_id"],
             "is_completed": event["is_completed"],
-        }))
+        })
 
     async def delete_list(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "delete_list",
             "list_id": event["list_id"],
-        }))
+        })
         
     # Methods for Shared Materials
 
     async def file_uploaded(self, event):
         # Send the new file to the client
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             "type": "file_uploaded",
             "file": event["file"],
-        }))
+        })
 
     async def file_deleted(self, event):
         try:
             # Notify the client about the deleted file
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 "type": "file_deleted",
                 "fileName": event["fileName"],
-            }))
+            })
         except Exception as e:
             print(f"Error in file_deleted: {e}")
\ No newline at end of file
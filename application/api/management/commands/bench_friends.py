@@ -0,0 +1,100 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Friends, Status, User
+
+
+class Rollback(Exception):
+    pass
+
+
+def benchmark_friends(sizes, friends_per_user=10, repeat=200):
+    """
+    Time Friends lookups for one user while the rest of the Friends table grows.
+
+    Everything is created in a transaction that is rolled back at the end.
+
+    :return: one dict per table size with the row count, the queries and the average
+        milliseconds per get_all_friends / get_friends_with_status / are_friends call
+    """
+    results = []
+    try:
+        with transaction.atomic():
+            # The user we look up, with a fixed number of friends
+            users = User.objects.bulk_create([
+                User(firstname="Bench", lastname="Friends", email=f"bench_friends_{index}@bench.invalid",
+                     username=f"@benchfriends{index}", password="!")
+                for index in range(friends_per_user + 1)
+            ])
+            probe, friends = users[0], users[1:]
+            Friends.objects.bulk_create([
+                Friends(user1=probe, user2=friend, status=Status.ACCEPTED, requested_by=probe)
+                for friend in friends
+            ])
+
+            # Other users' friendships, in pairs of filler users
+            filler = 0
+            for size in sorted(sizes):
+                missing = size - Friends.objects.count()
+                if missing > 0:
+                    new_users = User.objects.bulk_create([
+                        User(firstname="Bench", lastname="Filler", email=f"bench_filler_{index}@bench.invalid",
+                             username=f"@benchfiller{index}", password="!")
+                        for index in range(filler, filler + 2 * missing)
+                    ], batch_size=500)
+                    filler += 2 * missing
+                    Friends.objects.bulk_create([
+                        Friends(user1=a, user2=b, status=Status.ACCEPTED, requested_by=a)
+                        for a, b in zip(new_users[::2], new_users[1::2])
+                    ], batch_size=500)
+
+                result = {"rows": Friends.objects.count()}
+                lookups = {
+                    "get_all_friends": lambda: list(Friends.get_all_friends(probe)),
+                    "get_friends_with_status": lambda: list(Friends.get_friends_with_status(probe, Status.ACCEPTED)),
+                    "are_friends": lambda: Friends.are_friends(probe, friends[-1]),
+                }
+                for name, lookup in lookups.items():
+                    with CaptureQueriesContext(connection) as queries:
+                        lookup()
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        lookup()
+                    result[f"{name}_ms"] = round((time.perf_counter() - start) * 1000 / repeat, 4)
+                    result[f"{name}_queries"] = len(queries)
+                results.append(result)
+            raise Rollback
+    except Rollback:
+        pass
+    return results
+
+
+class Command(BaseCommand):
+    """Benchmark the Friends lookups against growing table sizes."""
+
+    help = 'Times Friends lookups for one user as the Friends table grows (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, action='append',
+                            help='total friendships in the table, can be repeated (default: 100, 1000, 10000)')
+        parser.add_argument('--friends', type=int, default=10, help='friendships of the user looked up')
+        parser.add_argument('--repeat', type=int, default=200, help='calls timed per lookup and size')
+        parser.add_argument('--json', action='store_true', help='print the results as JSON')
+
+    def handle(self, *args, **options):
+        results = benchmark_friends(options['size'] or [100, 1000, 10000],
+                                    friends_per_user=options['friends'], repeat=options['repeat'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(self.style.SUCCESS(f"{result['rows']} friendships"))
+            for key, value in result.items():
+                if key != 'rows':
+                    self.stdout.write(f"  {key:<32}{value}")
@@ -0,0 +1,100 @@
+import json
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import StudySession, User
+from api.services.room_codes import room_codes
+
+
+def random_room_code():
+    """A room code the way StudySession.save made them before the allocator, unused when returned."""
+    characters = string.ascii_uppercase + string.digits
+    while True:
+        code = ''.join(random.choice(characters) for _ in range(8))
+        if not StudySession.objects.filter(roomCode=code).exists():
+            return code
+
+
+class QueryCounter:
+    """Counts the queries run through it (CaptureQueriesContext keeps only the last 9000)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def benchmark_room_codes(rooms=100000, batch_size=1000):
+    """
+    Create rooms with codes from the old random-and-check loop and from the allocator.
+
+    Rooms are inserted in batches (without to-do lists) so the codes are most of what is
+    timed. Each strategy starts from an empty set of bench rooms, which are deleted at the end.
+
+    :return: per strategy, the rooms created, the milliseconds and queries spent on codes per
+        1000 rooms, overall and for the last batch (when the table is fullest), and whether
+        all codes were distinct
+    """
+    strategies = {"random": random_room_code, "allocator": room_codes.allocate}
+    owner = User.objects.create(firstname="Bench", lastname="Rooms", email="bench_rooms@bench.invalid",
+                                username="@benchrooms", password="!")
+    results = {}
+    try:
+        for name, next_code in strategies.items():
+            codes, seconds, queries = [], 0.0, 0
+            for first in range(0, rooms, batch_size):
+                count = min(batch_size, rooms - first)
+                captured = QueryCounter()
+                with connection.execute_wrapper(captured):
+                    start = time.perf_counter()
+                    batch = [next_code() for _ in range(count)]
+                    elapsed = time.perf_counter() - start
+                StudySession.objects.bulk_create([
+                    StudySession(createdBy=owner, sessionName="Bench room", roomCode=code) for code in batch
+                ])
+                codes += batch
+                seconds += elapsed
+                queries += captured.count
+                last = {"last_batch_ms_per_1000": round(elapsed * 1000 * 1000 / count, 2),
+                        "last_batch_queries_per_1000": round(captured.count * 1000 / count, 2)}
+            results[name] = {
+                "rooms": len(codes),
+                "ms_per_1000": round(seconds * 1000 * 1000 / rooms, 2),
+                "queries_per_1000": round(queries * 1000 / rooms, 2),
+                **last,
+                "distinct": len(set(codes)) == len(codes),
+            }
+            StudySession.objects.filter(createdBy=owner).delete()
+    finally:
+        owner.delete()
+    return results
+
+
+class Command(BaseCommand):
+    """Benchmark room code generation, random codes checked one by one against the allocator."""
+
+    help = 'Creates rooms with random checked codes and with allocated codes and times both (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100000, help='rooms created per strategy')
+        parser.add_argument('--batch-size', type=int, default=1000, help='rooms inserted per query')
+        parser.add_argument('--json', action='store_true', help='print the results as JSON')
+
+    def handle(self, *args, **options):
+        results = benchmark_room_codes(options['rooms'], batch_size=options['batch_size'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for name, result in results.items():
+            self.stdout.write(self.style.SUCCESS(f"{name}: {result['rooms']} rooms"))
+            for key, value in result.items():
+                if key != 'rooms':
+                    self.stdout.write(f"  {key:<32}{value}")
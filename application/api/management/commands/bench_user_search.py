@@ -0,0 +1,96 @@
+import json
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from api.models import User
+from api.services.user_search import index_users, search_users
+
+
+class Rollback(Exception):
+    pass
+
+
+def _name(rng):
+    return rng.choice(string.ascii_uppercase) + "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+
+
+def scan_search(query):
+    """The search find_friend did before the index, three icontains over the whole table."""
+    return User.objects.filter(Q(username__icontains=query) | Q(firstname__icontains=query)
+                               | Q(lastname__icontains=query))[:20]
+
+
+def benchmark_user_search(users=100000, queries=("al", "ann", "smith", "@user4242"), repeat=20, seed=1):
+    """
+    Time find-friend searches over a table of generated users, with the index and with the
+    former icontains scan. Everything is created in a transaction that is rolled back.
+
+    :return: {query: {"matches", "indexed_ms", "indexed_queries", "scan_ms"}}, plus "users"
+    """
+    rng = random.Random(seed)
+    results = {}
+    try:
+        with transaction.atomic():
+            batch_size = 5000
+            for start in range(0, users, batch_size):
+                created = User.objects.bulk_create([
+                    User(firstname=_name(rng), lastname=_name(rng), email=f"user{index}@bench.invalid",
+                         username=f"@user{index}", password="!")
+                    for index in range(start, min(start + batch_size, users))
+                ])
+                index_users(created, created=True)
+            results["users"] = User.objects.count()
+
+            for query in queries:
+                with CaptureQueriesContext(connection) as captured:
+                    matches = len(search_users(query, limit=20))
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    list(search_users(query, limit=20))
+                indexed_ms = (time.perf_counter() - start) * 1000 / repeat
+
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    list(scan_search(query))
+                scan_ms = (time.perf_counter() - start) * 1000 / repeat
+
+                results[query] = {
+                    "matches": matches,
+                    "indexed_ms": round(indexed_ms, 3),
+                    "indexed_queries": len(captured),
+                    "scan_ms": round(scan_ms, 3),
+                }
+            raise Rollback
+    except Rollback:
+        pass
+    return results
+
+
+class Command(BaseCommand):
+    """Benchmark the find-friend search index against the former icontains scan."""
+
+    help = 'Times find-friend searches over generated users (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--query', action='append', help='search to time, can be repeated')
+        parser.add_argument('--repeat', type=int, default=20, help='times each search is run')
+        parser.add_argument('--json', action='store_true', help='print the results as JSON')
+
+    def handle(self, *args, **options):
+        kwargs = {"queries": options['query']} if options['query'] else {}
+        results = benchmark_user_search(users=options['users'], repeat=options['repeat'], **kwargs)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"{results.pop('users')} users"))
+        for query, result in results.items():
+            self.stdout.write(f"  {query!r:<14}" + "  ".join(f"{key} {value}" for key, value in result.items()))
@@ -0,0 +1,52 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.realtime.loadtest import LAYER_BACKENDS, channel_layer_settings, run_load_test
+
+
+class Command(BaseCommand):
+    """Benchmark RoomConsumer with simulated WebSocket clients."""
+
+    help = 'Runs the RoomConsumer load test against one or more channel layers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=1)
+        parser.add_argument('--clients', type=int, default=100, help='virtual participants per room')
+        parser.add_argument('--messages', type=int, default=5, help='traffic rounds per participant')
+        parser.add_argument('--layer', action='append', choices=sorted(LAYER_BACKENDS),
+                            help='channel layer to test, can be repeated (default: memory and local-redis)')
+        parser.add_argument('--capacity', type=int, default=1000, help='per-channel capacity of the layer')
+        parser.add_argument('--redis-url', default='redis://127.0.0.1:6379')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='also trace peak allocations with tracemalloc (slows the run down)')
+        parser.add_argument('--batch', action='store_true', help='clients opt in to batched outbound frames')
+        parser.add_argument('--msgpack', action='store_true', help='clients negotiate the msgpack subprotocol')
+        parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        for layer in options['layer'] or ['memory', 'local-redis']:
+            layers = channel_layer_settings(layer, options['capacity'], options['redis_url'])
+            with override_settings(CHANNEL_LAYERS=layers):
+                report = async_to_sync(run_load_test)(
+                    rooms=options['rooms'],
+                    clients_per_room=options['clients'],
+                    messages_per_client=options['messages'],
+                    trace_memory=options['trace_memory'],
+                    batch=options['batch'],
+                    binary=options['msgpack'],
+                )
+            results[layer] = report.as_dict()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for layer, result in results.items():
+            self.stdout.write(self.style.SUCCESS(f"{layer}: {result['rooms']} rooms, {result['clients']} clients"))
+            for key, value in result.items():
+                if key not in ('rooms', 'clients'):
+                    self.stdout.write(f"  {key:<22}{value}")
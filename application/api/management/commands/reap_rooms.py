@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.services.room_reaper import abandoned_rooms, reap_rooms, stale_session_users
+
+
+class Command(BaseCommand):
+    """Delete abandoned study rooms and close stale SessionUser rows, to be run periodically (cron)."""
+
+    help = 'Deletes study rooms inactive for longer than the grace period and closes stale SessionUser rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=settings.ROOM_REAPER_GRACE,
+                            help='seconds a room must have been inactive for')
+        parser.add_argument('--batch-size', type=int, default=settings.ROOM_REAPER_BATCH_SIZE,
+                            help='rooms deleted (or SessionUser rows closed) per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be reaped')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            rooms = abandoned_rooms(options['grace']).count()
+            session_users = stale_session_users().count()
+            self.stdout.write(f"Would delete {rooms} rooms, {session_users} SessionUser rows are stale")
+            return
+
+        result = reap_rooms(options['grace'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {result['rooms']} rooms and closed {result['session_users']} stale SessionUser rows"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.services.user_search import rebuild_index
+
+
+class Command(BaseCommand):
+    """Rebuild the find-friend search index from scratch."""
+
+    help = 'Rebuilds the UserSearchToken index of every user (needed after bulk_create imports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='users indexed per transaction')
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} users for search"))
@@ -6,6 +6,7 @@ import random
 from django.core.management import call_command
 
 from api.models import Friends, Appointments, User, Status, toDoList, Permission, MotivationalMessage, Rewards, StudySession, SessionUser, List
+from api.services.friend_graph import friend_graph
 
 
 import pytz
@@ -84,7 +85,7 @@ class Command(BaseCommand):
         user2 = choice(users)
         status = choice(statuses)
 
-        if not user1 == user2 and not Friends.are_friends(user1, user2):
+        if not user1 == user2 and not friend_graph.are_friends(user1, user2):
             self.create_friends({
                 'user1': user1,
                 'user2': user2,
@@ -4,9 +4,11 @@ from .choices import Status
 from .friend_request import Friends
 from .rewards import Rewards
 from .study_session import StudySession
-from .todo_list import toDoList
+from .room_code import RoomCodeSequence
+from .todo_list import toDoList, TaskTombstone
 from .user import User
 from .user import UserManager
+from .user_search import UserSearchToken
 from .motivational_message import *
 from .session_user import SessionUser
 from .events import Appointments
@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import Case, F, Q, When
 from django.core.exceptions import ValidationError
 from .choices import *
 
@@ -8,6 +8,10 @@ from .choices import *
 Friends model represents a friendship between two users.
 It ensures that each friendship is stored only once using a unique constraint
 and enforces order to prevent duplicate entries (e.g., storing both (1,2) and (2,1)).
+
+Lookups only touch the rows of the user they are about: the (user1, status) and
+(user2, status) indexes cover "friendships of a user (with a status)" from either side, so
+their cost depends on how many friends the user has, not on the size of the table.
 '''
 
 class Friends(models.Model):
@@ -26,6 +30,10 @@ class Friends(models.Model):
             models.UniqueConstraint(
                 fields=['user1', 'user2'], name='unique_friendship')
         ]
+        indexes = [
+            models.Index(fields=['user1', 'status'], name='friends_user1_status_idx'),
+            models.Index(fields=['user2', 'status'], name='friends_user2_status_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         '''
@@ -35,7 +43,8 @@ class Friends(models.Model):
         if self.user1_id > self.user2_id:
             self.user1_id, self.user2_id = self.user2_id, self.user1_id
 
-        if self.requested_by not in [self.user1, self.user2]:
+        # Compare ids, comparing the users would load all three of them
+        if self.requested_by_id not in [self.user1_id, self.user2_id]:
             raise ValidationError(
                 "The requested_by field must be either user1 or user2.")
 
@@ -53,10 +62,22 @@ class Friends(models.Model):
         :param user_b: Second user
         :return: Boolean (True if they are friends, False otherwise)
         '''
+        # Friendships are stored with user1 < user2, one probe of the unique (user1, user2) index
+        user1_id, user2_id = sorted([Friends._user_id(user_a), Friends._user_id(user_b)])
         return Friends.objects.filter(
-            (Q(user1=user_a, user2=user_b) | Q(user1=user_b, user2=user_a)) & Q(
-                status=Status.ACCEPTED)
-        ).exists()
+            user1_id=user1_id, user2_id=user2_id, status=Status.ACCEPTED).exists()
+
+    @staticmethod
+    def _user_id(user):
+        return user.pk if isinstance(user, models.Model) else user
+
+    @staticmethod
+    def involving(user):
+        '''
+        Q matching the friendships a user is part of, on either side.
+        Each side is answered by its own index, see the Meta indexes.
+        '''
+        return Q(user1=user) | Q(user2=user)
 
     @staticmethod
     def get_friends_with_status(user, status):
@@ -67,24 +88,51 @@ class Friends(models.Model):
         :param status: The status of the friendship (Pending, Accepted, Rejected)
         :return: Queryset of Friends objects matching the criteria
         '''
-        return Friends.objects.filter(
-            (Q(user1=user) | Q(user2=user)) & Q(status=status)
-        )
+        return Friends.objects.filter(Friends.involving(user), status=status)
+
+    @staticmethod
+    def pending_invitations(user, sent):
+        '''
+        Queryset of the pending friend requests a user sent (sent=True) or received (sent=False).
+        The requested_by filter runs in the database.
+        '''
+        pending = Friends.get_friends_with_status(user, Status.PENDING)
+        if sent:
+            return pending.filter(requested_by=user)
+        return pending.exclude(requested_by=user)
 
     @staticmethod
     def get_invitations_sent(user):
-        all_friends = Friends.get_friends_with_status(user, Status.PENDING)
-        return [request for request in all_friends if request.requested_by == user]
+        return list(Friends.pending_invitations(user, sent=True).select_related('user1', 'user2'))
 
     @staticmethod
     def get_invitations_received(user):
-        all_friends = Friends.get_friends_with_status(user, Status.PENDING)
-        return [request for request in all_friends if request.requested_by != user]
+        return list(Friends.pending_invitations(user, sent=False).select_related('user1', 'user2'))
+
+    @staticmethod
+    def friend_values(friendships, user):
+        '''
+        One dict per friendship with its id and the other user's name, surname and username,
+        read in a single query joined to the user table.
+
+        :param friendships: Queryset of Friends objects of the user
+        :param user: The user whose friends these are
+        '''
+        def other(field):
+            return Case(When(user1=user, then=F(f'user2__{field}')), default=F(f'user1__{field}'))
+
+        return friendships.order_by('pk').values('id').annotate(
+            name=other('firstname'), surname=other('lastname'), username=other('username'))
 
     @staticmethod
     def get_all_friends(user):
-        requests = Friends.objects.all()
-        return [request for request in requests if request.user1 == user or request.user2 == user]
+        '''
+        Get every friendship of a user, whatever its status, with both users loaded.
+
+        :return: Queryset of Friends objects, in creation order
+        '''
+        return (Friends.objects.filter(Friends.involving(user))
+                .select_related('user1', 'user2').order_by('pk'))
 
     @staticmethod
     def update_status(friendsId, status):
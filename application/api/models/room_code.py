@@ -0,0 +1,38 @@
+import secrets
+
+from django.db import connection, models
+
+'''
+RoomCodeSequence is the single row behind room codes (see api/services/room_codes.py).
+
+It holds the secret key of the permutation codes are drawn through, made with secrets the
+first time a code is needed, and the next number of the sequence fed into it. Numbers are
+handed out in blocks by moving next_value forward, so no number (and no code) is ever
+given out twice, whichever process asks.
+'''
+
+class RoomCodeSequence(models.Model):
+    secret = models.CharField(max_length=64)
+    next_value = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, count):
+        """Take the next count numbers of the sequence, returning (secret, first number)."""
+        quote = connection.ops.quote_name
+        next_value = quote(cls._meta.get_field("next_value").column)
+        # One statement, so two processes can't read the same next_value
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote(cls._meta.db_table)} SET {next_value} = {next_value} + %s "
+                f"WHERE {quote(cls._meta.pk.column)} = 1 RETURNING {quote('secret')}, {next_value}",
+                [count],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            cls.objects.get_or_create(pk=1, defaults={"secret": secrets.token_hex(32)})
+            return cls.reserve(count)
+        secret, end = row
+        return secret, end - count
+
+    def __str__(self):
+        return f"Room codes, next number {self.next_value}"
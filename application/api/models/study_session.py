@@ -3,8 +3,6 @@ import datetime
 from .user import User
 from .todo_list_user import List
 from django.utils.timezone import now
-import string
-import random
 
 # model for the study session (can be group or individual)
 class StudySession(models.Model):
@@ -17,28 +15,27 @@ class StudySession(models.Model):
     endTime = models.DateTimeField(null=True, blank=True)
     date = models.DateField(default=datetime.date.today)
     toDoList = models.ForeignKey(List, on_delete=models.CASCADE, null=True, blank=True)
+    # last time someone joined or had a socket open in the room, rooms idle for too long are
+    # deleted by the reaper (see api/services/room_reaper.py)
+    lastActive = models.DateTimeField(default=now, db_index=True)
 
     # MAY NEED TO ADD A PARTICIPANTS FIELD HERE, TO SHOW ALL USERS IN THE SESSION?
     # yes many to many participants <-> study session
     participants = models.ManyToManyField(User, related_name='study_sessions', blank = True)
     
     def generate_room_code(self):
-        """To generate an 8-digit room code with uppercase letters and numbers"""
-        characters = string.ascii_uppercase + string.digits
-        # will use A-Z and 0-9
-        return ''.join(random.choice(characters) for _ in range(8))
+        """To generate an 8-digit room code with uppercase letters and numbers, never one used before"""
+        # will use A-Z and 0-9, see api/services/room_codes.py
+        from api.services.room_codes import room_codes
+        return room_codes.allocate()
 
     def save(self, *args, **kwargs):
         """Override the save method and ensire that every room code is unique!"""
 
         # makes sure it has a roomCode if not already
         if not self.roomCode:
-            while True:
-                    # generate a new room code
-                    self.roomCode = self.generate_room_code()
-                    # check if already used code
-                    if not StudySession.objects.filter(roomCode=self.roomCode).exists():
-                        break # if unique, stop you did it!
+            # unique without checking, codes are never handed out twice
+            self.roomCode = self.generate_room_code()
 
             if not self.toDoList:
                 todo_list = List.objects.create(
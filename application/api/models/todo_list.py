@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.expressions import BaseExpression
+from django.utils.timezone import now
 from django.conf import settings
 from django.forms import ValidationError
 from api.models import List
@@ -17,12 +20,49 @@ Model Breakdown:
 
 save Method:
     This makes sure that after the creation_date has been added as a field, it can't be amended.
+    The creation_date is remembered when the task is loaded (from_db) or saved, so the check
+    doesn't need to re-read the row, and saves with update_fields that leave out creation_date
+    skip it altogether.
+
+toggle_completed (queryset method):
+    toDoList.objects.filter(...).toggle_completed() flips is_completed for every matching task
+    with a single UPDATE ... SET is_completed = NOT is_completed and returns the toggled rows.
+
+Change tracking:
+    modified -> set whenever the task is written.
+    revision / created_revision -> the List.revision at which the task was last changed / created.
+    Every save, delete and toggle bumps the list's revision and stamps it on the task (read
+    straight from the list in the same statement), deleted tasks leave a TaskTombstone, so
+    api/todolists/changes/ can return what changed since a given revision. Tombstones more
+    than TASK_TOMBSTONE_REVISIONS revisions old are pruned as new ones are added.
 
 str Method:
     This prints out the title and list_id of the toDoList item, in the database, useful for debugging. 
 
 '''
 
+DEFAULT_TOMBSTONE_REVISIONS = 1000
+
+
+class ToDoListQuerySet(models.QuerySet):
+
+    def toggle_completed(self, *fields):
+        """
+        Flip is_completed for every task in the queryset with one UPDATE and return the toggled
+        rows as values(*fields) dicts, by default the id and the new is_completed.
+
+        The queryset is evaluated again after the update to read the new values, so it
+        shouldn't filter on is_completed itself.
+        """
+        fields = fields or ("id", "is_completed")
+        with transaction.atomic(using=self.db):
+            List.bump_revision(self.values("list_id"))
+            list_revision = Subquery(List.objects.filter(pk=OuterRef("list_id")).values("revision")[:1])
+            if not self.update(is_completed=~F("is_completed"), revision=list_revision, modified=now()):
+                return []
+            return list(self.values(*fields))
+
+
 class toDoList(models.Model):
     #list_id = models.AutoField(primary_key=True)
     list = models.ForeignKey(List, on_delete=models.CASCADE)
@@ -30,13 +70,79 @@ class toDoList(models.Model):
     content = models.CharField(max_length=1000, blank=True)
     creation_date = models.DateField(auto_now_add=True)
     is_completed = models.BooleanField(default=False)
+    modified = models.DateTimeField(default=now)
+    revision = models.PositiveBigIntegerField(default=0)
+    created_revision = models.PositiveBigIntegerField(default=0)
+
+    objects = ToDoListQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["list", "revision"])]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_creation_date = instance.__dict__.get("creation_date")
+        return instance
 
     def save(self, *args, **kwargs):
-        if self.pk: 
-            original = toDoList.objects.get(pk=self.pk)
-            if self.creation_date != original.creation_date:
+        update_fields = kwargs.get("update_fields")
+        writes_creation_date = update_fields is None or "creation_date" in update_fields
+        if self.pk and writes_creation_date and "creation_date" not in self.get_deferred_fields():
+            original = getattr(self, "_loaded_creation_date", None)
+            if original is None:
+                # Not loaded from the database, e.g. built with an explicit pk
+                original = toDoList.objects.filter(pk=self.pk).values_list("creation_date", flat=True).first()
+            if original is not None and self.creation_date != original:
                 raise ValidationError("You cannot modify the creation_date.")
-        super().save(*args, **kwargs)
+
+        # Stamp the task with its list's new revision, in one transaction so changes_since never
+        # sees the bumped revision without the task (no savepoint, a failed save fails the
+        # enclosing transaction anyway)
+        with transaction.atomic(using=kwargs.get("using") or self._state.db, savepoint=False):
+            List.bump_revision([self.list_id])
+            self.revision = List.current_revision(self.list_id)
+            self.modified = now()
+            if self._state.adding:
+                self.created_revision = List.current_revision(self.list_id)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "revision", "modified"}
+            super().save(*args, **kwargs)
+        self._loaded_creation_date = self.__dict__.get("creation_date")
+        # The stamped revisions are re-read if they are used
+        for name in ("revision", "created_revision"):
+            if isinstance(self.__dict__.get(name), BaseExpression):
+                del self.__dict__[name]
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            List.bump_revision([self.list_id])
+            TaskTombstone.objects.create(list_id=self.list_id, task_id=self.pk,
+                                         revision=List.current_revision(self.list_id))
+            TaskTombstone.prune(self.list_id)
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
-        return(f"{self.title} has list_id {self.list_id}")
\ No newline at end of file
+        return(f"{self.title} has list_id {self.list_id}")
+
+
+class TaskTombstone(models.Model):
+    """A deleted task, kept so clients syncing changes since a revision hear about the deletion."""
+    list = models.ForeignKey(List, on_delete=models.CASCADE, related_name="tombstones")
+    task_id = models.PositiveBigIntegerField()
+    revision = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["list", "revision"])]
+
+    @classmethod
+    def prune(cls, list_id):
+        """
+        Drop a list's tombstones more than TASK_TOMBSTONE_REVISIONS revisions old, recording
+        in List.pruned_revision the revision up to which they are gone.
+        """
+        keep = getattr(settings, "TASK_TOMBSTONE_REVISIONS", DEFAULT_TOMBSTONE_REVISIONS)
+        oldest_kept = List.current_revision(list_id) - keep
+        if cls.objects.filter(list_id=list_id, revision__lte=oldest_kept).delete()[0]:
+            List.objects.filter(pk=list_id).update(pruned_revision=F("revision") - keep)
@@ -4,6 +4,20 @@ from .user import User
 class List(models.Model):
     name = models.CharField(max_length=255)  # Example field
     is_shared = models.BooleanField(default=False)
+    # Bumped by every change to the list's tasks, see api/services/todo_changes.py
+    revision = models.PositiveBigIntegerField(default=0)
+    # Tombstones of deleted tasks up to this revision were pruned (see TaskTombstone.prune)
+    pruned_revision = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def bump_revision(cls, list_ids):
+        """Add one to the revision of the given lists (ids, or a queryset of ids)."""
+        return cls.objects.filter(pk__in=list_ids).update(revision=models.F("revision") + 1)
+
+    @classmethod
+    def current_revision(cls, list_id):
+        """Subquery for a list's revision, to store it on rows without reading it first."""
+        return models.Subquery(cls.objects.filter(pk=list_id).values("revision")[:1])
 
     def __str__(self):
         return f"{self.pk}"
@@ -1,7 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
 from django.core.validators import RegexValidator
-from django.db.models import Q
 
 '''
 Custom User Model & Manager. Extends AbstractBaseUser to create custom User model
@@ -69,6 +68,18 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'    #Uses email instead of username for authentication i.e. for login
     REQUIRED_FIELDS = ['firstname', 'lastname', 'username']
+    SEARCH_FIELDS = ('username', 'firstname', 'lastname')  #Indexed for the find-friend search
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so saves that don't change them skip reindexing the user (see api/signals.py)
+        instance._indexed_names = instance.search_names()
+        return instance
+
+    def search_names(self):
+        """The loaded values of the fields indexed for search, None for deferred ones."""
+        return tuple(self.__dict__.get(field) for field in self.SEARCH_FIELDS)
 
     def __str__(self):
         return self.username
@@ -79,9 +90,8 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f'{self.firstname} {self.lastname}'
 
     @staticmethod
-    def find_user(search_query):
-        return User.objects.filter(
-            Q(username__icontains=search_query) |
-            Q(firstname__icontains=search_query) |
-            Q(lastname__icontains=search_query))
+    def find_user(search_query, user=None, limit=None, after=None):
+        """Users matching the search, best matches first (see api/services/user_search.py)."""
+        from api.services.user_search import search_users
+        return search_users(search_query, user=user, limit=limit, after=after)
         
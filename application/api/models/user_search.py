@@ -0,0 +1,22 @@
+from django.db import models
+
+'''
+UserSearchToken is the index behind the find-friend search (see api/services/user_search.py).
+
+Each user has one row per trigram of the words of their username (without the @), first name
+and last name, lowercased. Words are padded with two spaces in front, so "  a" and " al" mark
+words starting with "a" and "al" and answer one or two letter prefix searches too.
+The (token, user) constraint is the index searches go through.
+'''
+
+class UserSearchToken(models.Model):
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name="search_tokens")
+    token = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'user'], name='unique_user_search_token')
+        ]
+
+    def __str__(self):
+        return f'"{self.token}" of user {self.user_id}'
@@ -0,0 +1,103 @@
+import asyncio
+from urllib.parse import parse_qs
+
+from django.conf import settings
+
+'''
+Opt-in batching of outbound WebSocket events.
+
+A client that connects with ?batch=1 (optionally batch_size=<n>&batch_delay_ms=<ms>), or sends
+{"type": "batching", "enabled": true, "max_batch": n, "max_delay_ms": ms} as a message, gets
+its events buffered for up to max_delay_ms and delivered as one JSON array frame of at most
+max_batch events instead of one frame per event. Both limits are capped by WS_BATCH_MAX_SIZE
+and WS_BATCH_MAX_DELAY_MS.
+
+outbound_stats counts events and frames sent by this process, so the frames saved by
+batching can be read off directly.
+'''
+
+DEFAULT_MAX_SIZE = 50
+DEFAULT_MAX_DELAY_MS = 10
+
+
+class OutboundStats:
+
+    def __init__(self):
+        self.events = 0
+        self.frames = 0
+
+    @property
+    def frames_saved(self):
+        return self.events - self.frames
+
+    def record(self, events):
+        self.events += events
+        self.frames += 1
+
+    def reset(self):
+        self.events = 0
+        self.frames = 0
+
+
+outbound_stats = OutboundStats()
+
+
+def _clamp(value, convert, low, cap):
+    # Missing or malformed values (e.g. batch_size=abc) get the server's cap
+    try:
+        return cap if value is None else max(low, min(convert(value), cap))
+    except (TypeError, ValueError):
+        return cap
+
+
+def batching_limits(max_batch=None, max_delay_ms=None):
+    """Clamp client-requested limits to the server's WS_BATCH_MAX_SIZE / WS_BATCH_MAX_DELAY_MS."""
+    size_cap = getattr(settings, "WS_BATCH_MAX_SIZE", DEFAULT_MAX_SIZE)
+    delay_cap = getattr(settings, "WS_BATCH_MAX_DELAY_MS", DEFAULT_MAX_DELAY_MS)
+    return _clamp(max_batch, int, 1, size_cap), _clamp(max_delay_ms, float, 0, delay_cap)
+
+
+def batching_from_query_string(query_string):
+    """Return (max_batch, max_delay_ms) if the connection asked for batching, otherwise None."""
+    params = parse_qs(query_string.decode() if isinstance(query_string, bytes) else query_string)
+    if params.get("batch", ["0"])[0] not in ("1", "true"):
+        return None
+    return batching_limits(params.get("batch_size", [None])[0], params.get("batch_delay_ms", [None])[0])
+
+
+class OutboundBatcher:
+    """Buffers events for one socket and hands them to send_frame(events) in batches."""
+
+    def __init__(self, send_frame, max_batch, max_delay_ms):
+        self.send_frame = send_frame
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.buffer = []
+        self.timer = None
+
+    async def add(self, event):
+        self.buffer.append(event)
+        if len(self.buffer) >= self.max_batch:
+            await self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        self.timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.buffer:
+            events, self.buffer = self.buffer, []
+            await self.send_frame(events)
+
+    def close(self):
+        """Drop anything still buffered, the socket is going away."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.buffer = []
@@ -0,0 +1,71 @@
+from channels.layers import get_channel_layer
+
+from .encoders import encode_broadcast
+from .roster import roster_cache
+
+'''
+Helpers for publishing study room events to the room_{code} channel layer group.
+
+Events are encoded once here, by the sender, in every enabled wire format and travel through
+the channel layer as an "encoded_event" message. RoomConsumer.encoded_event forwards the
+encoding matching its socket verbatim, so a message to a room of N people is serialized once
+per format instead of N times.
+
+Synchronous code (views, signals) goes through broadcast(), which hands the event to the
+outbox in api.realtime.publisher instead of waiting on the channel layer.
+'''
+
+def room_group_name(room_code):
+    return f"room_{room_code}"
+
+
+def prepare_broadcast(event, room_code=None):
+    """Wrap an event dict into the channel layer message that carries it pre-encoded."""
+    return {
+        "type": "encoded_event",
+        "event_type": event["type"],
+        **encode_broadcast(event, room_code),
+    }
+
+
+async def group_broadcast(room_code, event, channel_layer=None):
+    """Send an event to everyone in a room, from async code."""
+    channel_layer = channel_layer or get_channel_layer()
+    await channel_layer.group_send(room_group_name(room_code), prepare_broadcast(event, room_code))
+
+
+def broadcast(room_code, event):
+    """
+    Send an event to everyone in a room, from synchronous code.
+
+    The event is queued on the publisher and sent once the current transaction commits.
+    """
+    from .publisher import publisher
+    publisher.publish(room_code, event)
+
+
+def notify_participants(room_code, event_type, usernames, version):
+    """
+    Tell everyone in a room that participants joined or left.
+
+    :param event_type: "participant_joined" or "participant_left"
+    :param usernames: the usernames that joined or left
+    :param version: the room's roster version after the change
+    """
+    if not usernames:
+        return
+    broadcast(room_code, {
+        "type": event_type,
+        "usernames": list(usernames),
+        "version": version,
+    })
+
+
+def broadcast_roster_snapshot(room_code):
+    """Send the full roster to everyone in a room, for changes that can't be sent as deltas."""
+    version, participants = roster_cache.snapshot(room_code)
+    broadcast(room_code, {
+        "type": "roster_sync",
+        "participants": participants,
+        "version": version,
+    })
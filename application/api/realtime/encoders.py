@@ -0,0 +1,195 @@
+import json
+from collections import Counter
+
+import msgpack
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+'''
+Wire formats for study room WebSocket frames.
+
+Clients speak JSON text frames by default. A client that offers the "msgpack" subprotocol
+(Sec-WebSocket-Protocol: msgpack) gets the same message types as MessagePack binary frames
+instead, and may send its own messages that way too.
+
+WS_JSON_ENCODER picks the JSON implementation: "json" (the standard library), "orjson" (much
+faster, used only if installed), "auto" (the default: orjson when available, json otherwise)
+or the dotted path to a class with the same encode/decode interface.
+
+Group broadcasts are encoded once by the sender (see api.realtime.broadcast) and reach each
+socket as a PreEncoded value that is forwarded without running an encoder again. They always
+carry JSON, and MessagePack as well only when a socket of the room in this process negotiated
+it (msgpack_subscribers), so rooms of JSON clients don't send every event through the channel
+layer twice. A MessagePack socket on another worker converts the JSON copy itself.
+WS_MSGPACK_ENABLED turns the MessagePack format off.
+'''
+
+class PreEncoded(str):
+    """A JSON document that has already been encoded and can be sent verbatim."""
+
+
+class PreEncodedBytes(bytes):
+    """A MessagePack document that has already been encoded and can be sent verbatim."""
+
+
+class StdlibJSONEncoder:
+    name = "json"
+
+    def encode(self, obj):
+        return json.dumps(obj, separators=(",", ":"))
+
+    def decode(self, text):
+        return json.loads(text)
+
+
+class OrjsonEncoder:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def encode(self, obj):
+        return self._orjson.dumps(obj).decode()
+
+    def decode(self, text):
+        return self._orjson.loads(text)
+
+
+ENCODERS = {
+    "json": StdlibJSONEncoder,
+    "orjson": OrjsonEncoder,
+}
+
+
+def build_encoder(name):
+    if name == "auto":
+        try:
+            return OrjsonEncoder()
+        except ImportError:
+            return StdlibJSONEncoder()
+    if name in ENCODERS:
+        return ENCODERS[name]()
+    return import_string(name)()
+
+
+_encoders = {}
+
+
+def get_encoder():
+    """Return the configured JSON encoder, built once per setting value."""
+    name = getattr(settings, "WS_JSON_ENCODER", "auto")
+    if name not in _encoders:
+        _encoders[name] = build_encoder(name)
+    return _encoders[name]
+
+
+def encode_frame(payload):
+    """Encode one event or a list of events as JSON, reusing any PreEncoded parts as they are."""
+    if isinstance(payload, PreEncoded):
+        return payload
+    if isinstance(payload, list):
+        if any(isinstance(item, PreEncoded) for item in payload):
+            return "[" + ",".join(encode_frame(item) for item in payload) + "]"
+    return get_encoder().encode(payload)
+
+
+def decode_frame(text):
+    return get_encoder().decode(text)
+
+
+def encode_msgpack_frame(payload):
+    """Encode one event or a list of events as MessagePack, reusing PreEncodedBytes parts."""
+    if isinstance(payload, PreEncodedBytes):
+        return payload
+    if isinstance(payload, list):
+        if any(isinstance(item, PreEncodedBytes) for item in payload):
+            # An array is its header followed by the encoded items
+            header = msgpack.Packer().pack_array_header(len(payload))
+            return header + b"".join(encode_msgpack_frame(item) for item in payload)
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def decode_msgpack_frame(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def msgpack_enabled():
+    return getattr(settings, "WS_MSGPACK_ENABLED", True)
+
+
+class JSONCodec:
+    name = "json"
+    binary = False
+
+    encode = staticmethod(encode_frame)
+    decode = staticmethod(decode_frame)
+
+    def pre_encoded(self, message):
+        return PreEncoded(message["json"])
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    encode = staticmethod(encode_msgpack_frame)
+    decode = staticmethod(decode_msgpack_frame)
+
+    def pre_encoded(self, message):
+        if "msgpack" in message:
+            return PreEncodedBytes(message["msgpack"])
+        # Sent by a worker with msgpack disabled: convert from the JSON encoding
+        return PreEncodedBytes(encode_msgpack_frame(decode_frame(message["json"])))
+
+
+CODECS = {
+    "json": JSONCodec(),
+    "msgpack": MsgpackCodec(),
+}
+
+
+def negotiate_codec(subprotocols):
+    """Pick the codec for a connection from the subprotocols the client offered, in its order."""
+    for subprotocol in subprotocols or []:
+        if subprotocol == "msgpack" and msgpack_enabled():
+            return CODECS["msgpack"], subprotocol
+        if subprotocol == "json":
+            return CODECS["json"], subprotocol
+    return CODECS["json"], None
+
+
+class MsgpackSubscribers:
+    """Sockets in this process that negotiated MessagePack, per room."""
+
+    def __init__(self):
+        self._sockets = Counter()
+
+    def opened(self, room_code):
+        self._sockets[room_code] += 1
+
+    def closed(self, room_code):
+        self._sockets[room_code] -= 1
+        if self._sockets[room_code] <= 0:
+            del self._sockets[room_code]
+
+    def __contains__(self, room_code):
+        return room_code in self._sockets
+
+    def clear(self):
+        self._sockets.clear()
+
+
+msgpack_subscribers = MsgpackSubscribers()
+
+
+def encode_broadcast(event, room_code=None):
+    """
+    Encode an event once per wire format its room needs, keyed by codec name.
+
+    Without a room_code the audience is unknown and every enabled format is encoded.
+    """
+    encoded = {"json": encode_frame(event)}
+    if msgpack_enabled() and (room_code is None or room_code in msgpack_subscribers):
+        encoded["msgpack"] = encode_msgpack_frame(event)
+    return encoded
@@ -0,0 +1,43 @@
+import msgpack
+from channels.layers import InMemoryChannelLayer
+
+'''
+Channel layers used for local development, load tests and offline tests.
+
+LocalRedisChannelLayer is a stand-in for channels_redis' RedisChannelLayer that takes the same
+CONFIG (see backend/channel_layers.py). Every layer instance configured with the same "hosts"
+and "prefix" values shares one set of channels and groups, the same way several ASGI workers
+share one Redis server, and every message is packed with msgpack on send and unpacked on
+receive like channels_redis does. That lets us compare the cost of a networked layer and test
+cross-worker fan-out without a Redis server.
+'''
+
+class LocalRedisChannelLayer(InMemoryChannelLayer):
+
+    # hosts key -> (channels, groups) shared by every instance pointing at that "server"
+    _servers = {}
+
+    def __init__(self, hosts=None, prefix="asgi", **kwargs):
+        super().__init__(**kwargs)
+        self.hosts = hosts or ["local"]
+        self.prefix = prefix
+        self.server_key = repr((self.hosts, self.prefix))
+        self.channels, self.groups = LocalRedisChannelLayer._servers.setdefault(
+            self.server_key, ({}, {}))
+
+    async def send(self, channel, message):
+        await super().send(channel, {"__msgpack__": msgpack.packb(message, use_bin_type=True)})
+
+    async def receive(self, channel):
+        message = await super().receive(channel)
+        return msgpack.unpackb(message["__msgpack__"], raw=False)
+
+    async def flush(self):
+        # Clear in place so other instances sharing this "server" see the flush too
+        self.channels.clear()
+        self.groups.clear()
+
+    @classmethod
+    def reset_servers(cls):
+        """Forget every shared store, e.g. between tests."""
+        cls._servers.clear()
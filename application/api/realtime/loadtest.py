@@ -0,0 +1,288 @@
+import asyncio
+import json
+import math
+import resource
+import time
+import tracemalloc
+import uuid
+
+import msgpack
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from api.models import List, StudySession, User
+from backend.channel_layers import LAYER_BACKENDS, channel_layers_from_env
+
+'''
+Load-test harness for RoomConsumer.
+
+run_load_test() creates `rooms` study sessions with `clients_per_room` virtual participants
+each, connects every participant through channels' WebsocketCommunicator and then drives
+chat_message, typing and study_update traffic from the clients plus to-do events (the
+add_task / toggle_task / remove_task messages the REST views publish) onto each room group.
+It reports connect latency, fan-out latency percentiles, delivered messages per second and
+peak memory: the process' peak RSS, plus the peak traced by tracemalloc when trace_memory is
+set (tracing makes the run several times slower, so latencies are not comparable then).
+With batch=True the clients opt in to batched frames and frames_saved shows the difference;
+with binary=True they negotiate the MessagePack subprotocol and bytes_received shows the
+smaller frames.
+
+Everything runs in-process against whatever CHANNEL_LAYERS is active, so the harness works
+offline with InMemoryChannelLayer or the LocalRedisChannelLayer stand-in. The rows it creates
+are removed again when the run finishes.
+'''
+
+def channel_layer_settings(layer, capacity=100, redis_url="redis://127.0.0.1:6379"):
+    """Build a CHANNEL_LAYERS setting for one of the LAYER_BACKENDS names."""
+    return channel_layers_from_env({
+        "CHANNEL_LAYER": layer,
+        "CHANNEL_CAPACITY": str(capacity),
+        "REDIS_URL": redis_url,
+    })
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def decode_frame(frame):
+    """Return the list of events carried by one frame sent to a client."""
+    if frame.get("bytes") is not None:
+        data = msgpack.unpackb(frame["bytes"], raw=False)
+    else:
+        data = json.loads(frame["text"])
+    return data if isinstance(data, list) else [data]
+
+
+class LoadTestReport:
+
+    def __init__(self, rooms, clients_per_room):
+        self.rooms = rooms
+        self.clients_per_room = clients_per_room
+        self.connect_latencies = []
+        self.fanout_latencies = []
+        self.frames_received = 0
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.expected_marked = 0
+        self.marked_received = 0
+        self.traffic_seconds = 0.0
+        self.peak_rss = 0
+        self.peak_traced = None
+
+    @property
+    def clients(self):
+        return self.rooms * self.clients_per_room
+
+    @property
+    def messages_per_second(self):
+        if not self.traffic_seconds:
+            return 0.0
+        return self.messages_received / self.traffic_seconds
+
+    @property
+    def delivery_ratio(self):
+        if not self.expected_marked:
+            return 1.0
+        return self.marked_received / self.expected_marked
+
+    def as_dict(self):
+        ms = lambda seconds: round(seconds * 1000, 3)
+        return {
+            "rooms": self.rooms,
+            "clients": self.clients,
+            "connect_ms_p50": ms(percentile(self.connect_latencies, 50)),
+            "connect_ms_p99": ms(percentile(self.connect_latencies, 99)),
+            "fanout_ms_p50": ms(percentile(self.fanout_latencies, 50)),
+            "fanout_ms_p95": ms(percentile(self.fanout_latencies, 95)),
+            "fanout_ms_p99": ms(percentile(self.fanout_latencies, 99)),
+            "fanout_ms_max": ms(max(self.fanout_latencies, default=0.0)),
+            "frames_received": self.frames_received,
+            "messages_received": self.messages_received,
+            "frames_saved": self.messages_received - self.frames_received,
+            "bytes_received": self.bytes_received,
+            "messages_per_second": round(self.messages_per_second, 1),
+            "delivery_ratio": round(self.delivery_ratio, 4),
+            "peak_rss_kb": self.peak_rss // 1024,
+            "peak_traced_kb": None if self.peak_traced is None else self.peak_traced // 1024,
+        }
+
+
+class VirtualClient:
+    """One simulated participant: a communicator plus a task collecting what it receives."""
+
+    def __init__(self, application, room_code, username, report, query="", binary=False):
+        self.communicator = WebsocketCommunicator(application, f"/ws/room/{room_code}/{query}",
+                                                  subprotocols=["msgpack"] if binary else None)
+        self.binary = binary
+        self.username = username
+        self.report = report
+        self.last_received = time.perf_counter()
+        self.collector = None
+
+    async def connect(self):
+        started = time.perf_counter()
+        connected, _ = await self.communicator.connect()
+        if not connected:
+            raise RuntimeError(f"{self.username} could not connect")
+        self.report.connect_latencies.append(time.perf_counter() - started)
+        self.collector = asyncio.ensure_future(self.collect())
+
+    async def collect(self):
+        # Read the communicator's queue directly: receive_output() cancels the app on timeout
+        while True:
+            frame = await self.communicator.output_queue.get()
+            if frame.get("type") != "websocket.send":
+                continue
+            now = time.perf_counter()
+            self.last_received = now
+            self.report.frames_received += 1
+            self.report.bytes_received += len(frame.get("bytes") or frame.get("text") or "")
+            for event in decode_frame(frame):
+                self.report.messages_received += 1
+                sent_at = self.sent_at(event)
+                if sent_at is not None:
+                    self.report.marked_received += 1
+                    self.report.fanout_latencies.append(now - sent_at)
+
+    @staticmethod
+    def sent_at(event):
+        payload = event.get("message") if event.get("type") == "chat_message" else event.get("update")
+        if isinstance(payload, dict):
+            return payload.get("sent_at")
+        return None
+
+    async def send(self, data):
+        if self.binary:
+            await self.communicator.send_to(bytes_data=msgpack.packb(data))
+        else:
+            await self.communicator.send_to(text_data=json.dumps(data))
+
+    async def close(self):
+        if self.collector:
+            self.collector.cancel()
+        await self.communicator.disconnect()
+
+
+@sync_to_async
+def create_rooms(run_id, rooms, clients_per_room):
+    """Create the users and study sessions used by one run, returning {room_code: [usernames]}."""
+    users = User.objects.bulk_create([
+        User(
+            firstname="Load",
+            lastname="Test",
+            email=f"lt_{run_id}_{index}@loadtest.invalid",
+            username=f"@lt{run_id}{index}",
+            password="!",
+        )
+        for index in range(rooms * clients_per_room)
+    ])
+    layout = {}
+    for room_index in range(rooms):
+        members = users[room_index * clients_per_room:(room_index + 1) * clients_per_room]
+        session = StudySession.objects.create(createdBy=members[0], sessionName=f"Load test {run_id}")
+        session.participants.add(*members)
+        layout[session.roomCode] = [member.username for member in members]
+    return layout
+
+
+@sync_to_async
+def delete_rooms(run_id):
+    # Deleting the users cascades to their sessions; the sessions' lists go separately
+    sessions = StudySession.objects.filter(sessionName=f"Load test {run_id}")
+    List.objects.filter(pk__in=sessions.values_list("toDoList", flat=True)).delete()
+    User.objects.filter(username__startswith=f"@lt{run_id}").delete()
+
+
+async def wait_until_quiet(clients, idle_seconds, timeout):
+    """Wait until no client has received anything for idle_seconds (or until timeout)."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(idle_seconds / 4)
+        last = max((client.last_received for client in clients), default=0.0)
+        if time.perf_counter() - last >= idle_seconds:
+            return
+
+
+async def drive_room(room_code, clients, messages_per_client, report):
+    channel_layer = get_channel_layer()
+    group = f"room_{room_code}"
+    for round_number in range(messages_per_client):
+        for client in clients:
+            await client.send({"type": "typing", "sender": client.username})
+            await client.send({
+                "type": "chat_message",
+                "sender": client.username,
+                "message": {"text": f"message {round_number}", "sent_at": time.perf_counter()},
+            })
+            await client.send({
+                "type": "study_update",
+                "update": {"round": round_number, "sent_at": time.perf_counter()},
+            })
+            report.expected_marked += 2 * len(clients)
+
+        # To-do traffic arrives from the REST views through the channel layer
+        task_id = round_number + 1
+        await channel_layer.group_send(group, {
+            "type": "add_task",
+            "task": {"id": task_id, "title": f"Task {task_id}", "content": "",
+                     "is_completed": False, "list_id": 0},
+        })
+        await channel_layer.group_send(group, {"type": "toggle_task", "task_id": task_id, "is_completed": True})
+        await channel_layer.group_send(group, {"type": "remove_task", "task_id": task_id})
+
+
+async def run_load_test(rooms=1, clients_per_room=10, messages_per_client=5,
+                        idle_seconds=0.5, timeout=120, trace_memory=False, batch=False,
+                        binary=False):
+    """Run one load test against the active channel layer and return a LoadTestReport."""
+    from api import routing
+    application = URLRouter(routing.websocket_urlpatterns)
+    report = LoadTestReport(rooms, clients_per_room)
+    query = "?batch=1" if batch else ""
+    run_id = uuid.uuid4().hex[:8]
+
+    if trace_memory:
+        tracemalloc.start()
+    layout = await create_rooms(run_id, rooms, clients_per_room)
+    clients_by_room = {}
+    try:
+        for room_code, usernames in layout.items():
+            clients_by_room[room_code] = [VirtualClient(application, room_code, username, report, query,
+                                                        binary)
+                                          for username in usernames]
+            for client in clients_by_room[room_code]:
+                await client.connect()
+
+        all_clients = [client for clients in clients_by_room.values() for client in clients]
+        await wait_until_quiet(all_clients, idle_seconds, timeout)
+
+        # Only count what the traffic phase delivers
+        report.frames_received = report.messages_received = report.bytes_received = 0
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            drive_room(room_code, clients, messages_per_client, report)
+            for room_code, clients in clients_by_room.items()
+        ])
+        await wait_until_quiet(all_clients, idle_seconds, timeout)
+        last = max((client.last_received for client in all_clients), default=started)
+        report.traffic_seconds = max(last - started, 1e-9)
+    finally:
+        for clients in clients_by_room.values():
+            for client in clients:
+                await client.close()
+        if trace_memory:
+            report.peak_traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        # ru_maxrss is reported in kilobytes on Linux
+        report.peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        await delete_rooms(run_id)
+    return report
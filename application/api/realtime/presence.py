@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+
+from .broadcast import group_broadcast
+from .roster import roster_cache
+
+'''
+Which users have a live socket in which study room.
+
+RoomConsumer registers each of its sockets here under its room and channel name, with the
+username it authenticated as or None: the session's user, or the one of a JWT access token
+the client sends as its first message, {"type": "authenticate", "token": ...}. A socket that
+sends {"type": "heartbeat"} messages is expected to keep sending them: PRESENCE_TTL seconds
+after its last one it is taken as dead, dropped from presence and told to close. Sockets that
+never sent one (older clients) are only dropped when they disconnect.
+
+Presence keeps the roster (api/realtime/roster.py) in step with the sockets for users who go
+without calling leave_room. When a participant's last socket in a room disconnects or expires
+they are taken off the roster with a participant_left delta and marked away; when a socket of
+theirs connects again they are put back with participant_joined. A roster loaded from the
+database leaves out the users marked away, and joining or leaving through the API clears the
+mark, so between those loads the roster changes only through presence and membership events.
+
+By default the store lives in this process. Setting PRESENCE_CACHE_ALIAS to one of the CACHES
+aliases shares it between workers instead, which backend/settings.py does with the Redis cache
+when CHANNEL_LAYER=redis, so a user's sockets on different workers count as one presence. Like
+the shared roster, updates are a plain read-modify-write and shared entries expire
+PRESENCE_CACHE_TTL seconds after their last change. Each worker sweeps the rooms it has
+sockets in. A room's entry is deleted once it has neither sockets nor away marks.
+'''
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30.0
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+
+class Presence:
+
+    KEY_PREFIX = "presence:"
+
+    def __init__(self, cache_alias=None, ttl=None):
+        self.cache_alias = cache_alias
+        self._ttl = ttl
+        self._rooms = {}
+        # Rooms with sockets registered through this instance, the ones its sweep looks at
+        self._local_rooms = set()
+        self._lock = threading.Lock()
+        self._task = None
+
+    # Each room is {"channels": {channel_name: [username, expires_at or None]}, "away": {usernames}}
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "PRESENCE_TTL", DEFAULT_TTL)
+
+    @property
+    def shared_cache(self):
+        alias = self.cache_alias or getattr(settings, "PRESENCE_CACHE_ALIAS", None)
+        return caches[alias] if alias else None
+
+    def _get(self, room_code):
+        cache = self.shared_cache
+        if cache is None:
+            return self._rooms.get(room_code)
+        return cache.get(self.KEY_PREFIX + room_code)
+
+    def _room(self, room_code):
+        return self._get(room_code) or {"channels": {}, "away": set()}
+
+    def _put(self, room_code, room):
+        """Store a room's entry, or delete it when nothing is left in it."""
+        empty = not room["channels"] and not room["away"]
+        cache = self.shared_cache
+        if cache is None:
+            if empty:
+                self._rooms.pop(room_code, None)
+            else:
+                self._rooms[room_code] = room
+        elif empty:
+            cache.delete(self.KEY_PREFIX + room_code)
+        else:
+            cache.set(self.KEY_PREFIX + room_code, room,
+                      getattr(settings, "PRESENCE_CACHE_TTL", DEFAULT_CACHE_TTL))
+
+    def _last_channel(self, room, username):
+        return username is not None and all(
+            other != username for other, _ in room["channels"].values())
+
+    def connect(self, room_code, channel_name, username=None):
+        """Register a socket, returning True if it is username's first socket in the room."""
+        with self._lock:
+            room = self._room(room_code)
+            first = self._last_channel(room, username)
+            room["channels"][channel_name] = [username, None]
+            self._put(room_code, room)
+            self._local_rooms.add(room_code)
+            return first
+
+    def identify(self, room_code, channel_name, username):
+        """Set the username of an anonymous socket, returning True if it is their first socket in the room."""
+        with self._lock:
+            room = self._get(room_code)
+            entry = room and room["channels"].get(channel_name)
+            if not entry or entry[0] is not None:
+                return False
+            first = self._last_channel(room, username)
+            entry[0] = username
+            self._put(room_code, room)
+            return first
+
+    def heartbeat(self, room_code, channel_name, now=None):
+        """Push back the expiry of a socket, returning False if it isn't registered (any more)."""
+        with self._lock:
+            room = self._get(room_code)
+            entry = room and room["channels"].get(channel_name)
+            if not entry:
+                return False
+            entry[1] = (now or time.time()) + self.ttl
+            self._put(room_code, room)
+            return True
+
+    def disconnect(self, room_code, channel_name):
+        """Unregister a socket, returning its username if that was their last socket in the room."""
+        with self._lock:
+            room = self._get(room_code)
+            entry = room and room["channels"].pop(channel_name, None)
+            if not entry:
+                return None
+            self._put(room_code, room)
+            username = entry[0]
+            return username if self._last_channel(room, username) else None
+
+    def expire(self, now=None):
+        """
+        Unregister the sockets whose heartbeats stopped, in the rooms this instance has sockets in.
+
+        :return: [(room_code, channel_name, username if that was their last socket in the room, else None)]
+        """
+        now = now or time.time()
+        expired = []
+        with self._lock:
+            for room_code in list(self._local_rooms):
+                room = self._get(room_code)
+                if not room or not room["channels"]:
+                    self._local_rooms.discard(room_code)
+                    continue
+                dead = [channel_name for channel_name, (_, expires_at) in room["channels"].items()
+                        if expires_at is not None and expires_at <= now]
+                for channel_name in dead:
+                    username = room["channels"].pop(channel_name)[0]
+                    last = username if self._last_channel(room, username) else None
+                    expired.append((room_code, channel_name, last))
+                if dead:
+                    self._put(room_code, room)
+        return expired
+
+    def present(self, room_code):
+        """Usernames with a live socket in a room, in the order they connected."""
+        with self._lock:
+            room = self._get(room_code)
+            if room is None:
+                return []
+            return list(dict.fromkeys(username for username, _ in room["channels"].values()
+                                      if username is not None))
+
+    def away(self, room_code):
+        """Participants of a room taken off its roster because their sockets went."""
+        with self._lock:
+            room = self._get(room_code)
+            return set(room["away"]) if room else set()
+
+    def mark_away(self, room_code, username):
+        with self._lock:
+            room = self._room(room_code)
+            room["away"].add(username)
+            self._put(room_code, room)
+
+    def forget(self, room_code, usernames):
+        """Clear the away mark of usernames, e.g. because they joined or left through the API."""
+        with self._lock:
+            room = self._get(room_code)
+            if room is not None and not room["away"].isdisjoint(usernames):
+                room["away"].difference_update(usernames)
+                self._put(room_code, room)
+
+    def drop(self, room_code):
+        """Forget a room's away marks once the room itself is gone, keeping its sockets."""
+        with self._lock:
+            room = self._get(room_code)
+            if room is not None:
+                room["away"].clear()
+                self._put(room_code, room)
+
+    def clear(self):
+        """Forget every room held in this process, or registered through it when shared."""
+        with self._lock:
+            cache = self.shared_cache
+            if cache is not None:
+                cache.delete_many([self.KEY_PREFIX + room_code for room_code in self._local_rooms])
+            self._rooms.clear()
+            self._local_rooms.clear()
+
+    def has_heartbeats(self):
+        with self._lock:
+            rooms = [self._get(room_code) for room_code in self._local_rooms]
+            return any(expires_at is not None for room in rooms if room
+                       for _, expires_at in room["channels"].values())
+
+    # Keeping the roster in step, from the event loop
+
+    async def _update_roster(self, change, room_code, usernames):
+        # Straight from memory when the room is cached here, a cold room loads from the database
+        if roster_cache.is_local and roster_cache.get(room_code) is not None:
+            return change(room_code, usernames)
+        return await sync_to_async(change)(room_code, usernames)
+
+    async def arrived(self, room_code, username, channel_layer=None):
+        """Put a participant who was away back on the roster, as their socket connected."""
+        if username not in self.away(room_code):
+            return
+        self.forget(room_code, [username])
+        version, joined = await self._update_roster(roster_cache.add, room_code, [username])
+        if joined:
+            await group_broadcast(room_code, {
+                "type": "participant_joined",
+                "usernames": joined,
+                "version": version,
+            }, channel_layer)
+
+    async def departed(self, room_code, username, channel_layer=None):
+        """Take a participant off the roster, as their last socket in the room went."""
+        participants = roster_cache.get(room_code) if roster_cache.is_local else None
+        if participants is None:
+            # Loaded first, a roster read later from the database would still list them
+            participants = await sync_to_async(roster_cache.load)(room_code)
+        if not participants or username not in participants:
+            return
+        version, left = await self._update_roster(roster_cache.remove, room_code, [username])
+        # After the removal, which clears the mark like any membership change
+        self.mark_away(room_code, username)
+        if left:
+            await group_broadcast(room_code, {
+                "type": "participant_left",
+                "usernames": left,
+                "version": version,
+            }, channel_layer)
+
+    def watch(self):
+        """Start expiring sockets whose heartbeats stop. Must be called from the event loop."""
+        loop = asyncio.get_running_loop()
+        task = self._task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._task = loop.create_task(self._sweep())
+
+    async def sweep(self, now=None):
+        """Expire dead sockets once: close them and take users with no socket left off the roster."""
+        channel_layer = get_channel_layer()
+        expired = self.expire(now)
+        for room_code, channel_name, username in expired:
+            await channel_layer.send(channel_name, {"type": "presence_expired"})
+            if username is not None:
+                await self.departed(room_code, username, channel_layer)
+        return expired
+
+    async def _sweep(self):
+        # Stops once no socket sends heartbeats, the next heartbeat starts it again
+        while self.has_heartbeats():
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self.sweep()
+            except Exception:
+                # Try again next time, the sweep must outlive a failed send or database hiccup
+                logger.exception("Error in presence sweep")
+
+
+def username_from_token(token):
+    """The username a JWT access token was issued for, or None if it isn't valid."""
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    try:
+        user_id = AccessToken(token)[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+    return get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(
+        "username", flat=True).first()
+
+
+presence = Presence()
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from asgiref.sync import SyncToAsync, async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .broadcast import prepare_broadcast, room_group_name
+
+'''
+Outbox for events published by synchronous code (REST views and model signals).
+
+publish() encodes the event straight away but only queues it once the surrounding database
+transaction commits (transaction.on_commit), so clients never hear about a write that was
+rolled back, and it never waits on the channel layer itself (called from async code it
+queues the event immediately). Queued events are drained by one asyncio task on the ASGI
+server's event loop: everything queued since the last drain is grouped by room and each room
+gets a single group_send, an "encoded_events" message carrying up to WS_PUBLISH_BATCH_SIZE
+events in order (a lone event still goes out as "encoded_event").
+
+When the process has no running ASGI event loop (management commands, the shell, tests using
+the synchronous test client) the events are sent inline after commit instead.
+'''
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def server_loop():
+    """The event loop that the sync code in this thread was called from, if any."""
+    # Sync views run in a thread by sync_to_async, which records the loop it was called from
+    loop = getattr(SyncToAsync.threadlocal, "main_event_loop", None)
+    if loop is not None and loop.is_running():
+        return loop
+    return None
+
+
+def group_by_room(items, batch_size):
+    """Turn queued (room_code, message) pairs into channel layer messages, one per room batch."""
+    rooms = OrderedDict()
+    for room_code, message in items:
+        rooms.setdefault(room_code, []).append(message)
+
+    for room_code, messages in rooms.items():
+        for start in range(0, len(messages), batch_size):
+            chunk = messages[start:start + batch_size]
+            if len(chunk) == 1:
+                yield room_code, chunk[0]
+            else:
+                yield room_code, {"type": "encoded_events", "events": chunk}
+
+
+class EventPublisher:
+
+    def __init__(self, batch_size=None):
+        self._batch_size = batch_size
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self.sent_messages = 0
+
+    @property
+    def batch_size(self):
+        if self._batch_size is not None:
+            return self._batch_size
+        return getattr(settings, "WS_PUBLISH_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+    def publish(self, room_code, event):
+        """Send an event to everyone in a room once the current transaction commits."""
+        message = prepare_broadcast(event, room_code)
+        loop = running_loop()
+        if loop is not None:
+            # Called from async code, which is never inside a transaction
+            self._enqueue(room_code, message, loop)
+            return
+        loop = server_loop()
+        transaction.on_commit(lambda: self._enqueue(room_code, message, loop))
+
+    def pending(self):
+        return len(self._queue)
+
+    def _enqueue(self, room_code, message, loop):
+        if loop is None or loop.is_closed():
+            async_to_sync(self._send)([(room_code, message)])
+            return
+        with self._lock:
+            self._queue.append((room_code, message))
+        loop.call_soon_threadsafe(self._start_drain, loop)
+
+    def _start_drain(self, loop):
+        # Runs on the server loop, so only one drain task exists per loop at a time
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._task = loop.create_task(self._drain())
+
+    def _take(self):
+        with self._lock:
+            items = list(self._queue)
+            self._queue.clear()
+        return items
+
+    async def _drain(self):
+        while True:
+            items = self._take()
+            if not items:
+                return
+            await self._send(items)
+
+    async def _send(self, items):
+        channel_layer = get_channel_layer()
+        for room_code, message in group_by_room(items, self.batch_size):
+            try:
+                await channel_layer.group_send(room_group_name(room_code), message)
+                self.sent_messages += 1
+            except Exception:
+                logger.exception("Could not publish events to room %s", room_code)
+
+    async def flush(self):
+        """Wait until everything queued so far has been handed to the channel layer."""
+        task = self._task
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            await task
+        await self._drain()
+
+
+publisher = EventPublisher()
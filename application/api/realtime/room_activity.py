@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from api.services.room_reaper import reap_rooms, touch_rooms
+
+'''
+Keeping rooms with open sockets from being reaped.
+
+RoomConsumer counts its sockets here, per room. The first socket starts a keep-alive task on
+the event loop that wakes every ROOM_ACTIVITY_INTERVAL seconds and marks every room with a
+socket in this process as active, one UPDATE for all of them. So a room reaches the reaper
+(api/services/room_reaper.py) only once no process has had a socket in it for
+ROOM_REAPER_GRACE seconds, which should be a few times ROOM_ACTIVITY_INTERVAL.
+
+With ROOM_REAPER_INTERVAL set, the same task also runs the reaper about every that many
+seconds, instead of running the reap_rooms command from cron. Several ASGI processes can
+all do so, each batch locks the rooms it deletes.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class RoomActivity:
+
+    def __init__(self):
+        # room_code -> open sockets in this process
+        self._sockets = Counter()
+        self._task = None
+
+    def opened(self, room_code):
+        """Count a socket of a room. Must be called from the event loop."""
+        self._sockets[room_code] += 1
+        loop = asyncio.get_running_loop()
+        task = self._task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._task = loop.create_task(self._keep_alive())
+
+    def closed(self, room_code):
+        """Stop counting a socket of a room."""
+        self._sockets[room_code] -= 1
+        if self._sockets[room_code] <= 0:
+            del self._sockets[room_code]
+
+    def live_rooms(self):
+        """Room codes with an open socket in this process."""
+        return list(self._sockets)
+
+    def clear(self):
+        self._sockets.clear()
+
+    async def tick(self, reap=False):
+        """Mark this process's live rooms as active, and run the reaper if reap."""
+        await sync_to_async(touch_rooms)(self.live_rooms())
+        if reap:
+            return await sync_to_async(reap_rooms)(live=self.live_rooms())
+
+    async def _keep_alive(self):
+        loop = asyncio.get_running_loop()
+        last_reap = loop.time()
+        while True:
+            await asyncio.sleep(settings.ROOM_ACTIVITY_INTERVAL)
+            reap_interval = settings.ROOM_REAPER_INTERVAL
+            reap = reap_interval is not None and loop.time() - last_reap >= reap_interval
+            try:
+                result = await self.tick(reap)
+                if reap:
+                    last_reap = loop.time()
+                    logger.info("Room reaper: %s", result)
+            except Exception:
+                # Try again next time, the task must outlive a database hiccup
+                logger.exception("Error in room keep-alive")
+
+
+room_activity = RoomActivity()
@@ -0,0 +1,190 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+'''
+Per-room participant roster cache.
+
+The roster of a room (the usernames in StudySession.participants, in join order) is loaded
+from the database once and then kept up to date incrementally from the participants
+m2m_changed signal (see api/signals.py), so RoomConsumer and the group study room views can
+answer "who is in this room" from memory instead of re-reading every participant row on each
+connect, disconnect, join and leave. Participants whose sockets all went are kept off it,
+see api/realtime/presence.py.
+
+Every change bumps the room's roster version. Clients receive participant_joined and
+participant_left deltas tagged with the new version and ask for a roster_sync snapshot when
+they notice a gap. Invalidating a room keeps its version (the next load bumps it again), so
+versions only ever grow for as long as the room exists.
+
+By default the cache lives in this process. Setting ROSTER_CACHE_ALIAS to one of the CACHES
+aliases shares it between workers instead, which backend/settings.py does with the Redis
+cache when CHANNEL_LAYER=redis. Shared entries expire ROSTER_CACHE_TTL seconds after their
+last change, and a room's first version there is the current time in microseconds rather
+than 0 (still an exact JavaScript number), so a roster loaded again after its entry expired
+never goes back to a version clients have already seen. Updates are a plain
+read-modify-write, so the last writer wins under concurrent changes to the same room.
+'''
+
+DEFAULT_TTL = 24 * 60 * 60
+
+class RosterCache:
+
+    KEY_PREFIX = "roster:"
+
+    def __init__(self, cache_alias=None):
+        self.cache_alias = cache_alias
+        self._rooms = {}
+        self._lock = threading.RLock()
+
+    @property
+    def shared_cache(self):
+        alias = self.cache_alias or getattr(settings, "ROSTER_CACHE_ALIAS", None)
+        return caches[alias] if alias else None
+
+    @property
+    def is_local(self):
+        """True when the rosters live in this process, so reads never block on I/O."""
+        return self.shared_cache is None
+
+    def _first_version(self):
+        if self.shared_cache is None:
+            return 0
+        return int(time.time() * 1_000_000)
+
+    # Each entry is {"version": int, "participants": [usernames] or None when invalidated}
+
+    def _read(self, room_code):
+        cache = self.shared_cache
+        if cache is None:
+            return self._rooms.get(room_code)
+        return cache.get(self.KEY_PREFIX + room_code)
+
+    def _write(self, room_code, entry):
+        cache = self.shared_cache
+        if cache is None:
+            self._rooms[room_code] = entry
+        else:
+            cache.set(self.KEY_PREFIX + room_code, entry,
+                      getattr(settings, "ROSTER_CACHE_TTL", DEFAULT_TTL))
+
+    def _query(self, room_code):
+        from api.models import StudySession
+        from .presence import presence
+        through = StudySession.participants.through
+        participants = list(
+            through.objects.filter(studysession__roomCode=room_code)
+            .order_by("pk")
+            .values_list("user__username", flat=True)
+        )
+        exists = bool(participants) or StudySession.objects.filter(roomCode=room_code).exists()
+        # Participants whose sockets all went stay off the roster until one connects again
+        away = presence.away(room_code)
+        return [username for username in participants if username not in away], exists
+
+    def _fill(self, room_code, participants):
+        """Store a freshly queried roster unless another thread got there first."""
+        entry = self._read(room_code)
+        if entry is None:
+            entry = {"version": self._first_version(), "participants": participants}
+        elif entry["participants"] is None:
+            entry = {"version": entry["version"] + 1, "participants": participants}
+        else:
+            return entry
+        self._write(room_code, entry)
+        return entry
+
+    def get(self, room_code):
+        """Return the cached usernames for a room, or None if the room isn't cached."""
+        cached = self.cached_snapshot(room_code)
+        return None if cached is None else cached[1]
+
+    def cached_snapshot(self, room_code):
+        """Return (version, usernames) for a cached room, or None if the room isn't cached."""
+        with self._lock:
+            entry = self._read(room_code)
+            if entry is None or entry["participants"] is None:
+                return None
+            return entry["version"], list(entry["participants"])
+
+    def snapshot(self, room_code):
+        """Return (version, usernames) for a room, reading the database on a cache miss."""
+        cached = self.cached_snapshot(room_code)
+        if cached is not None:
+            return cached
+
+        participants, exists = self._query(room_code)
+        if not exists:
+            return 0, []
+        with self._lock:
+            entry = self._fill(room_code, participants)
+            return entry["version"], list(entry["participants"])
+
+    def load(self, room_code):
+        """Return the usernames for a room, reading them from the database on a cache miss."""
+        return self.snapshot(room_code)[1]
+
+    def _apply(self, room_code, usernames, joining):
+        """Add or remove usernames, returning (version, usernames that actually changed)."""
+        from .presence import presence
+        # Joining or leaving for real overrides being away (see api/realtime/presence.py)
+        presence.forget(room_code, usernames)
+        with self._lock:
+            entry = self._read(room_code)
+            if entry is not None and entry["participants"] is not None:
+                participants = entry["participants"]
+                if joining:
+                    changed = [username for username in usernames if username not in participants]
+                    participants = participants + changed
+                else:
+                    changed = [username for username in participants if username in usernames]
+                    participants = [username for username in participants if username not in usernames]
+                if not changed:
+                    return entry["version"], []
+                entry = {"version": entry["version"] + 1, "participants": participants}
+                self._write(room_code, entry)
+                return entry["version"], changed
+
+        # Cold room: the database already reflects the change, so load it as the new version
+        participants, exists = self._query(room_code)
+        if not exists:
+            return 0, []
+        with self._lock:
+            entry = self._read(room_code)
+            version = self._first_version() if entry is None else entry["version"] + 1
+            self._write(room_code, {"version": version, "participants": participants})
+        return version, [username for username in usernames if (username in participants) == joining]
+
+    def add(self, room_code, usernames):
+        """Append usernames to a room's roster, returning (version, usernames actually added)."""
+        return self._apply(room_code, usernames, joining=True)
+
+    def remove(self, room_code, usernames):
+        """Drop usernames from a room's roster, returning (version, usernames actually removed)."""
+        return self._apply(room_code, usernames, joining=False)
+
+    def invalidate(self, room_code):
+        """Forget a room's usernames but keep its version, so the next load continues from it."""
+        with self._lock:
+            entry = self._read(room_code)
+            if entry is not None and entry["participants"] is not None:
+                self._write(room_code, {"version": entry["version"], "participants": None})
+
+    def drop(self, room_code):
+        """Forget a room entirely, used once the room itself is gone."""
+        with self._lock:
+            cache = self.shared_cache
+            if cache is None:
+                self._rooms.pop(room_code, None)
+            else:
+                cache.delete(self.KEY_PREFIX + room_code)
+
+    def clear(self):
+        """Forget every cached roster held in this process."""
+        with self._lock:
+            self._rooms.clear()
+
+
+roster_cache = RosterCache()
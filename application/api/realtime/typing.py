@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .broadcast import group_broadcast
+
+'''
+Server-side coalescing of "typing" indicators.
+
+Instead of fanning every keystroke-driven typing message out to the whole room, RoomConsumer
+records the sender here. One flusher task per room wakes up every TYPING_BATCH_INTERVAL
+seconds and, only if the set of typing senders changed since the last flush, sends a single
+typing_batch event listing everyone currently typing. A sender drops out of the batch
+TYPING_EXPIRY seconds after their last typing message (or straight away when their socket
+disconnects), and the flusher stops once a room has nobody typing.
+
+Each ASGI worker coalesces the typing messages of its own sockets, so a batch only lists the
+senders typing through that worker. Batches carry the worker's id and a client shows the
+union of the latest batch from each worker, so with several workers their batches add up
+instead of replacing one another.
+'''
+
+DEFAULT_BATCH_INTERVAL = 0.3
+DEFAULT_EXPIRY = 3.0
+
+
+class TypingCoalescer:
+
+    def __init__(self, interval=None, expiry=None):
+        self._interval = interval
+        self._expiry = expiry
+        self.worker = uuid.uuid4().hex
+        # room_code -> {"senders": {sender: expires_at}, "sent": (senders in last batch), "task": Task}
+        self._rooms = {}
+
+    @property
+    def interval(self):
+        if self._interval is not None:
+            return self._interval
+        return getattr(settings, "TYPING_BATCH_INTERVAL", DEFAULT_BATCH_INTERVAL)
+
+    @property
+    def expiry(self):
+        if self._expiry is not None:
+            return self._expiry
+        return getattr(settings, "TYPING_EXPIRY", DEFAULT_EXPIRY)
+
+    def typing(self, room_code, sender):
+        """Record that sender is typing in a room. Must be called from the event loop."""
+        loop = asyncio.get_running_loop()
+        room = self._rooms.setdefault(room_code, {"senders": {}, "sent": (), "task": None})
+        room["senders"][sender] = loop.time() + self.expiry
+
+        task = room["task"]
+        if task is None or task.done() or task.get_loop() is not loop:
+            room["task"] = loop.create_task(self._flush_room(room_code, room))
+
+    def stop_typing(self, room_code, sender):
+        """Drop sender from a room's batch, e.g. when their socket disconnects."""
+        room = self._rooms.get(room_code)
+        if room is not None:
+            room["senders"].pop(sender, None)
+
+    async def _flush_room(self, room_code, room):
+        loop = asyncio.get_running_loop()
+        channel_layer = get_channel_layer()
+        while True:
+            await asyncio.sleep(self.interval)
+
+            now = loop.time()
+            for sender, expires_at in list(room["senders"].items()):
+                if expires_at <= now:
+                    del room["senders"][sender]
+
+            senders = tuple(room["senders"])
+            if senders != room["sent"]:
+                room["sent"] = senders
+                await group_broadcast(room_code, {
+                    "type": "typing_batch",
+                    "worker": self.worker,
+                    "senders": list(senders),
+                }, channel_layer)
+
+            # Re-check after the send: someone may have started typing meanwhile
+            if not room["senders"]:
+                if self._rooms.get(room_code) is room:
+                    del self._rooms[room_code]
+                return
+
+
+typing_coalescer = TypingCoalescer()
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+
+from api.models import Friends, Status
+
+'''
+Cache of the accepted friendships, as a set of friend ids per user.
+
+friend_graph.friends_of(user) is read from the database once (one query) and then kept, so
+are_friends, mutual_friends_count and suggestions are set operations instead of queries.
+It holds at most FRIEND_GRAPH_MAX_SIZE users, least recently used first out, and a user's
+friends are re-read after FRIEND_GRAPH_TTL seconds.
+
+Friends.save / delete (and update_status and delete_friend, which go through them) update
+the cached sets of both users once committed, see api/signals.py. Bulk queryset writes don't
+send those signals, the TTL bounds how long they can go unnoticed.
+
+With FRIEND_GRAPH_REDIS_URL set the sets live in Redis instead (RedisFriendGraph), shared by
+every worker.
+'''
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_TTL = 600
+
+
+def _user_id(user):
+    return getattr(user, "pk", user)
+
+
+def load_friend_ids(user_ids):
+    """Return {user_id: set of friend ids} for the given users, in one query."""
+    friends = {user_id: set() for user_id in user_ids}
+    edges = (Friends.objects.filter(Q(user1_id__in=friends) | Q(user2_id__in=friends), status=Status.ACCEPTED)
+             .values_list("user1_id", "user2_id"))
+    for user1_id, user2_id in edges:
+        if user1_id in friends:
+            friends[user1_id].add(user2_id)
+        if user2_id in friends:
+            friends[user2_id].add(user1_id)
+    return friends
+
+
+class FriendGraph:
+
+    def __init__(self, max_size=None, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        # user id -> (expires_at, set of friend ids), oldest use first
+        self._friends = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, "FRIEND_GRAPH_MAX_SIZE", DEFAULT_MAX_SIZE)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "FRIEND_GRAPH_TTL", DEFAULT_TTL)
+
+    # Storage, overridden by RedisFriendGraph
+
+    def _cached(self, user_id):
+        with self._lock:
+            entry = self._friends.get(user_id)
+            if entry is None:
+                return None
+            expires_at, friend_ids = entry
+            if expires_at <= time.monotonic():
+                del self._friends[user_id]
+                return None
+            self._friends.move_to_end(user_id)
+            return friend_ids
+
+    def _store(self, user_id, friend_ids):
+        with self._lock:
+            self._friends[user_id] = (time.monotonic() + self.ttl, friend_ids)
+            self._friends.move_to_end(user_id)
+            while len(self._friends) > self.max_size:
+                self._friends.popitem(last=False)
+
+    def _link(self, user_id, friend_id, linked):
+        with self._lock:
+            entry = self._friends.get(user_id)
+            if entry is not None:
+                if linked:
+                    entry[1].add(friend_id)
+                else:
+                    entry[1].discard(friend_id)
+
+    def clear(self):
+        with self._lock:
+            self._friends.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._friends)
+
+    # Lookups
+
+    def friends_many(self, users):
+        """Return {user_id: set of friend ids}, loading every uncached user in one query."""
+        found = {}
+        missing = []
+        for user_id in dict.fromkeys(_user_id(user) for user in users):
+            friend_ids = self._cached(user_id)
+            if friend_ids is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = friend_ids
+        self.hits += len(found)
+        if missing:
+            self.misses += len(missing)
+            for user_id, friend_ids in load_friend_ids(missing).items():
+                self._store(user_id, friend_ids)
+                found[user_id] = friend_ids
+        return found
+
+    def friends_of(self, user):
+        """The ids of a user's accepted friends (don't modify the returned set)."""
+        user_id = _user_id(user)
+        return self.friends_many([user_id])[user_id]
+
+    def are_friends(self, user_a, user_b):
+        return _user_id(user_b) in self.friends_of(user_a)
+
+    def mutual_friends_count(self, user_a, user_b):
+        friends = self.friends_many([user_a, user_b])
+        return len(friends[_user_id(user_a)] & friends[_user_id(user_b)])
+
+    def suggestions(self, user, limit=10):
+        """
+        Friends of friends who aren't friends of the user yet, most mutual friends first.
+
+        :return: list of (user_id, mutual friends count), at most limit long
+        """
+        user_id = _user_id(user)
+        friend_ids = self.friends_of(user_id)
+        mutual = Counter()
+        for other_friends in self.friends_many(friend_ids).values():
+            mutual.update(other_friends)
+        for excluded in (user_id, *friend_ids):
+            mutual.pop(excluded, None)
+        return sorted(mutual.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    # Keeping it up to date
+
+    def update(self, user1_id, user2_id, accepted):
+        """Record that two users are (accepted=True) or aren't friends, in the cached sets only."""
+        self._link(user1_id, user2_id, accepted)
+        self._link(user2_id, user1_id, accepted)
+
+
+class RedisFriendGraph(FriendGraph):
+    """FriendGraph keeping each user's friend ids in a Redis set, friends:<user id>."""
+
+    # Redis has no empty sets, every cached set holds this member so an empty one still exists
+    LOADED = "-"
+
+    def __init__(self, url, prefix="friends", ttl=None):
+        super().__init__(ttl=ttl)
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def _key(self, user_id):
+        return f"{self._prefix}:{user_id}"
+
+    def _cached(self, user_id):
+        members = self._redis.smembers(self._key(user_id))
+        if not members:
+            return None
+        return {int(member) for member in members if member != self.LOADED.encode()}
+
+    def _store(self, user_id, friend_ids):
+        key = self._key(user_id)
+        pipe = self._redis.pipeline()
+        pipe.delete(key)
+        pipe.sadd(key, self.LOADED, *friend_ids)
+        pipe.expire(key, max(1, int(self.ttl)))
+        pipe.execute()
+
+    def _link(self, user_id, friend_id, linked):
+        key = self._key(user_id)
+        if not linked:
+            self._redis.srem(key, friend_id)
+        elif self._redis.exists(key):
+            # A set expiring in between only misses the edge until it is loaded again
+            self._redis.sadd(key, friend_id)
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(match=f"{self._prefix}:*"))
+        if keys:
+            self._redis.delete(*keys)
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return sum(1 for _ in self._redis.scan_iter(match=f"{self._prefix}:*"))
+
+
+def _friend_graph():
+    url = getattr(settings, "FRIEND_GRAPH_REDIS_URL", None)
+    return RedisFriendGraph(url) if url else FriendGraph()
+
+
+friend_graph = _friend_graph()
@@ -0,0 +1,31 @@
+from django.db import transaction
+
+from api.models import List, StudySession
+
+'''
+Deleting to-do lists and study rooms.
+
+A List is the root of everything deleted with it: its tasks, its permissions and the study
+session using it all cascade from the List, so deleting the List row deletes them in the same
+transaction, one bulk DELETE per table, without loading the tasks.
+'''
+
+def delete_list(list_id):
+    """Delete a to-do list with its tasks, permissions and study session. Returns False if there was no such list."""
+    deleted, _ = List.objects.filter(pk=list_id).delete()
+    return bool(deleted)
+
+
+def delete_room(study_session):
+    """Delete a study session together with its to-do list."""
+    delete_rooms([study_session])
+
+
+def delete_rooms(study_sessions):
+    """Delete study sessions together with their to-do lists, one cascade for all of them."""
+    list_ids = [session.toDoList_id for session in study_sessions if session.toDoList_id]
+    with transaction.atomic():
+        deleted, per_model = List.objects.filter(pk__in=list_ids).delete()
+        if per_model.get(StudySession._meta.label, 0) < len(study_sessions):
+            # Some had no list to cascade from
+            StudySession.objects.filter(pk__in=[session.pk for session in study_sessions]).delete()
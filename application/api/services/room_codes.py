@@ -0,0 +1,127 @@
+import hashlib
+import hmac
+import string
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from api.models import RoomCodeSequence, StudySession
+
+'''
+Room codes without looking them up.
+
+A room code is 8 characters of A-Z and 0-9, so there are 36^8 of them. Instead of drawing
+codes at random and querying until an unused one turns up, the n-th room gets the n-th
+number of a sequence (RoomCodeSequence) sent through a keyed permutation of [0, 36^8):
+different numbers always give different codes, and without the key (made with secrets) the
+codes don't tell anything about each other. The permutation is a 6 round Feistel network on
+42 bits with HMAC-SHA256 rounds; results past 36^8 are sent through again until they land
+inside (cycle walking), about 1.6 times per code.
+
+A process reserves ROOM_CODE_BLOCK_SIZE numbers at a time and hands them out from memory,
+so most rooms are created with no query for their code. Blocks are only reserved outside
+transactions, where they are committed at once: a rolled back transaction can't give its
+numbers back while this process keeps using them. Inside a transaction with no block left,
+one number is taken in the transaction instead (one query, rolled back with the room if it
+comes to that), and a new block is reserved once the transaction has committed.
+
+Codes written before this existed were random over the same space, so the codes of a new
+block that are already taken are skipped (one query per block). A number taken on its own
+relies on the unique constraint of roomCode for those.
+'''
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 8
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+HALF_BITS = 21
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 6
+
+
+class KeyedPermutation:
+    """A permutation of [0, CODE_SPACE) chosen by a secret key."""
+
+    def __init__(self, secret):
+        key = secret.encode() if isinstance(secret, str) else secret
+        self._rounds = [hmac.new(key, bytes([index]), hashlib.sha256) for index in range(ROUNDS)]
+
+    def _round(self, index, half):
+        digest = self._rounds[index].copy()
+        digest.update(half.to_bytes(3, "big"))
+        return int.from_bytes(digest.digest()[:3], "big") & HALF_MASK
+
+    def _feistel(self, value):
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for index in range(ROUNDS):
+            left, right = right, left ^ self._round(index, right)
+        return (left << HALF_BITS) | right
+
+    def __call__(self, number):
+        if not 0 <= number < CODE_SPACE:
+            raise ValueError(f"{number} is outside the room code space")
+        value = self._feistel(number)
+        while value >= CODE_SPACE:
+            value = self._feistel(value)
+        return value
+
+
+def encode(value):
+    """The room code for a number of [0, CODE_SPACE)."""
+    characters = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        characters.append(ALPHABET[digit])
+    return "".join(reversed(characters))
+
+
+class RoomCodeAllocator:
+
+    def __init__(self, block_size=None):
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._codes = []
+        self._permutation = (None, None)
+
+    @property
+    def block_size(self):
+        return self._block_size or settings.ROOM_CODE_BLOCK_SIZE
+
+    def _codes_for(self, secret, first, count):
+        known, permutation = self._permutation
+        if known != secret:
+            permutation = KeyedPermutation(secret)
+            self._permutation = (secret, permutation)
+        return [encode(permutation(number)) for number in range(first, first + count)]
+
+    def _reserve_block(self):
+        secret, first = RoomCodeSequence.reserve(self.block_size)
+        codes = self._codes_for(secret, first, self.block_size)
+        taken = set(StudySession.objects.filter(roomCode__in=codes).values_list("roomCode", flat=True))
+        # Handed out from the end
+        self._codes = [code for code in reversed(codes) if code not in taken]
+
+    def _refill(self):
+        with self._lock:
+            if not self._codes and not connection.in_atomic_block:
+                self._reserve_block()
+
+    def allocate(self):
+        """Return a room code no room has had before."""
+        with self._lock:
+            if not self._codes and not connection.in_atomic_block:
+                self._reserve_block()
+            if self._codes:
+                return self._codes.pop()
+            secret, number = RoomCodeSequence.reserve(1)
+        # Once committed, the next rooms get theirs from a block again
+        transaction.on_commit(self._refill, robust=True)
+        return self._codes_for(secret, number, 1)[0]
+
+    def clear(self):
+        """Forget the codes held by this process (they are never handed out again)."""
+        with self._lock:
+            self._codes = []
+
+
+room_codes = RoomCodeAllocator()
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from api.models import StudySession
+
+'''
+Bounded cache of the study room identifiers the views keep looking up.
+
+Almost every room request starts by turning a room code into its StudySession (or a to-do list
+into the room it belongs to, to know where to broadcast). room_lookup keeps a RoomRef per room
+(session id, room code, to-do list id and name) so those lookups are a dictionary hit instead
+of a query. It holds at most ROOM_LOOKUP_MAX_SIZE rooms, least recently used first out, and an
+entry is re-read from the database after ROOM_LOOKUP_TTL seconds.
+
+Entries are refreshed when a StudySession is saved and evicted when it is deleted (see
+api/signals.py). Bulk queryset updates and deletes don't send those signals, the TTL bounds
+how long such a change can go unnoticed. Rooms that don't exist are never cached.
+'''
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL = 300
+
+RoomRef = namedtuple("RoomRef", ["session_id", "room_code", "list_id", "session_name"])
+
+
+class RoomLookup:
+
+    FIELDS = ("id", "roomCode", "toDoList_id", "sessionName")
+
+    def __init__(self, max_size=None, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        # room_code -> (expires_at, RoomRef), oldest use first
+        self._rooms = OrderedDict()
+        self._codes_by_list = {}
+        self._codes_by_session = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, "ROOM_LOOKUP_MAX_SIZE", DEFAULT_MAX_SIZE)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "ROOM_LOOKUP_TTL", DEFAULT_TTL)
+
+    def _cached(self, room_code):
+        with self._lock:
+            entry = self._rooms.get(room_code)
+            if entry is None:
+                return None
+            expires_at, ref = entry
+            if expires_at <= time.monotonic():
+                self._evict(room_code)
+                return None
+            self._rooms.move_to_end(room_code)
+            return ref
+
+    def _store(self, ref):
+        with self._lock:
+            # The room code of a session may have changed since it was cached
+            old_code = self._codes_by_session.get(ref.session_id)
+            if old_code is not None and old_code != ref.room_code:
+                self._evict(old_code)
+
+            self._rooms[ref.room_code] = (time.monotonic() + self.ttl, ref)
+            self._rooms.move_to_end(ref.room_code)
+            self._codes_by_session[ref.session_id] = ref.room_code
+            if ref.list_id is not None:
+                self._codes_by_list[ref.list_id] = ref.room_code
+
+            while len(self._rooms) > self.max_size:
+                self._evict(next(iter(self._rooms)))
+        return ref
+
+    def _evict(self, room_code):
+        with self._lock:
+            entry = self._rooms.pop(room_code, None)
+            if entry is None:
+                return
+            ref = entry[1]
+            if self._codes_by_session.get(ref.session_id) == room_code:
+                del self._codes_by_session[ref.session_id]
+            if self._codes_by_list.get(ref.list_id) == room_code:
+                del self._codes_by_list[ref.list_id]
+
+    def _load(self, **filters):
+        row = StudySession.objects.filter(**filters).values_list(*self.FIELDS).first()
+        return self._store(RoomRef(*row)) if row else None
+
+    def _hit_or_load(self, room_code, **filters):
+        ref = self._cached(room_code) if room_code is not None else None
+        if ref is not None:
+            self.hits += 1
+            return ref
+        self.misses += 1
+        return self._load(**filters)
+
+    def by_code(self, room_code):
+        """Return the RoomRef for a room code, or None if there is no such room."""
+        if not room_code:
+            return None
+        return self._hit_or_load(room_code, roomCode=room_code)
+
+    def by_list(self, list_id):
+        """Return the RoomRef of the room a to-do list belongs to, or None."""
+        return self._hit_or_load(self._codes_by_list.get(list_id), toDoList_id=list_id)
+
+    def put(self, session):
+        """Cache (or refresh) a saved StudySession."""
+        if set(self.FIELDS) & session.get_deferred_fields():
+            self.evict_session(session.pk)
+            return None
+        return self._store(RoomRef(session.pk, session.roomCode, session.toDoList_id, session.sessionName))
+
+    def evict_session(self, session_id):
+        with self._lock:
+            room_code = self._codes_by_session.get(session_id)
+            if room_code is not None:
+                self._evict(room_code)
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+            self._codes_by_list.clear()
+            self._codes_by_session.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._rooms)
+
+
+room_lookup = RoomLookup()
@@ -0,0 +1,198 @@
+import time
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from api.models import SessionUser, StudySession, User
+from api.realtime.broadcast import notify_participants
+from api.realtime.roster import roster_cache
+from api.services.list_deletion import delete_rooms
+
+'''
+Joining, leaving and creating group study rooms, each in one transaction.
+
+Membership is a small state machine, for a user and for a room:
+
+    user:  OUT --join r--> IN r --join s--> IN s --leave s--> OUT
+    room:  OPEN --its last participant leaves (or joins another room)--> deleted
+
+Joining the room you are in and leaving a room you are not in change nothing, so a retried
+request is harmless. A deleted room can't be joined again (RoomNotFound).
+
+Every transition locks the user's row, then the rooms it touches (select_for_update, always
+in pk order so two requests can't deadlock on each other), before reading who is in them.
+The user lock keeps two requests of the same user (two tabs) from each putting them in a
+different room. So "is the room empty now?" is answered under the same lock that deleting it
+needs, and a join can't slip in between a last leave and the room being deleted: whichever
+comes second sees the first one's result. On SQLite, where there are no row locks, the transactions are IMMEDIATE instead (see
+DATABASES in backend/settings.py), which takes the database write lock up front.
+
+A user is in one room at a time: entering a room takes them out of every other one, with one
+DELETE for the participant rows and one for the SessionUser rows however many rooms that is.
+
+Participants are written through the m2m table directly, so the m2m_changed roster handler
+(api/signals.py) doesn't run; the roster deltas it would send are sent here instead, once
+the transaction has committed.
+'''
+
+Participant = StudySession.participants.through
+
+# Attempts made at a transition losing a lock conflict (a deadlock or a timed out lock)
+ATTEMPTS = 3
+
+
+class RoomNotFound(Exception):
+    """There is no room with that room code."""
+
+
+def _retry_on_conflict(transition):
+    """Run a transition again if the database gave up on it over a lock, after a short wait."""
+    for attempt in range(ATTEMPTS):
+        try:
+            return transition()
+        except OperationalError:
+            # Inside someone else's transaction there's nothing left to retry
+            if attempt == ATTEMPTS - 1 or connection.in_atomic_block:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def _lock_user(user):
+    list(User.objects.select_for_update().filter(pk=user.pk).values_list("pk", flat=True))
+
+
+def _lock_rooms(user, room_code=None):
+    """
+    Lock the user, then the room with room_code and every room the user is in, in pk order.
+
+    :return: (the room_code room or None, {pk: room} of the user's other rooms)
+    """
+    _lock_user(user)
+    rooms_of_user = Participant.objects.filter(user_id=user.pk).values("studysession_id")
+    condition = Q(pk__in=rooms_of_user)
+    if room_code is not None:
+        condition |= Q(roomCode=room_code)
+    rooms = (StudySession.objects.select_for_update().filter(condition)
+             .only("id", "roomCode", "toDoList").order_by("pk"))
+    target, others = None, {}
+    for room in rooms:
+        if room.roomCode == room_code:
+            target = room
+        else:
+            others[room.pk] = room
+    return target, others
+
+
+def _close_empty(rooms):
+    """Delete the rooms (locked by the caller) nobody is in any more, returning their pks."""
+    if not rooms:
+        return set()
+    occupied = set(Participant.objects.filter(studysession_id__in=rooms)
+                   .values_list("studysession_id", flat=True).distinct())
+    empty = set(rooms) - occupied
+    if empty:
+        delete_rooms([rooms[pk] for pk in empty])
+    return empty
+
+
+def _leave_rooms(user, rooms):
+    """Take the user out of the rooms, closing those left empty. Returns the codes of the rooms still open."""
+    if rooms:
+        Participant.objects.filter(user_id=user.pk, studysession_id__in=rooms).delete()
+    # The SessionUser of the room being joined is replaced too, see _enter
+    SessionUser.objects.filter(user=user).delete()
+    closed = _close_empty(rooms)
+    return [room.roomCode for pk, room in rooms.items() if pk not in closed]
+
+
+def _enter(user, session):
+    Participant.objects.bulk_create([Participant(studysession_id=session.pk, user_id=user.pk)],
+                                    ignore_conflicts=True)
+    return SessionUser.objects.create(user=user, session=session)
+
+
+def _notify_after_commit(user, left, joined=None):
+    def notify():
+        for room_code in left:
+            version, usernames = roster_cache.remove(room_code, {user.username})
+            notify_participants(room_code, "participant_left", usernames, version)
+        if joined is not None:
+            version, usernames = roster_cache.add(joined, [user.username])
+            notify_participants(joined, "participant_joined", usernames, version)
+
+    transaction.on_commit(notify)
+
+
+def join_room(user, room_code):
+    """
+    Move a user into an existing room, out of any other.
+
+    :return: the SessionUser of the user in the room
+    :raises RoomNotFound: if no room has that code (any more)
+    """
+    def join():
+        with transaction.atomic():
+            session, others = _lock_rooms(user, room_code)
+            if session is None:
+                raise RoomNotFound(room_code)
+            # Keeps the reaper off it until the user's socket is open (see api/services/room_reaper.py)
+            StudySession.objects.filter(pk=session.pk).update(lastActive=now())
+            if not others:
+                session_user = SessionUser.objects.filter(user=user, session=session).first()
+                if session_user is not None:
+                    # Already in this room and no other
+                    return session_user
+            left = _leave_rooms(user, others)
+            session_user = _enter(user, session)
+            _notify_after_commit(user, left, session.roomCode)
+        return session_user
+
+    return _retry_on_conflict(join)
+
+
+def leave_room(user, room_code):
+    """
+    Take a user out of a room, deleting the room if that leaves it empty.
+
+    :return: whether the user was in the room
+    :raises RoomNotFound: if no room has that code (any more)
+    """
+    def leave():
+        with transaction.atomic():
+            _lock_user(user)
+            session = (StudySession.objects.select_for_update().filter(roomCode=room_code)
+                       .only("id", "roomCode", "toDoList").first())
+            if session is None:
+                raise RoomNotFound(room_code)
+            removed, _ = Participant.objects.filter(user_id=user.pk, studysession_id=session.pk).delete()
+            session_users = list(SessionUser.objects.filter(user=user, session=session))
+            for session_user in session_users:
+                session_user.user = user
+                # Adds the time spent in the room to the user's statistics
+                session_user.leave_session()
+            if not removed and not session_users:
+                return False
+            if not _close_empty({session.pk: session}):
+                _notify_after_commit(user, [session.roomCode])
+        return True
+
+    return _retry_on_conflict(leave)
+
+
+def create_room(user, session_name):
+    """
+    Create a room (with its shared to-do list) and move its creator into it.
+
+    :return: the new StudySession
+    """
+    def create():
+        with transaction.atomic():
+            _, others = _lock_rooms(user)
+            left = _leave_rooms(user, others)
+            session = StudySession.objects.create(createdBy=user, sessionName=session_name)
+            _enter(user, session)
+            _notify_after_commit(user, left, session.roomCode)
+        return session
+
+    return _retry_on_conflict(create)
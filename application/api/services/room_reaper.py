@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.timezone import now as current_time
+
+from api.models import SessionUser, StudySession
+from api.services.list_deletion import delete_rooms
+
+'''
+Deleting study rooms nobody uses any more, and closing SessionUser rows left open.
+
+A room is only deleted by a leave when its last participant leaves through the API. Sockets
+that just drop leave the room, its to-do list, tasks and SessionUser rows behind. Every room
+has a lastActive time, set when it is created or joined and kept fresh while it has open
+sockets (api/realtime/room_activity.py). reap_rooms deletes the rooms whose lastActive is more
+than ROOM_REAPER_GRACE seconds old, with everything that cascades from their list.
+
+Rooms are deleted batch_size at a time, each batch in its own transaction, so the reaper never
+holds locks for long or builds one huge cascade. Each batch is locked and read again under
+the lock, so a room joined meanwhile (which refreshes lastActive) is left alone.
+
+Then the SessionUser rows still open (left_at empty) for rooms their user is no longer a
+participant of are closed, left_at set to now, also batch_size per UPDATE. No study time is
+added to the user for those, they never left properly.
+'''
+
+Participant = StudySession.participants.through
+
+
+def touch_rooms(room_codes, now=None):
+    """Mark rooms as active now, one UPDATE for all of them. Returns the number of rooms found."""
+    if not room_codes:
+        return 0
+    return StudySession.objects.filter(roomCode__in=room_codes).update(lastActive=now or current_time())
+
+
+def abandoned_rooms(grace=None, now=None, live=()):
+    """Rooms inactive for more than grace seconds, except those with a room code in live."""
+    grace = settings.ROOM_REAPER_GRACE if grace is None else grace
+    cutoff = (now or current_time()) - timedelta(seconds=grace)
+    return StudySession.objects.filter(lastActive__lt=cutoff).exclude(roomCode__in=live)
+
+
+def stale_session_users():
+    """Open SessionUser rows of users who aren't a participant of that room any more."""
+    participant = Participant.objects.filter(studysession_id=OuterRef("session_id"), user_id=OuterRef("user_id"))
+    return SessionUser.objects.filter(left_at__isnull=True).exclude(Exists(participant))
+
+
+def reap_rooms(grace=None, batch_size=None, live=(), now=None):
+    """
+    Delete abandoned rooms, then close stale SessionUser rows, batch_size per transaction.
+
+    :param live: room codes to keep whatever their lastActive, those with sockets in this process
+    :return: {"rooms": rooms deleted, "session_users": SessionUser rows closed}
+    """
+    batch_size = batch_size or settings.ROOM_REAPER_BATCH_SIZE
+    now = now or current_time()
+    result = {"rooms": 0, "session_users": 0}
+
+    while True:
+        with transaction.atomic():
+            rooms = list(abandoned_rooms(grace, now, live).select_for_update()
+                         .only("id", "roomCode", "toDoList").order_by("pk")[:batch_size])
+            if not rooms:
+                break
+            delete_rooms(rooms)
+        result["rooms"] += len(rooms)
+
+    while True:
+        with transaction.atomic():
+            ids = list(stale_session_users().values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            result["session_users"] += SessionUser.objects.filter(pk__in=ids, left_at__isnull=True).update(left_at=now)
+
+    return result
@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from api.models import List, TaskTombstone, toDoList
+
+'''
+Applies a batch of task operations to one to-do list in a single transaction.
+
+Each operation is a dict with an "op" of:
+    create  {"op": "create", "title": ..., "content": ...}
+    toggle  {"op": "toggle", "task_id": ...}
+    delete  {"op": "delete", "task_id": ...}
+
+Operations are applied in order (toggling a task twice leaves it as it was, a task can't be
+used after it was deleted) but written with at most one bulk_create, one bulk_update and one
+delete, whatever the size of the batch. If any operation is invalid nothing is written.
+The whole batch is one revision of the list: the list's revision is bumped once and stamped
+on every task it writes (and on a TaskTombstone per deleted task).
+'''
+
+OPERATIONS = ("create", "toggle", "delete")
+MAX_OPERATIONS = 500
+
+
+class TaskBatchError(ValueError):
+    """An operation in the batch is invalid, the whole batch is rejected."""
+
+
+def _task_id(index, operation):
+    try:
+        return int(operation["task_id"])
+    except (KeyError, TypeError, ValueError):
+        raise TaskBatchError(f"Operation {index} needs a numeric task_id")
+
+
+def _validate(operations):
+    if not isinstance(operations, list) or not operations:
+        raise TaskBatchError("operations must be a non-empty list")
+    if len(operations) > MAX_OPERATIONS:
+        raise TaskBatchError(f"At most {MAX_OPERATIONS} operations per batch")
+
+    task_ids = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+            raise TaskBatchError(f"Operation {index} must have an op of {', '.join(OPERATIONS)}")
+        if operation["op"] == "create":
+            title = operation.get("title")
+            if not title or len(title) > 255:
+                raise TaskBatchError(f"Operation {index} needs a title of 1 to 255 characters")
+            if len(operation.get("content") or "") > 1000:
+                raise TaskBatchError(f"Operation {index} has content over 1000 characters")
+        else:
+            task_ids.add(_task_id(index, operation))
+    return task_ids
+
+
+def apply_task_operations(list_id, operations):
+    """
+    Apply the operations to the tasks of a list.
+
+    :return: (list, results, event) - the List row as a values() dict with its new revision,
+        one result dict per operation in order, and the aggregated tasks_batch event for the
+        list's room
+    :raises TaskBatchError: if the list doesn't exist or an operation is invalid
+    """
+    task_ids = _validate(operations)
+
+    with transaction.atomic():
+        todo_list = (List.objects.select_for_update().filter(pk=list_id)
+                     .values("id", "is_shared", "revision").first())
+        if todo_list is None:
+            raise TaskBatchError("List doesn't exist")
+
+        # task id -> is_completed, for the tasks of this list the batch refers to
+        states = dict(toDoList.objects.filter(list_id=list_id, pk__in=task_ids)
+                      .values_list("id", "is_completed"))
+        original = dict(states)
+        deleted = []
+        new_tasks = []
+        results = []
+
+        for index, operation in enumerate(operations):
+            if operation["op"] == "create":
+                task = toDoList(list_id=list_id, title=operation["title"],
+                                content=operation.get("content") or "")
+                new_tasks.append(task)
+                results.append({"op": "create", "task": task})
+                continue
+
+            task_id = _task_id(index, operation)
+            if task_id not in states:
+                raise TaskBatchError(f"Operation {index}: task {task_id} isn't in this list")
+            if operation["op"] == "toggle":
+                states[task_id] = not states[task_id]
+                results.append({"op": "toggle", "task_id": task_id, "is_completed": states[task_id]})
+            else:
+                del states[task_id]
+                deleted.append(task_id)
+                results.append({"op": "delete", "task_id": task_id})
+
+        # The list row is locked, so the bumped revision is ours
+        revision = todo_list["revision"] = todo_list["revision"] + 1
+        List.objects.filter(pk=list_id).update(revision=F("revision") + 1)
+        modified = now()
+
+        if deleted:
+            toDoList.objects.filter(pk__in=deleted).delete()
+            TaskTombstone.objects.bulk_create(
+                [TaskTombstone(list_id=list_id, task_id=task_id, revision=revision) for task_id in deleted])
+            TaskTombstone.prune(list_id)
+        toggled = {task_id: done for task_id, done in states.items() if done != original[task_id]}
+        if toggled:
+            toDoList.objects.bulk_update(
+                [toDoList(pk=task_id, is_completed=done, revision=revision, modified=modified)
+                 for task_id, done in toggled.items()],
+                ["is_completed", "revision", "modified"])
+        if new_tasks:
+            for task in new_tasks:
+                task.revision = task.created_revision = revision
+            toDoList.objects.bulk_create(new_tasks)
+
+    created = []
+    for result in results:
+        if result["op"] == "create":
+            task = result["task"]
+            result["task"] = {
+                "id": task.pk,
+                "title": task.title,
+                "content": task.content,
+                "is_completed": task.is_completed,
+                "list_id": list_id,
+            }
+            created.append(result["task"])
+
+    event = {
+        "type": "tasks_batch",
+        "list_id": todo_list["id"],
+        "created": created,
+        "toggled": [{"task_id": task_id, "is_completed": done} for task_id, done in toggled.items()],
+        "deleted": deleted,
+        "revision": revision,
+    }
+    return todo_list, results, event
@@ -0,0 +1,55 @@
+from api.models import List, TaskTombstone, toDoList
+from api.services.todo_loader import TASK_FIELDS
+
+'''
+Delta sync for a to-do list: what changed in it since a revision the client already has.
+
+Every change to a list's tasks bumps List.revision and stamps the new revision on the task
+(toDoList.revision, and toDoList.created_revision when it is created) or, for a deletion, on
+a TaskTombstone. A client keeps the revision of the last state it saw (the list's "revision"
+in api/todolists/ and the events of the room) and after a reconnect asks for
+api/todolists/changes/?list_id=<id>&since=<revision> instead of reloading the whole list.
+
+A since ahead of the list's revision means the client's state isn't from this list (or the
+database was reset), the response then has "reset": True and every task under "created". So
+does a since older than List.pruned_revision: the tombstones of deletions after it may be gone
+(see TaskTombstone.prune), so the client has to refetch the whole list.
+'''
+
+
+def changes_since(list_id, since=0):
+    """
+    Return the changes to a list's tasks after revision since, or None if the list doesn't exist.
+
+    :return: {"list_id", "revision", "reset", "created", "updated", "deleted"} - created and
+        updated are task dicts (like in api/todolists/), deleted is a list of task ids
+    """
+    # Read before the tasks, so a change made in between is sent again next time, never missed
+    revisions = List.objects.filter(pk=list_id).values_list("revision", "pruned_revision").first()
+    if revisions is None:
+        return None
+    revision, pruned_revision = revisions
+    reset = since > revision or since < pruned_revision
+    if reset:
+        since = 0
+
+    created, updated = [], []
+    tasks = (toDoList.objects.filter(list_id=list_id, revision__gt=since).order_by("pk")
+             .values(*TASK_FIELDS, "created_revision"))
+    for task in tasks:
+        task.pop("list_id")
+        (created if task.pop("created_revision") > since else updated).append(task)
+
+    deleted = []
+    if not reset:
+        deleted = list(TaskTombstone.objects.filter(list_id=list_id, revision__gt=since)
+                       .order_by("task_id").values_list("task_id", flat=True).distinct())
+
+    return {
+        "list_id": list_id,
+        "revision": revision,
+        "reset": reset,
+        "created": created,
+        "updated": updated,
+        "deleted": deleted,
+    }
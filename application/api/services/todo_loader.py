@@ -0,0 +1,42 @@
+from django.db.models import Q
+
+from api.models import List, toDoList
+
+'''
+Loads to-do lists with their tasks for ViewToDoList.get.
+
+Always two queries, however many lists there are: one for the lists and one for every task
+in them. Both read values() projections, so the response dicts are built straight from the
+rows without instantiating List or toDoList models.
+'''
+
+LIST_FIELDS = ("id", "name", "is_shared", "revision")
+TASK_FIELDS = ("id", "list_id", "title", "content", "is_completed", "creation_date")
+
+
+def load_lists(lists):
+    """Return the lists in a List queryset as dicts, each with its tasks under "tasks"."""
+    response_data = [dict(todo_list, tasks=[]) for todo_list in lists.order_by("pk").values(*LIST_FIELDS)]
+    if not response_data:
+        return response_data
+
+    by_id = {todo_list["id"]: todo_list for todo_list in response_data}
+    tasks = toDoList.objects.filter(list_id__in=by_id).order_by("pk").values(*TASK_FIELDS)
+    for task in tasks:
+        by_id[task.pop("list_id")]["tasks"].append(task)
+    return response_data
+
+
+def user_lists(user):
+    """The personal (not shared) lists a user has a Permission for."""
+    return load_lists(List.objects.filter(permission__user_id=user, is_shared=False))
+
+
+def group_list(list_id):
+    """The list of a group study room, as a one element list (or empty if it doesn't exist)."""
+    return load_lists(List.objects.filter(pk=list_id))
+
+
+def readable_lists(user):
+    """The lists a user may read: those they have a Permission for and those of rooms they are in."""
+    return List.objects.filter(Q(permission__user_id=user) | Q(studysession__participants=user))
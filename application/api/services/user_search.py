@@ -0,0 +1,171 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from api.models import User, UserSearchToken
+from api.services.friend_graph import friend_graph
+
+'''
+Find-friend search over the UserSearchToken trigram index.
+
+search_users(query) looks the query's least common trigrams up in the index to find the
+candidate users, so the cost follows how many users share them rather than the size of the
+user table, then checks the candidates really contain every word of the query and ranks them:
+
+    0   the username is the query (with or without the @)
+    1   the username, first name or last name starts with the query
+    2   the query is somewhere else in them
+
+then by id. Query words of one or two letters match the start of a word, longer ones match
+anywhere. A query without any word (e.g. an empty q) lists every user, by id.
+
+Users are indexed when they are saved (see api/signals.py). Users created with bulk_create
+aren't, nor were the users from before the index existed: "manage.py migrate" indexes every
+user without tokens when it finishes, and "manage.py rebuild_user_search" rebuilds the index
+from scratch.
+'''
+
+SEARCH_FIELDS = User.SEARCH_FIELDS
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+INDEX_BATCH_SIZE = 1000
+# Candidates are looked up by at most this many of the query's tokens, the least common ones
+LOOKUP_TOKENS = 4
+# English letters, most common first, to guess which tokens few users have
+LETTER_FREQUENCY = "etaoinsrhldcumfpgwybvkxjqz"
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def search_words(text):
+    """The lowercased words of a text, "@alice_1 Smith" -> ["alice", "1", "smith"]."""
+    return [word for word in _NON_WORD.split(text.lower()) if word]
+
+
+def word_tokens(word):
+    """The trigrams of a word padded with two spaces in front."""
+    padded = "  " + word
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def user_tokens(user):
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        for word in search_words(getattr(user, field)):
+            tokens |= word_tokens(word)
+    return tokens
+
+
+def query_tokens(words):
+    """The tokens a user must have to match every word of a query."""
+    tokens = set()
+    for word in words:
+        if len(word) < 3:
+            # Only the start of a word: "  a" or " ab"
+            tokens.add(("  " + word)[-3:])
+        else:
+            tokens |= {word[i:i + 3] for i in range(len(word) - 2)}
+    return tokens
+
+
+def _commonness(token):
+    # Digits and rare letters make rare tokens, the padding of word starts is fairly common
+    return sum(len(LETTER_FREQUENCY) - LETTER_FREQUENCY.index(char) if char in LETTER_FREQUENCY
+               else (10 if char == " " else 0) for char in token)
+
+
+def lookup_tokens(tokens):
+    """The LOOKUP_TOKENS least common tokens, enough to narrow the search to a few candidates."""
+    return sorted(tokens, key=lambda token: (_commonness(token), token))[:LOOKUP_TOKENS]
+
+
+def index_users(users, created=False):
+    """(Re)build the search tokens of the given users. created skips deleting their old tokens."""
+    users = list(users)
+    with transaction.atomic():
+        if not created:
+            UserSearchToken.objects.filter(user__in=users).delete()
+        UserSearchToken.objects.bulk_create(
+            [UserSearchToken(user=user, token=token) for user in users for token in sorted(user_tokens(user))],
+            batch_size=INDEX_BATCH_SIZE)
+
+
+def rebuild_index(batch_size=INDEX_BATCH_SIZE):
+    """Index every user, returning how many there are."""
+    UserSearchToken.objects.all().delete()
+    count = 0
+    users = User.objects.only(*SEARCH_FIELDS).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return count
+        index_users(batch, created=True)
+        count += len(batch)
+        last_pk = batch[-1].pk
+
+
+def index_missing(batch_size=INDEX_BATCH_SIZE):
+    """Index the users that have no search tokens yet, returning how many there were."""
+    count = 0
+    users = User.objects.filter(search_tokens__isnull=True).only(*SEARCH_FIELDS).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return count
+        index_users(batch, created=True)
+        count += len(batch)
+        last_pk = batch[-1].pk
+
+
+def search_users(query, user=None, limit=None, after=None, exclude_friends=True):
+    """
+    Users matching a search query, best matches first.
+
+    :param user: the user searching, left out of the results with (if exclude_friends) their friends
+    :param limit: how many users to return, USER_SEARCH_LIMIT by default
+    :param after: (rank, id) of the last user of the previous page, to return the next one
+    :return: a sliced User queryset with only the id, username, first and last names loaded,
+        each user annotated with its rank
+    """
+    words = search_words(query)
+    limit = limit or getattr(settings, "USER_SEARCH_LIMIT", DEFAULT_LIMIT)
+
+    if words:
+        # The other tokens would mostly match the same users, the word check below is exact anyway
+        tokens = lookup_tokens(query_tokens(words))
+        candidates = (UserSearchToken.objects.filter(token__in=tokens).values("user_id")
+                      .annotate(matched=Count("token")).filter(matched=len(tokens)).values("user_id"))
+        users = User.objects.filter(pk__in=candidates)
+
+        # Having the trigrams doesn't mean having the word, check it on the candidates
+        for word in words:
+            users = users.filter(Q(username__icontains=word) | Q(firstname__icontains=word) | Q(lastname__icontains=word))
+    else:
+        # Nothing to search for, every user matches
+        users = User.objects.all()
+
+    if user is not None:
+        users = users.exclude(pk=user.pk)
+        if exclude_friends:
+            friend_ids = friend_graph.friends_of(user)
+            if friend_ids:
+                users = users.exclude(pk__in=friend_ids)
+
+    phrase = " ".join(words)
+    rank = Case(
+        When(Q(username__iexact=phrase) | Q(username__iexact="@" + phrase), then=Value(0)),
+        When(Q(username__istartswith="@" + phrase) | Q(firstname__istartswith=phrase)
+             | Q(lastname__istartswith=phrase), then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    ) if words else Value(2, output_field=IntegerField())
+    users = users.annotate(rank=rank)
+    if after is not None:
+        # Keyset pagination, see api/views/pagination.py
+        after_rank, after_id = after
+        users = users.filter(Q(rank__gt=after_rank) | Q(rank=after_rank, pk__gt=after_id))
+    return users.order_by("rank", "pk").only("id", *SEARCH_FIELDS)[:limit]
@@ -0,0 +1,108 @@
+from django.db import connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from api.models import Friends, Status, StudySession, User, UserSearchToken
+from api.realtime.broadcast import broadcast_roster_snapshot, notify_participants
+from api.realtime.presence import presence
+from api.realtime.roster import roster_cache
+from api.services.friend_graph import friend_graph
+from api.services.room_lookup import room_lookup
+from api.services.user_search import SEARCH_FIELDS, index_missing, index_users
+
+'''
+Signal handlers keeping the in-memory caches in step with the database.
+Connected in ApplicationConfig.ready().
+'''
+
+@receiver(m2m_changed, sender=StudySession.participants.through)
+def update_roster_on_participants_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # session.participants.add/remove/clear(...)
+        if action == "post_add" and pk_set:
+            usernames = User.objects.filter(pk__in=pk_set).order_by("pk").values_list("username", flat=True)
+            version, joined = roster_cache.add(instance.roomCode, list(usernames))
+            notify_participants(instance.roomCode, "participant_joined", joined, version)
+        elif action == "post_remove" and pk_set:
+            usernames = User.objects.filter(pk__in=pk_set).values_list("username", flat=True)
+            version, left = roster_cache.remove(instance.roomCode, set(usernames))
+            notify_participants(instance.roomCode, "participant_left", left, version)
+        elif action == "post_clear":
+            roster_cache.invalidate(instance.roomCode)
+            broadcast_roster_snapshot(instance.roomCode)
+        return
+
+    # user.study_sessions.add/remove/clear(...): reload the affected rooms and resync clients
+    if action in ("post_add", "post_remove") and pk_set:
+        room_codes = StudySession.objects.filter(pk__in=pk_set).values_list("roomCode", flat=True)
+    elif action == "pre_clear":
+        room_codes = instance.study_sessions.values_list("roomCode", flat=True)
+    else:
+        return
+    for room_code in room_codes:
+        roster_cache.invalidate(room_code)
+        if action != "pre_clear":
+            broadcast_roster_snapshot(room_code)
+
+
+@receiver(post_save, sender=StudySession)
+def reset_roster_on_session_created(sender, instance, created, **kwargs):
+    if created:
+        roster_cache.drop(instance.roomCode)
+
+
+@receiver(post_delete, sender=StudySession)
+def drop_roster_on_session_deleted(sender, instance, **kwargs):
+    roster_cache.drop(instance.roomCode)
+    presence.drop(instance.roomCode)
+
+
+@receiver(post_save, sender=StudySession)
+def cache_room_on_session_saved(sender, instance, **kwargs):
+    # Only once committed, so a rolled back room is never served from the cache
+    transaction.on_commit(lambda: room_lookup.put(instance))
+
+
+@receiver(post_delete, sender=StudySession)
+def evict_room_on_session_deleted(sender, instance, **kwargs):
+    room_lookup.evict_session(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def drop_rosters_on_user_deleted(sender, instance, **kwargs):
+    # Cascading deletes of participant rows don't send m2m_changed
+    for room_code in instance.study_sessions.values_list("roomCode", flat=True):
+        roster_cache.invalidate(room_code)
+
+
+@receiver(post_save, sender=Friends)
+def update_friend_graph_on_friendship_saved(sender, instance, **kwargs):
+    edge = (instance.user1_id, instance.user2_id, instance.status == Status.ACCEPTED)
+    transaction.on_commit(lambda: friend_graph.update(*edge))
+
+
+@receiver(post_delete, sender=Friends)
+def update_friend_graph_on_friendship_deleted(sender, instance, **kwargs):
+    edge = (instance.user1_id, instance.user2_id, False)
+    transaction.on_commit(lambda: friend_graph.update(*edge))
+
+
+@receiver(post_save, sender=User)
+def index_user_for_search(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only save last_login, nothing to reindex
+    if update_fields is not None and not set(SEARCH_FIELDS) & set(update_fields):
+        return
+    # Nor do full saves that leave the names as they were loaded (study time, profile edits)
+    names = instance.search_names()
+    if not created and names == getattr(instance, "_indexed_names", None):
+        return
+    index_users([instance], created=created)
+    instance._indexed_names = names
+
+
+@receiver(post_migrate)
+def index_users_after_migrate(sender, using="default", **kwargs):
+    # Users from before the search index, or created with bulk_create, become searchable
+    if sender.name != "api" or UserSearchToken._meta.db_table not in connections[using].introspection.table_names():
+        return
+    index_missing()
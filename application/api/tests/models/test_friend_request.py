@@ -1,10 +1,11 @@
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 
 from api.models.friend_request import Friends
 from api.models.user import User
 from api.models.choices import Status
+from api.management.commands.bench_friends import benchmark_friends
 
 
 class FriendsModelTestCase(TestCase):
@@ -115,6 +116,26 @@ class FriendsModelTestCase(TestCase):
 
         self.assertEqual(all_friends, list(Friends.get_all_friends(self.user1)))
 
+    def test_get_all_friends_single_query(self):
+        """Test that the friendships come with both users in one query"""
+        with self.assertNumQueries(1):
+            names = [(f.user1.username, f.user2.username) for f in Friends.get_all_friends(self.user1)]
+        self.assertEqual(len(names), 3)
+
+    def test_lookups_use_indexes(self):
+        """Test that looking up a user's friendships never scans the whole table"""
+        lookups = [
+            Friends.get_all_friends(self.user1),
+            Friends.get_friends_with_status(self.user1, Status.PENDING),
+            Friends.objects.filter(user1=self.user1, user2=self.user2),
+        ]
+        for queryset in lookups:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                plan = " ".join(row[-1] for row in cursor.fetchall())
+            self.assertNotIn("SCAN api_friends", plan)
+
     def test_update_status(self):
         self.assertEqual(self.friendship_rejected.status, Status.REJECTED)
         Friends.update_status(self.friendship_rejected.pk, Status.ACCEPTED)
@@ -151,3 +172,14 @@ class FriendsModelTestCase(TestCase):
 
         self.assertEqual(str(context.exception), "Friendship not found.")
 
+
+class FriendsBenchmarkTestCase(TestCase):
+
+    def test_cost_does_not_depend_on_table_size(self):
+        """Test that the lookups run the same queries whatever the size of the Friends table"""
+        small, large = benchmark_friends([20, 400], friends_per_user=3, repeat=1)
+        self.assertGreaterEqual(large["rows"], 400)
+        for name in ("get_all_friends", "get_friends_with_status", "are_friends"):
+            self.assertEqual(small[f"{name}_queries"], 1)
+            self.assertEqual(large[f"{name}_queries"], 1)
+        self.assertFalse(Friends.objects.exists())
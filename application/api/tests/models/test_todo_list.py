@@ -90,6 +90,35 @@ class toDoListModelTest(TestCase):
             self.todo.creation_date = original_date - timedelta(days=1)
             self.todo.save() 
 
+    """Testing that saving a loaded task doesn't re-read the row to guard the creation_date"""
+    def test_save_does_not_refetch(self):
+        task = toDoList.objects.get(pk=self.todo.pk)
+        task.title = "Renamed"
+        # Bumping the list's revision and the UPDATE of the task, no SELECT
+        with self.assertNumQueries(2):
+            task.save()
+
+        task.creation_date = task.creation_date - timedelta(days=1)
+        with self.assertRaises(ValidationError):
+            task.save()
+
+    """Testing that update_fields saves which leave out creation_date skip the guard"""
+    def test_save_with_update_fields(self):
+        task = toDoList.objects.only("id", "list", "title").get(pk=self.todo.pk)
+        task.title = "Only the title"
+        with self.assertNumQueries(2):
+            task.save(update_fields=["title"])
+        self.assertEqual(toDoList.objects.get(pk=self.todo.pk).title, "Only the title")
+
+    """Testing that toggle_completed flips every matching task and returns the new values"""
+    def test_toggle_completed(self):
+        tasks = toDoList.objects.filter(pk__in=[self.todo.pk, self.todo2.pk]).order_by("pk")
+        self.assertEqual(tasks.toggle_completed(), [
+            {"id": self.todo.pk, "is_completed": False},
+            {"id": self.todo2.pk, "is_completed": True},
+        ])
+        self.assertEqual(toDoList.objects.filter(pk=99999).toggle_completed(), [])
+
     """Testing if another toDoList object is created on the same day, then it should have the same creation_date as the previous toDoList object"""
     def test_creation_date_with_multiple_objects_is_valid(self):
         todoLater = toDoList.objects.create(list = self.list1, title="Test task3")
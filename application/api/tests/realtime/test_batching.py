@@ -0,0 +1,119 @@
+"""Tests for batched outbound WebSocket frames."""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+
+from api import routing
+from api.models import StudySession, User
+from api.realtime.batching import batching_from_query_string, batching_limits, outbound_stats
+from api.realtime.roster import roster_cache
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+                   WS_BATCH_MAX_SIZE=5, WS_BATCH_MAX_DELAY_MS=20)
+class OutboundBatchingTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="Batch Room")
+        outbound_stats.reset()
+
+    def tearDown(self):
+        roster_cache.clear()
+
+    def communicator(self, query=""):
+        return WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                     f"/ws/room/{self.session.roomCode}/{query}")
+
+    async def toggle_tasks(self, count):
+        channel_layer = get_channel_layer()
+        for task_id in range(count):
+            await channel_layer.group_send(f"room_{self.session.roomCode}",
+                                           {"type": "toggle_task", "task_id": task_id, "is_completed": True})
+
+    def test_query_string_limits_are_capped(self):
+        self.assertIsNone(batching_from_query_string(b""))
+        self.assertEqual(batching_from_query_string(b"batch=1"), (5, 20))
+        self.assertEqual(batching_from_query_string(b"batch=1&batch_size=3&batch_delay_ms=500"), (3, 20))
+
+    def test_malformed_limits_fall_back_to_the_caps(self):
+        self.assertEqual(batching_limits("abc", "soon"), (5, 20))
+        self.assertEqual(batching_limits([2], {"ms": 1}), (5, 20))
+        self.assertEqual(batching_from_query_string(b"batch=1&batch_size=abc&batch_delay_ms=2"), (5, 2))
+
+    def test_malformed_query_string_still_connects(self):
+        async def run():
+            communicator = self.communicator("?batch=1&batch_size=abc")
+            connected, _ = await communicator.connect()
+            first = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected, first
+
+        connected, first = async_to_sync(run)()
+        self.assertTrue(connected)
+        self.assertEqual(first[0]["type"], "roster_sync")
+
+    def test_malformed_batching_message_keeps_the_socket(self):
+        async def run():
+            communicator = self.communicator()
+            await communicator.connect()
+            await communicator.receive_json_from()  # roster_sync
+            await communicator.send_json_to({"type": "batching", "enabled": True, "max_batch": "abc",
+                                             "max_delay_ms": None})
+            await communicator.send_json_to({"type": "roster_sync"})
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        frame = async_to_sync(run)()
+        self.assertEqual([event["type"] for event in frame], ["roster_sync"])
+
+    def test_unbatched_client_gets_one_frame_per_event(self):
+        async def run():
+            communicator = self.communicator()
+            await communicator.connect()
+            await communicator.receive_json_from()  # roster_sync
+            await self.toggle_tasks(3)
+            frames = [await communicator.receive_json_from() for _ in range(3)]
+            await communicator.disconnect()
+            return frames
+
+        frames = async_to_sync(run)()
+        self.assertEqual([frame["task_id"] for frame in frames], [0, 1, 2])
+        self.assertEqual(outbound_stats.frames_saved, 0)
+
+    def test_batched_client_gets_arrays(self):
+        async def run():
+            communicator = self.communicator("?batch=1")
+            await communicator.connect()
+            first = await communicator.receive_json_from()  # roster_sync, flushed after the delay
+            await self.toggle_tasks(7)
+            full = await communicator.receive_json_from()
+            rest = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return first, full, rest
+
+        first, full, rest = async_to_sync(run)()
+        self.assertEqual(first[0]["type"], "roster_sync")
+        self.assertEqual([event["task_id"] for event in full], [0, 1, 2, 3, 4])
+        self.assertEqual([event["task_id"] for event in rest], [5, 6])
+        self.assertEqual(outbound_stats.events, 8)
+        self.assertEqual(outbound_stats.frames_saved, 5)
+
+    def test_batching_can_be_negotiated_by_message(self):
+        async def run():
+            communicator = self.communicator()
+            await communicator.connect()
+            await communicator.receive_json_from()  # roster_sync
+            await communicator.send_json_to({"type": "batching", "enabled": True, "max_batch": 2})
+            await communicator.send_json_to({"type": "roster_sync"})
+            await self.toggle_tasks(1)
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        frame = async_to_sync(run)()
+        self.assertEqual(sorted(event["type"] for event in frame), ["roster_sync", "toggle_task"])
@@ -0,0 +1,114 @@
+"""Tests for the environment-driven channel layer setting and cross-worker fan-out."""
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase
+
+from api.models import StudySession, User
+from api.realtime.broadcast import broadcast
+from api.realtime.roster import roster_cache
+from api.tests.realtime.workers import MultiWorkerMixin, worker_application
+from backend.channel_layers import caches_from_env, channel_layers_from_env
+
+
+class ChannelLayersFromEnvTestCase(SimpleTestCase):
+
+    def test_defaults_to_in_memory(self):
+        layers = channel_layers_from_env({})
+        self.assertEqual(layers["default"]["BACKEND"], "channels.layers.InMemoryChannelLayer")
+        self.assertNotIn("hosts", layers["default"]["CONFIG"])
+
+    def test_sharded_redis(self):
+        layers = channel_layers_from_env({
+            "CHANNEL_LAYER": "redis",
+            "CHANNEL_REDIS_HOSTS": "redis://one:6379/0, redis://two:6379/0",
+            "CHANNEL_GROUP_EXPIRY": "7200",
+            "CHANNEL_CAPACITY": "500",
+            "CHANNEL_CAPACITY_OVERRIDES": "http.request=200,websocket.send*=20",
+            "CHANNEL_PREFIX": "studyroom",
+        })
+        self.assertEqual(layers["default"], {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": ["redis://one:6379/0", "redis://two:6379/0"],
+                "prefix": "studyroom",
+                "expiry": 60,
+                "group_expiry": 7200,
+                "capacity": 500,
+                "channel_capacity": {"http.request": 200, "websocket.send*": 20},
+            },
+        })
+
+    def test_redis_url_fallback(self):
+        layers = channel_layers_from_env({"CHANNEL_LAYER": "redis", "REDIS_URL": "redis://cache:6379"})
+        self.assertEqual(layers["default"]["CONFIG"]["hosts"], ["redis://cache:6379"])
+
+    def test_invalid_values(self):
+        with self.assertRaises(ValueError):
+            channel_layers_from_env({"CHANNEL_LAYER": "rabbitmq"})
+        with self.assertRaises(ValueError):
+            channel_layers_from_env({"CHANNEL_CAPACITY_OVERRIDES": "200"})
+
+    def test_shared_cache_only_with_redis(self):
+        self.assertEqual(list(caches_from_env({})), ["default"])
+        caches = caches_from_env({"CHANNEL_LAYER": "redis", "CHANNEL_REDIS_HOSTS": "redis://one:6379/0,redis://two:6379/0"})
+        self.assertEqual(caches["shared"], {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://one:6379/0",
+            "KEY_PREFIX": "asgi",
+        })
+        caches = caches_from_env({"CHANNEL_LAYER": "redis", "CACHE_REDIS_URL": "redis://cache:6379/1"})
+        self.assertEqual(caches["shared"]["LOCATION"], "redis://cache:6379/1")
+
+
+class MultiWorkerFanOutTestCase(MultiWorkerMixin, TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.get(username='@alice123')
+        self.bob = User.objects.get(username='@bob456')
+        self.session = StudySession.objects.create(createdBy=self.alice, sessionName="Scaled Room")
+
+    def tearDown(self):
+        roster_cache.clear()
+
+    async def connect(self, alias):
+        communicator = WebsocketCommunicator(worker_application(alias), f"/ws/room/{self.session.roomCode}/")
+        await communicator.connect()
+        await communicator.receive_json_from()  # roster_sync
+        return communicator
+
+    def commit(self, func, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            func(*args)
+
+    def test_workers_have_separate_layers(self):
+        self.assertIsNot(get_channel_layer("default"), get_channel_layer("worker2"))
+
+    def test_chat_reaches_sockets_on_other_worker(self):
+        async def run():
+            first, second = await self.connect("default"), await self.connect("worker2")
+            await first.send_json_to({"type": "chat_message", "message": "hi", "sender": "@alice123"})
+            received = await second.receive_json_from()
+            await first.disconnect()
+            await second.disconnect()
+            return received
+
+        self.assertEqual(async_to_sync(run)()["message"], "hi")
+
+    def test_rest_broadcasts_reach_sockets_on_other_worker(self):
+        async def run():
+            socket = await self.connect("worker2")
+            # What join_room does, publishing on the default layer
+            await sync_to_async(self.commit)(self.session.participants.add, self.bob)
+            joined = await socket.receive_json_from()
+            await sync_to_async(self.commit)(broadcast, self.session.roomCode, {"type": "delete_list", "list_id": 1})
+            deleted = await socket.receive_json_from()
+            await socket.disconnect()
+            return joined, deleted
+
+        joined, deleted = async_to_sync(run)()
+        self.assertEqual(joined["type"], "participant_joined")
+        self.assertEqual(joined["usernames"], ["@bob456"])
+        self.assertEqual(deleted, {"type": "delete_list", "list_id": 1})
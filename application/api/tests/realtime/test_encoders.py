@@ -0,0 +1,67 @@
+"""Tests for pre-encoded group broadcasts and the pluggable frame encoder."""
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+
+from api import routing
+from api.models import StudySession, User
+from api.realtime.encoders import PreEncoded, StdlibJSONEncoder, encode_frame, get_encoder
+from api.realtime.roster import roster_cache
+
+
+class CountingEncoder(StdlibJSONEncoder):
+    calls = 0
+
+    def encode(self, obj):
+        CountingEncoder.calls += 1
+        return super().encode(obj)
+
+
+class EncodeFrameTestCase(TestCase):
+
+    @override_settings(WS_JSON_ENCODER="json")
+    def test_pre_encoded_parts_are_reused(self):
+        self.assertEqual(encode_frame(PreEncoded('{"a":1}')), '{"a":1}')
+        self.assertEqual(encode_frame([PreEncoded('{"a":1}'), {"b": 2}]), '[{"a":1},{"b":2}]')
+        self.assertEqual(encode_frame([{"b": 2}]), '[{"b":2}]')
+
+    @override_settings(WS_JSON_ENCODER="api.tests.realtime.test_encoders.CountingEncoder")
+    def test_encoder_is_pluggable(self):
+        self.assertIsInstance(get_encoder(), CountingEncoder)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+                   WS_JSON_ENCODER="api.tests.realtime.test_encoders.CountingEncoder")
+class PreEncodedBroadcastTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="Encoded Room")
+
+    def tearDown(self):
+        roster_cache.clear()
+
+    def test_chat_message_is_encoded_once_for_the_whole_room(self):
+        async def run():
+            communicators = []
+            for _ in range(5):
+                communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                                     f"/ws/room/{self.session.roomCode}/")
+                await communicator.connect()
+                await communicator.receive_json_from()  # roster_sync
+                communicators.append(communicator)
+
+            CountingEncoder.calls = 0
+            await communicators[0].send_json_to({"type": "chat_message", "message": "hi", "sender": "@alice123"})
+            received = [await communicator.receive_json_from() for communicator in communicators]
+            calls = CountingEncoder.calls
+            for communicator in communicators:
+                await communicator.disconnect()
+            return received, calls
+
+        received, calls = async_to_sync(run)()
+        self.assertEqual(calls, 1)
+        for message in received:
+            self.assertEqual(message, {"type": "chat_message", "message": "hi", "sender": "@alice123"})
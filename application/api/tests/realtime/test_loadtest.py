@@ -0,0 +1,57 @@
+"""Tests for the RoomConsumer load-test harness."""
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from io import StringIO
+
+from api.models import StudySession, User
+from api.realtime.layers import LocalRedisChannelLayer
+from api.realtime.loadtest import channel_layer_settings, percentile, run_load_test
+
+
+class LoadTestHarnessTestCase(TestCase):
+
+    def tearDown(self):
+        LocalRedisChannelLayer.reset_servers()
+
+    def test_percentile(self):
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertEqual(percentile(values, 100), 5)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_run_load_test_in_memory(self):
+        with override_settings(CHANNEL_LAYERS=channel_layer_settings("memory", capacity=1000)):
+            report = async_to_sync(run_load_test)(rooms=2, clients_per_room=3, messages_per_client=2,
+                                                  idle_seconds=0.1, trace_memory=True)
+
+        result = report.as_dict()
+        self.assertEqual(result["clients"], 6)
+        self.assertEqual(len(report.connect_latencies), 6)
+        self.assertEqual(result["delivery_ratio"], 1.0)
+        self.assertGreater(result["messages_per_second"], 0)
+        self.assertGreater(result["peak_traced_kb"], 0)
+        self.assertGreater(result["peak_rss_kb"], 0)
+
+    def test_run_load_test_with_local_redis_stand_in(self):
+        with override_settings(CHANNEL_LAYERS=channel_layer_settings("local-redis", capacity=1000)):
+            report = async_to_sync(run_load_test)(rooms=1, clients_per_room=4, messages_per_client=2,
+                                                  idle_seconds=0.1)
+
+        self.assertEqual(report.delivery_ratio, 1.0)
+        self.assertEqual(len(report.fanout_latencies), report.expected_marked)
+
+    def test_run_load_test_cleans_up(self):
+        users_before = User.objects.count()
+        with override_settings(CHANNEL_LAYERS=channel_layer_settings("memory")):
+            async_to_sync(run_load_test)(rooms=1, clients_per_room=2, messages_per_client=1, idle_seconds=0.1)
+
+        self.assertEqual(User.objects.count(), users_before)
+        self.assertFalse(StudySession.objects.exists())
+
+    def test_loadtest_rooms_command(self):
+        out = StringIO()
+        call_command("loadtest_rooms", "--clients", "2", "--messages", "1", "--layer", "memory", "--json", stdout=out)
+
+        self.assertIn('"memory"', out.getvalue())
+        self.assertIn('"fanout_ms_p99"', out.getvalue())
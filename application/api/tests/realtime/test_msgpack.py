@@ -0,0 +1,117 @@
+"""Tests for the MessagePack WebSocket subprotocol."""
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+
+from api import routing
+from api.models import StudySession, User
+from api.realtime.encoders import (PreEncodedBytes, decode_msgpack_frame, encode_broadcast,
+                                   encode_msgpack_frame, msgpack_subscribers, negotiate_codec)
+from api.realtime.roster import roster_cache
+
+
+class MsgpackEncodingTestCase(TestCase):
+
+    def test_pre_encoded_items_are_spliced_into_arrays(self):
+        first = {"type": "chat_message", "message": "hi", "sender": "@alice123"}
+        second = {"type": "typing_batch", "senders": ["@bob456"]}
+        payload = [PreEncodedBytes(encode_msgpack_frame(first)), second]
+        self.assertEqual(decode_msgpack_frame(encode_msgpack_frame(payload)), [first, second])
+
+    def test_negotiation_follows_client_order(self):
+        codec, subprotocol = negotiate_codec(["json", "msgpack"])
+        self.assertEqual((codec.name, subprotocol), ("json", "json"))
+        codec, subprotocol = negotiate_codec(["msgpack"])
+        self.assertEqual((codec.name, subprotocol), ("msgpack", "msgpack"))
+        codec, subprotocol = negotiate_codec(None)
+        self.assertEqual((codec.name, subprotocol), ("json", None))
+
+    @override_settings(WS_MSGPACK_ENABLED=False)
+    def test_disabled_msgpack_falls_back_to_json(self):
+        codec, subprotocol = negotiate_codec(["msgpack"])
+        self.assertEqual((codec.name, subprotocol), ("json", None))
+        self.assertNotIn("msgpack", encode_broadcast({"type": "typing_batch", "senders": []}))
+
+    def test_msgpack_copy_only_for_rooms_with_msgpack_sockets(self):
+        event = {"type": "typing_batch", "senders": []}
+        self.assertEqual(set(encode_broadcast(event, "ROOM")), {"json"})
+        msgpack_subscribers.opened("ROOM")
+        try:
+            self.assertEqual(set(encode_broadcast(event, "ROOM")), {"json", "msgpack"})
+            self.assertEqual(set(encode_broadcast(event, "OTHER")), {"json"})
+        finally:
+            msgpack_subscribers.closed("ROOM")
+        self.assertEqual(set(encode_broadcast(event, "ROOM")), {"json"})
+        # Unknown audience
+        self.assertEqual(set(encode_broadcast(event)), {"json", "msgpack"})
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class MsgpackConsumerTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="Binary Room")
+
+    def tearDown(self):
+        roster_cache.clear()
+        msgpack_subscribers.clear()
+
+    def communicator(self, subprotocols=None, query=""):
+        return WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                     f"/ws/room/{self.session.roomCode}/{query}",
+                                     subprotocols=subprotocols)
+
+    def test_binary_chat_round_trip(self):
+        async def run():
+            binary = self.communicator(["msgpack"])
+            text = self.communicator()
+            connected, subprotocol = await binary.connect()
+            await text.connect()
+            roster = decode_msgpack_frame(await binary.receive_from())
+            await text.receive_json_from()
+
+            await binary.send_to(bytes_data=msgpack.packb(
+                {"type": "chat_message", "message": "hello", "sender": "@alice123"}))
+            to_binary = decode_msgpack_frame(await binary.receive_from())
+            to_text = await text.receive_json_from()
+            await binary.disconnect()
+            await text.disconnect()
+            return subprotocol, roster, to_binary, to_text
+
+        subprotocol, roster, to_binary, to_text = async_to_sync(run)()
+        self.assertEqual(subprotocol, "msgpack")
+        self.assertEqual(roster["type"], "roster_sync")
+        self.assertEqual(to_binary["message"], "hello")
+        self.assertEqual(to_binary, to_text)
+
+    def test_batched_frames_are_msgpack_arrays(self):
+        async def run():
+            client = self.communicator(["msgpack"], "?batch=1&batch_delay_ms=10")
+            await client.connect()
+            await client.receive_from()  # roster_sync
+            for i in range(3):
+                await client.send_to(bytes_data=msgpack.packb(
+                    {"type": "chat_message", "message": str(i), "sender": "@alice123"}))
+            frame = decode_msgpack_frame(await client.receive_from())
+            await client.disconnect()
+            return frame
+
+        frame = async_to_sync(run)()
+        self.assertIsInstance(frame, list)
+        self.assertEqual(sorted(event["message"] for event in frame), ["0", "1", "2"])
+
+    def test_msgpack_sockets_are_counted_per_room(self):
+        async def run():
+            client = self.communicator(["msgpack"])
+            await client.connect()
+            await client.receive_from()  # roster_sync
+            counted = self.session.roomCode in msgpack_subscribers
+            await client.disconnect()
+            return counted
+
+        self.assertTrue(async_to_sync(run)())
+        self.assertNotIn(self.session.roomCode, msgpack_subscribers)
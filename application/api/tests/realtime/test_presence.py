@@ -0,0 +1,233 @@
+"""Tests for presence tracking of room sockets."""
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import routing
+from api.models import StudySession, User
+from api.realtime.presence import Presence, presence, username_from_token
+from api.realtime.roster import roster_cache
+
+
+class PresenceTestCase(TestCase):
+
+    def test_first_and_last_socket_of_a_user(self):
+        store = Presence(ttl=10)
+        self.assertTrue(store.connect("ROOM", "a1", "@alice"))
+        self.assertFalse(store.connect("ROOM", "a2", "@alice"))
+        self.assertFalse(store.connect("ROOM", "anon", None))
+        self.assertEqual(store.present("ROOM"), ["@alice"])
+
+        self.assertIsNone(store.disconnect("ROOM", "a1"))
+        self.assertEqual(store.disconnect("ROOM", "a2"), "@alice")
+        self.assertIsNone(store.disconnect("ROOM", "a2"))
+        self.assertEqual(store.present("ROOM"), [])
+
+    def test_only_sockets_sending_heartbeats_expire(self):
+        store = Presence(ttl=10)
+        store.connect("ROOM", "a1", "@alice")
+        store.connect("ROOM", "a2", "@alice")
+        store.connect("ROOM", "old", "@bob")
+        self.assertFalse(store.has_heartbeats())
+
+        self.assertTrue(store.heartbeat("ROOM", "a1", now=100))
+        self.assertTrue(store.heartbeat("ROOM", "a2", now=105))
+        self.assertFalse(store.heartbeat("ROOM", "gone", now=105))
+        self.assertEqual(store.expire(now=109), [])
+        self.assertEqual(store.expire(now=110), [("ROOM", "a1", None)])
+        self.assertEqual(store.expire(now=1000), [("ROOM", "a2", "@alice")])
+        self.assertEqual(store.present("ROOM"), ["@bob"])
+        self.assertFalse(store.has_heartbeats())
+
+    def test_away_marks(self):
+        store = Presence()
+        store.mark_away("ROOM", "@alice")
+        store.mark_away("ROOM", "@bob")
+        store.forget("ROOM", ["@alice"])
+        self.assertEqual(store.away("ROOM"), {"@bob"})
+        store.drop("ROOM")
+        self.assertEqual(store.away("ROOM"), set())
+
+    def test_sockets_identified_after_connecting(self):
+        store = Presence()
+        store.connect("ROOM", "a1", "@alice")
+        store.connect("ROOM", "anon1", None)
+        store.connect("ROOM", "anon2", None)
+        self.assertFalse(store.identify("ROOM", "anon1", "@alice"))
+        self.assertTrue(store.identify("ROOM", "anon2", "@bob"))
+        # Only once, and only registered sockets
+        self.assertFalse(store.identify("ROOM", "anon2", "@carol"))
+        self.assertFalse(store.identify("ROOM", "gone", "@carol"))
+        self.assertEqual(store.present("ROOM"), ["@alice", "@bob"])
+        self.assertEqual(store.disconnect("ROOM", "anon2"), "@bob")
+
+    def test_rooms_left_empty_are_deleted(self):
+        store = Presence(cache_alias="default", ttl=10)
+        key = Presence.KEY_PREFIX + "ROOM"
+        store.connect("ROOM", "a1", "@alice")
+        store.disconnect("ROOM", "a1")
+        self.assertIsNone(caches["default"].get(key))
+
+        store.connect("ROOM", "a1", "@alice")
+        store.heartbeat("ROOM", "a1", now=100)
+        store.expire(now=200)
+        self.assertIsNone(caches["default"].get(key))
+
+        # Away marks keep the entry until they are cleared
+        store.mark_away("ROOM", "@alice")
+        self.assertIsNotNone(caches["default"].get(key))
+        store.forget("ROOM", ["@alice"])
+        self.assertIsNone(caches["default"].get(key))
+
+    def test_workers_sharing_a_cache_share_the_store(self):
+        first, second = Presence(cache_alias="default", ttl=10), Presence(cache_alias="default", ttl=10)
+        self.assertTrue(first.connect("ROOM", "a1", "@alice"))
+        self.assertFalse(second.connect("ROOM", "a2", "@alice"))
+        self.assertEqual(second.present("ROOM"), ["@alice"])
+        first.mark_away("ROOM", "@bob")
+        self.assertEqual(second.away("ROOM"), {"@bob"})
+
+        # A worker sweeps the rooms it has sockets in, whichever worker the dead socket was on
+        self.assertTrue(first.heartbeat("ROOM", "a2", now=100))
+        self.assertEqual(first.expire(now=200), [("ROOM", "a2", None)])
+        self.assertEqual(second.disconnect("ROOM", "a1"), "@alice")
+        self.assertEqual(first.present("ROOM"), [])
+        caches["default"].clear()
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class PresenceRosterTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        roster_cache.clear()
+        presence.clear()
+        self.alice = User.objects.get(username='@alice123')
+        self.bob = User.objects.get(username='@bob456')
+        self.session = StudySession.objects.create(createdBy=self.alice, sessionName="Presence Room")
+        self.session.participants.add(self.alice, self.bob)
+
+    def tearDown(self):
+        roster_cache.clear()
+        presence.clear()
+
+    async def connect(self, user=None):
+        """Open a socket to the room, logged in as user with an authenticate message."""
+        communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                             f"/ws/room/{self.session.roomCode}/")
+        await communicator.connect()
+        if user is not None:
+            await communicator.send_json_to({"type": "authenticate", "token": str(AccessToken.for_user(user))})
+        return communicator
+
+    def test_username_from_token(self):
+        self.assertEqual(username_from_token(str(AccessToken.for_user(self.alice))), '@alice123')
+        self.assertIsNone(username_from_token("not-a-token"))
+
+    def test_roster_follows_sockets(self):
+        async def run():
+            watcher = await self.connect()
+            snapshot = await watcher.receive_json_from()
+
+            alice = await self.connect(self.alice)
+            await alice.receive_json_from()
+            # Alice was already on the roster, nothing to tell
+            self.assertTrue(await watcher.receive_nothing())
+
+            await alice.disconnect()
+            left = await watcher.receive_json_from()
+
+            # A roster loaded again from the database still leaves her out
+            roster_cache.invalidate(self.session.roomCode)
+            await watcher.send_json_to({"type": "roster_sync"})
+            resync = await watcher.receive_json_from()
+
+            alice = await self.connect(self.alice)
+            joined = await watcher.receive_json_from()
+            await alice.disconnect()
+            await watcher.receive_json_from()
+            await watcher.disconnect()
+            return snapshot, left, resync, joined
+
+        snapshot, left, resync, joined = async_to_sync(run)()
+        version = snapshot["version"]
+        self.assertEqual(snapshot["participants"], ['@alice123', '@bob456'])
+        self.assertEqual(left, {"type": "participant_left", "usernames": ['@alice123'], "version": version + 1})
+        self.assertEqual(resync, {"type": "roster_sync", "participants": ['@bob456'], "version": version + 2})
+        self.assertEqual(joined, {"type": "participant_joined", "usernames": ['@alice123'], "version": version + 3})
+
+    def test_invalid_token_stays_anonymous(self):
+        async def run():
+            watcher = await self.connect()
+            await watcher.receive_json_from()
+            stranger = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                             f"/ws/room/{self.session.roomCode}/")
+            await stranger.connect()
+            await stranger.receive_json_from()
+            await stranger.send_json_to({"type": "authenticate", "token": "not-a-token"})
+            await stranger.disconnect()
+            quiet = await watcher.receive_nothing()
+            await watcher.disconnect()
+            return quiet
+
+        self.assertTrue(async_to_sync(run)())
+        self.assertEqual(presence.present(self.session.roomCode), [])
+
+    def test_second_socket_and_strangers_change_nothing(self):
+        john = User.objects.get(username='@john789')
+
+        async def run():
+            watcher = await self.connect()
+            await watcher.receive_json_from()
+            sockets = [await self.connect(user) for user in (self.alice, self.alice, john)]
+            for socket in sockets:
+                await socket.receive_json_from()
+            # Only the last of Alice's sockets takes her off the roster, John never joined
+            for socket in sockets[1:]:
+                await socket.disconnect()
+            quiet = await watcher.receive_nothing()
+            await sockets[0].disconnect()
+            left = await watcher.receive_json_from()
+            await watcher.disconnect()
+            return quiet, left
+
+        quiet, left = async_to_sync(run)()
+        self.assertTrue(quiet)
+        self.assertEqual(left["usernames"], ['@alice123'])
+
+    def test_joining_through_the_api_brings_back_an_away_participant(self):
+        presence.mark_away(self.session.roomCode, '@bob456')
+        roster_cache.invalidate(self.session.roomCode)
+        self.assertEqual(roster_cache.load(self.session.roomCode), ['@alice123'])
+        self.session.participants.remove(self.bob)
+        self.session.participants.add(self.bob)
+        self.assertEqual(presence.away(self.session.roomCode), set())
+        self.assertEqual(roster_cache.get(self.session.roomCode), ['@alice123', '@bob456'])
+
+    @override_settings(PRESENCE_TTL=0.2)
+    def test_sockets_whose_heartbeats_stop_are_closed(self):
+        async def run():
+            watcher = await self.connect()
+            await watcher.receive_json_from()
+
+            bob = await self.connect(self.bob)
+            await bob.receive_json_from()
+            await bob.send_json_to({"type": "heartbeat"})
+            # Bob's client hangs: the sweep closes his socket and he goes off the roster
+            left = await watcher.receive_json_from(timeout=2)
+            closed = await bob.receive_output(timeout=2)
+            await asyncio.sleep(0.3)
+            await watcher.disconnect()
+            return left, closed
+
+        left, closed = async_to_sync(run)()
+        self.assertEqual(left["type"], "participant_left")
+        self.assertEqual(left["usernames"], ['@bob456'])
+        self.assertEqual(closed["type"], "websocket.close")
+        self.assertEqual(presence.present(self.session.roomCode), [])
+        self.assertEqual(roster_cache.get(self.session.roomCode), ['@alice123'])
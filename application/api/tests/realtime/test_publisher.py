@@ -0,0 +1,118 @@
+"""Tests for the on-commit event publisher used by synchronous code."""
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from api import routing
+from api.models import StudySession, User
+from api.realtime.broadcast import broadcast
+from api.realtime.publisher import group_by_room, publisher
+from api.realtime.roster import roster_cache
+
+
+class GroupByRoomTestCase(TestCase):
+
+    def test_one_message_per_room_batch(self):
+        items = [("A", {"n": 1}), ("B", {"n": 2}), ("A", {"n": 3}), ("A", {"n": 4})]
+        self.assertEqual(list(group_by_room(items, batch_size=2)), [
+            ("A", {"type": "encoded_events", "events": [{"n": 1}, {"n": 3}]}),
+            ("A", {"n": 4}),
+            ("B", {"n": 2}),
+        ])
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class EventPublisherTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="Outbox Room")
+
+    def tearDown(self):
+        roster_cache.clear()
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                             f"/ws/room/{self.session.roomCode}/")
+        await communicator.connect()
+        await communicator.receive_json_from()  # roster_sync
+        return communicator
+
+    def event(self, n):
+        return {"type": "toggle_task", "task_id": n}
+
+    def test_events_wait_for_commit(self):
+        def publish_and_commit():
+            with self.captureOnCommitCallbacks() as callbacks:
+                broadcast(self.session.roomCode, self.event(1))
+            return callbacks
+
+        async def run():
+            communicator = await self.connect()
+            callbacks = await sync_to_async(publish_and_commit)()
+            before_commit = await communicator.receive_nothing(timeout=0.1)
+            for callback in callbacks:
+                await sync_to_async(callback)()
+            received = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return before_commit, received
+
+        before_commit, received = async_to_sync(run)()
+        self.assertTrue(before_commit)
+        self.assertEqual(received, self.event(1))
+
+    def test_rolled_back_events_are_dropped(self):
+        def publish_and_roll_back():
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                try:
+                    with transaction.atomic():
+                        broadcast(self.session.roomCode, self.event(1))
+                        raise ValueError("roll back")
+                except ValueError:
+                    pass
+            return callbacks
+
+        async def run():
+            communicator = await self.connect()
+            callbacks = await sync_to_async(publish_and_roll_back)()
+            nothing = await communicator.receive_nothing(timeout=0.1)
+            await communicator.disconnect()
+            return callbacks, nothing
+
+        callbacks, nothing = async_to_sync(run)()
+        self.assertEqual(callbacks, [])
+        self.assertTrue(nothing)
+
+    def test_events_queued_together_share_one_group_send(self):
+        async def run():
+            communicator = await self.connect()
+            sent_before = publisher.sent_messages
+            # Published from the loop itself (outside any transaction), so all five are queued
+            # before the drain task gets to run
+            for n in range(5):
+                broadcast(self.session.roomCode, self.event(n))
+            await publisher.flush()
+            received = [await communicator.receive_json_from() for _ in range(5)]
+            await communicator.disconnect()
+            return publisher.sent_messages - sent_before, received
+
+        group_sends, received = async_to_sync(run)()
+        self.assertEqual(group_sends, 1)
+        self.assertEqual(received, [self.event(n) for n in range(5)])
+        self.assertEqual(publisher.pending(), 0)
+
+    def test_without_event_loop_sends_inline(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"room_{self.session.roomCode}", channel)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast(self.session.roomCode, self.event(7))
+
+        message = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(message["type"], "encoded_event")
+        self.assertEqual(message["event_type"], "toggle_task")
@@ -0,0 +1,154 @@
+"""Tests for the per-room participant roster cache."""
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from api import routing
+from api.models import StudySession, User
+from api.realtime.roster import RosterCache, roster_cache
+
+
+class RosterCacheTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        roster_cache.clear()
+        self.alice = User.objects.get(username='@alice123')
+        self.bob = User.objects.get(username='@bob456')
+        self.session = StudySession.objects.create(createdBy=self.alice, sessionName="Roster Room")
+        self.session.participants.add(self.alice)
+
+    def tearDown(self):
+        roster_cache.clear()
+
+    def test_load_reads_database_once(self):
+        roster_cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(roster_cache.load(self.session.roomCode), ['@alice123'])
+        with self.assertNumQueries(0):
+            self.assertEqual(roster_cache.load(self.session.roomCode), ['@alice123'])
+
+    def test_unknown_room_is_not_cached(self):
+        self.assertEqual(roster_cache.load("NOPE0000"), [])
+        self.assertIsNone(roster_cache.get("NOPE0000"))
+
+    def test_participants_add_and_remove_update_cached_roster(self):
+        roster_cache.load(self.session.roomCode)
+
+        self.session.participants.add(self.bob)
+        self.assertEqual(roster_cache.get(self.session.roomCode), ['@alice123', '@bob456'])
+
+        self.session.participants.remove(self.alice)
+        self.assertEqual(roster_cache.get(self.session.roomCode), ['@bob456'])
+
+    def test_reverse_add_and_clear_reload_roster(self):
+        version, _ = roster_cache.snapshot(self.session.roomCode)
+        self.bob.study_sessions.add(self.session)
+        self.assertEqual(roster_cache.snapshot(self.session.roomCode), (version + 1, ['@alice123', '@bob456']))
+
+        self.session.participants.clear()
+        self.assertEqual(roster_cache.snapshot(self.session.roomCode), (version + 2, []))
+
+    def test_session_delete_invalidates(self):
+        room_code = self.session.roomCode
+        roster_cache.load(room_code)
+        self.session.delete()
+        self.assertIsNone(roster_cache.get(room_code))
+
+    def test_shared_cache_alias(self):
+        shared = RosterCache(cache_alias="default")
+        self.assertFalse(shared.is_local)
+        shared.load(self.session.roomCode)
+        entry = caches["default"].get("roster:" + self.session.roomCode)
+        self.assertEqual(entry["participants"], ['@alice123'])
+        caches["default"].clear()
+
+    def test_workers_sharing_a_cache_agree(self):
+        # Two workers' caches on one shared store
+        first, second = RosterCache(cache_alias="default"), RosterCache(cache_alias="default")
+        version, _ = first.snapshot(self.session.roomCode)
+        self.assertEqual(second.snapshot(self.session.roomCode), (version, ['@alice123']))
+
+        self.assertEqual(first.add(self.session.roomCode, ['@bob456']), (version + 1, ['@bob456']))
+        self.assertEqual(second.snapshot(self.session.roomCode), (version + 1, ['@alice123', '@bob456']))
+        self.assertEqual(second.remove(self.session.roomCode, ['@bob456']), (version + 2, ['@bob456']))
+        second.invalidate(self.session.roomCode)
+        with self.assertNumQueries(1):
+            self.assertEqual(first.snapshot(self.session.roomCode), (version + 3, ['@alice123']))
+
+        # Once the entry expires the roster starts again from a version past the old ones
+        caches["default"].delete("roster:" + self.session.roomCode)
+        self.assertGreater(second.snapshot(self.session.roomCode)[0], version + 3)
+        caches["default"].clear()
+
+    def test_versions_increase_with_each_change(self):
+        version, participants = roster_cache.snapshot(self.session.roomCode)
+        self.assertEqual(participants, ['@alice123'])
+
+        self.assertEqual(roster_cache.add(self.session.roomCode, ['@bob456']), (version + 1, ['@bob456']))
+        self.assertEqual(roster_cache.add(self.session.roomCode, ['@bob456']), (version + 1, []))
+        self.assertEqual(roster_cache.remove(self.session.roomCode, {'@alice123'}), (version + 2, ['@alice123']))
+
+        roster_cache.invalidate(self.session.roomCode)
+        self.assertEqual(roster_cache.snapshot(self.session.roomCode)[0], version + 3)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class RosterDeltaTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        roster_cache.clear()
+        self.alice = User.objects.get(username='@alice123')
+        self.bob = User.objects.get(username='@bob456')
+        self.session = StudySession.objects.create(createdBy=self.alice, sessionName="Roster Room")
+        self.session.participants.add(self.alice)
+
+    def tearDown(self):
+        roster_cache.clear()
+
+    def communicator(self):
+        return WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns), f"/ws/room/{self.session.roomCode}/")
+
+    def commit(self, func, *args):
+        # Broadcasts from sync code go out when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            func(*args)
+
+    def test_connect_sends_snapshot_to_new_socket(self):
+        async def connect():
+            communicator = self.communicator()
+            await communicator.connect()
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return message
+
+        message = async_to_sync(connect)()
+        version, _ = roster_cache.snapshot(self.session.roomCode)
+        self.assertEqual(message, {"type": "roster_sync", "participants": ['@alice123'], "version": version})
+
+    def test_join_and_leave_send_deltas(self):
+        async def run():
+            communicator = self.communicator()
+            await communicator.connect()
+            snapshot = await communicator.receive_json_from()
+
+            await sync_to_async(self.commit)(self.session.participants.add, self.bob)
+            joined = await communicator.receive_json_from()
+            await sync_to_async(self.commit)(self.session.participants.remove, self.alice)
+            left = await communicator.receive_json_from()
+
+            await communicator.send_json_to({"type": "roster_sync"})
+            resync = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return snapshot, joined, left, resync
+
+        snapshot, joined, left, resync = async_to_sync(run)()
+        self.assertEqual(joined, {"type": "participant_joined", "usernames": ['@bob456'],
+                                  "version": snapshot["version"] + 1})
+        self.assertEqual(left, {"type": "participant_left", "usernames": ['@alice123'],
+                                "version": snapshot["version"] + 2})
+        self.assertEqual(resync, {"type": "roster_sync", "participants": ['@bob456'],
+                                  "version": snapshot["version"] + 2})
@@ -0,0 +1,92 @@
+"""Tests for the typing indicator coalescer."""
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, override_settings
+
+from api import routing
+from api.models import StudySession, User
+from api.realtime.broadcast import room_group_name
+from api.realtime.roster import roster_cache
+from api.realtime.typing import TypingCoalescer, typing_coalescer
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+                   TYPING_BATCH_INTERVAL=0.05, TYPING_EXPIRY=0.3)
+class TypingCoalescerTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="Typing Room")
+
+    def tearDown(self):
+        roster_cache.clear()
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                             f"/ws/room/{self.session.roomCode}/")
+        await communicator.connect()
+        await communicator.receive_json_from()  # roster_sync
+        return communicator
+
+    def test_keystrokes_are_coalesced_into_one_batch(self):
+        async def run():
+            alice, bob = await self.connect(), await self.connect()
+            for _ in range(10):
+                await alice.send_json_to({"type": "typing", "sender": "@alice123"})
+                await bob.send_json_to({"type": "typing", "sender": "@bob456"})
+
+            batch = await alice.receive_json_from()
+            # Nothing else until the typists expire
+            self.assertTrue(await alice.receive_nothing(timeout=0.15))
+            expired = await alice.receive_json_from(timeout=1)
+            await alice.disconnect()
+            await bob.disconnect()
+            return batch, expired
+
+        batch, expired = async_to_sync(run)()
+        self.assertEqual(batch["type"], "typing_batch")
+        self.assertEqual(sorted(batch["senders"]), ["@alice123", "@bob456"])
+        self.assertEqual(batch["worker"], typing_coalescer.worker)
+        self.assertEqual(expired, {"type": "typing_batch", "worker": typing_coalescer.worker, "senders": []})
+
+    def test_disconnect_stops_typing(self):
+        async def run():
+            alice, bob = await self.connect(), await self.connect()
+            await bob.send_json_to({"type": "typing", "sender": "@bob456"})
+            first = await alice.receive_json_from()
+            await bob.disconnect()
+            # Well before TYPING_EXPIRY
+            after_disconnect = await asyncio.wait_for(alice.receive_json_from(), timeout=0.2)
+            await alice.disconnect()
+            return first, after_disconnect
+
+        first, after_disconnect = async_to_sync(run)()
+        self.assertEqual(first["senders"], ["@bob456"])
+        self.assertEqual(after_disconnect["senders"], [])
+
+    def test_each_worker_batches_its_own_senders(self):
+        async def run():
+            channel_layer = get_channel_layer()
+            listener = await channel_layer.new_channel()
+            await channel_layer.group_add(room_group_name(self.session.roomCode), listener)
+            # Two workers, each with its own coalescer
+            first, second = TypingCoalescer(), TypingCoalescer()
+            first.typing(self.session.roomCode, "@alice123")
+            second.typing(self.session.roomCode, "@bob456")
+            batches = [json.loads((await channel_layer.receive(listener))["json"]) for _ in range(2)]
+            first.stop_typing(self.session.roomCode, "@alice123")
+            second.stop_typing(self.session.roomCode, "@bob456")
+            await asyncio.sleep(0.15)
+            return first.worker, second.worker, batches
+
+        first, second, batches = async_to_sync(run)()
+        self.assertNotEqual(first, second)
+        # What the client merges: the latest senders of each worker
+        self.assertEqual({batch["worker"]: batch["senders"] for batch in batches},
+                         {first: ["@alice123"], second: ["@bob456"]})
@@ -0,0 +1,44 @@
+"""
+Offline stand-in for several ASGI workers sharing one Redis.
+
+Each alias in WORKER_LAYERS is a separate LocalRedisChannelLayer instance pointing at the same
+fake Redis, like the channel layer of one worker process. worker_application(alias) routes
+sockets through RoomConsumer on that worker's layer, while REST views and signals publish on
+"default".
+"""
+from channels.routing import URLRouter
+from django.test import override_settings
+from django.urls import re_path
+
+from api.consumers import RoomConsumer
+from api.realtime.layers import LocalRedisChannelLayer
+
+WORKERS = ("default", "worker2")
+
+WORKER_LAYERS = {
+    alias: {
+        "BACKEND": "api.realtime.layers.LocalRedisChannelLayer",
+        "CONFIG": {"hosts": ["redis://fake:6379"], "capacity": 1000},
+    }
+    for alias in WORKERS
+}
+
+
+def worker_application(alias):
+    return URLRouter([
+        re_path(r"ws/room/(?P<room_code>\w+)/$", RoomConsumer.as_asgi(channel_layer_alias=alias)),
+    ])
+
+
+class MultiWorkerMixin:
+    """Runs a TestCase with one channel layer per worker over a shared fake Redis."""
+
+    worker_layers = WORKER_LAYERS
+
+    def setUp(self):
+        super().setUp()
+        LocalRedisChannelLayer.reset_servers()
+        override = override_settings(CHANNEL_LAYERS=self.worker_layers)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(LocalRedisChannelLayer.reset_servers)
@@ -0,0 +1,95 @@
+"""Tests for the cached graph of accepted friendships."""
+from django.test import TestCase
+
+from api.models import Friends, Status, User
+from api.services.friend_graph import FriendGraph, friend_graph, load_friend_ids
+
+
+class FriendGraphTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        friend_graph.clear()
+        self.users = list(User.objects.order_by("pk")[:4])
+        self.extra = [
+            User.objects.create(firstname="Extra", lastname=str(index), email=f"extra{index}@test.invalid",
+                                username=f"@extra{index}")
+            for index in range(3)
+        ]
+        self.alice, self.bob, self.carol, self.dave = self.users
+        # alice - bob - carol, alice - dave - carol, bob - extra0, carol - extra1
+        with self.captureOnCommitCallbacks(execute=True):
+            for a, b in [(self.alice, self.bob), (self.bob, self.carol), (self.alice, self.dave),
+                         (self.dave, self.carol), (self.bob, self.extra[0]), (self.carol, self.extra[1])]:
+                self.befriend(a, b)
+            # Pending requests aren't friendships
+            Friends.objects.create(user1=self.alice, user2=self.extra[2], status=Status.PENDING,
+                                   requested_by=self.alice)
+
+    def tearDown(self):
+        friend_graph.clear()
+
+    def befriend(self, a, b, status=Status.ACCEPTED):
+        return Friends.objects.create(user1=a, user2=b, status=status, requested_by=a)
+
+    def test_loads_once_per_user(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(friend_graph.are_friends(self.alice, self.bob))
+        with self.assertNumQueries(0):
+            self.assertTrue(friend_graph.are_friends(self.alice.pk, self.dave.pk))
+            self.assertFalse(friend_graph.are_friends(self.alice, self.carol))
+            self.assertFalse(friend_graph.are_friends(self.alice, self.extra[2]))
+        self.assertEqual(friend_graph.friends_of(self.alice), {self.bob.pk, self.dave.pk})
+        self.assertEqual(load_friend_ids([self.carol.pk]), {self.carol.pk: {self.bob.pk, self.dave.pk, self.extra[1].pk}})
+
+    def test_mutual_friends_and_suggestions(self):
+        self.assertEqual(friend_graph.mutual_friends_count(self.alice, self.carol), 2)
+        self.assertEqual(friend_graph.mutual_friends_count(self.alice, self.bob), 0)
+
+        friend_graph.clear()
+        # Alice's friends and then all of theirs, whatever the number of friends
+        with self.assertNumQueries(2):
+            suggestions = friend_graph.suggestions(self.alice)
+        self.assertEqual(suggestions, [(self.carol.pk, 2), (self.extra[0].pk, 1)])
+        self.assertEqual(friend_graph.suggestions(self.alice, limit=1), [(self.carol.pk, 2)])
+
+    def test_kept_up_to_date_on_save_and_delete(self):
+        friend_graph.friends_of(self.alice)
+        friend_graph.friends_of(self.carol)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            friendship = self.befriend(self.alice, self.carol, Status.PENDING)
+        self.assertFalse(friend_graph.are_friends(self.alice, self.carol))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Friends.update_status(friendship.pk, Status.ACCEPTED)
+        with self.assertNumQueries(0):
+            self.assertTrue(friend_graph.are_friends(self.alice, self.carol))
+            self.assertTrue(friend_graph.are_friends(self.carol, self.alice))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Friends.delete_friend(friendship.pk, self.alice)
+        self.assertFalse(friend_graph.are_friends(self.carol, self.alice))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Friends.objects.get(user1=self.alice, user2=self.bob).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(friend_graph.friends_of(self.alice), {self.dave.pk})
+        self.assertEqual(friend_graph.friends_of(self.alice), load_friend_ids([self.alice.pk])[self.alice.pk])
+
+    def test_rolled_back_changes_are_not_applied(self):
+        friend_graph.friends_of(self.alice)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.befriend(self.alice, self.carol)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(friend_graph.are_friends(self.alice, self.carol))
+
+    def test_lru_and_ttl(self):
+        graph = FriendGraph(max_size=2, ttl=60)
+        graph.friends_many([self.alice, self.bob, self.carol])
+        self.assertEqual(len(graph), 2)
+
+        expired = FriendGraph(ttl=0)
+        expired.friends_of(self.alice)
+        with self.assertNumQueries(1):
+            expired.friends_of(self.alice)
@@ -0,0 +1,70 @@
+"""Tests for deleting to-do lists and study rooms."""
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import List, Permission, SessionUser, StudySession, User, toDoList
+from api.realtime.roster import roster_cache
+from api.services.list_deletion import delete_list, delete_room
+from api.services.room_lookup import room_lookup
+
+
+class ListDeletionTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='@alice123')
+        self.todo_list = List.objects.create(name="Mine", is_shared=False)
+        self.other = List.objects.create(name="Other", is_shared=False)
+        for todo_list in (self.todo_list, self.other):
+            Permission.objects.create(user_id=self.user, list_id=todo_list)
+            toDoList.objects.bulk_create([toDoList(list=todo_list, title=f"Task {i}") for i in range(10)])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        room_lookup.clear()
+        roster_cache.clear()
+
+    def test_delete_list_cascades(self):
+        self.assertTrue(delete_list(self.todo_list.pk))
+        self.assertFalse(List.objects.filter(pk=self.todo_list.pk).exists())
+        self.assertFalse(toDoList.objects.filter(list_id=self.todo_list.pk).exists())
+        self.assertFalse(Permission.objects.filter(list_id=self.todo_list.pk).exists())
+        self.assertEqual(toDoList.objects.filter(list=self.other).count(), 10)
+        self.assertFalse(delete_list(self.todo_list.pk))
+
+    def test_view_returns_only_the_deleted_id(self):
+        response = self.client.delete(f'/api/delete_list/{self.todo_list.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"listId": self.todo_list.pk})
+
+    def test_view_full_state_flag(self):
+        response = self.client.delete(f'/api/delete_list/{self.todo_list.pk}/?full_state=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([todo_list["id"] for todo_list in response.data], [self.other.pk])
+
+    def test_delete_room(self):
+        session = StudySession.objects.create(createdBy=self.user, sessionName="Closing Room")
+        session.participants.add(self.user)
+        SessionUser.objects.create(user=self.user, session=session)
+        toDoList.objects.create(list=session.toDoList, title="Shared task")
+
+        room_lookup.by_code(session.roomCode)
+        delete_room(session)
+
+        self.assertFalse(StudySession.objects.filter(pk=session.pk).exists())
+        self.assertFalse(List.objects.filter(pk=session.toDoList_id).exists())
+        self.assertFalse(toDoList.objects.filter(list_id=session.toDoList_id).exists())
+        self.assertFalse(SessionUser.objects.filter(session_id=session.pk).exists())
+        # The cascade sends post_delete for the session, which evicts it from the cache
+        self.assertIsNone(room_lookup._cached(session.roomCode))
+        self.assertIsNone(room_lookup.by_code(session.roomCode))
+
+    def test_delete_room_without_list(self):
+        session = StudySession.objects.create(createdBy=self.user, sessionName="No List")
+        List.objects.filter(pk=session.toDoList_id).update(name="Kept")
+        StudySession.objects.filter(pk=session.pk).update(toDoList=None)
+        session.refresh_from_db()
+
+        delete_room(session)
+        self.assertFalse(StudySession.objects.filter(pk=session.pk).exists())
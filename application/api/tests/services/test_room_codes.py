@@ -0,0 +1,112 @@
+"""Tests for the room code allocator."""
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from api.management.commands.bench_room_codes import benchmark_room_codes
+from api.models import RoomCodeSequence, StudySession, User
+from api.services.room_codes import (ALPHABET, CODE_LENGTH, CODE_SPACE, KeyedPermutation, RoomCodeAllocator,
+                                     encode, room_codes)
+
+
+class KeyedPermutationTestCase(TestCase):
+
+    def test_is_a_permutation(self):
+        permutation = KeyedPermutation("k" * 64)
+        values = [permutation(number) for number in range(5000)]
+        self.assertEqual(len(set(values)), len(values))
+        self.assertTrue(all(0 <= value < CODE_SPACE for value in values))
+        # Consecutive numbers don't give anything like consecutive codes
+        self.assertNotEqual(sorted(values), values)
+
+    def test_depends_on_the_key(self):
+        first, second = KeyedPermutation("a" * 64), KeyedPermutation("b" * 64)
+        self.assertNotEqual([first(number) for number in range(10)], [second(number) for number in range(10)])
+        self.assertEqual(first(7), KeyedPermutation("a" * 64)(7))
+
+    def test_edges_of_the_space(self):
+        permutation = KeyedPermutation("k" * 64)
+        self.assertLess(permutation(CODE_SPACE - 1), CODE_SPACE)
+        with self.assertRaises(ValueError):
+            permutation(CODE_SPACE)
+
+    def test_encode(self):
+        self.assertEqual(encode(0), "AAAAAAAA")
+        self.assertEqual(encode(CODE_SPACE - 1), "99999999")
+        self.assertEqual(encode(37), "AAAAAABB")
+
+
+class RoomCodeAllocatorTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        room_codes.clear()
+        self.user = User.objects.get(username='@alice123')
+
+    def tearDown(self):
+        room_codes.clear()
+
+    def test_room_codes(self):
+        codes = [StudySession.objects.create(createdBy=self.user, sessionName=f"Room {index}").roomCode
+                 for index in range(20)]
+        self.assertEqual(len(set(codes)), 20)
+        for code in codes:
+            self.assertEqual(len(code), CODE_LENGTH)
+            self.assertTrue(set(code) <= set(ALPHABET))
+        # A given code is kept
+        self.assertEqual(StudySession.objects.create(createdBy=self.user, sessionName="Mine",
+                                                     roomCode="ABC123").roomCode, "ABC123")
+
+    def test_inside_a_transaction_one_query_per_code(self):
+        StudySession.objects.create(createdBy=self.user, sessionName="First")
+        allocator = RoomCodeAllocator(block_size=10)
+        with self.assertNumQueries(1):
+            code = allocator.allocate()
+        self.assertEqual(RoomCodeSequence.objects.get().next_value, 2)
+
+        # A block is reserved once the transaction has committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertNotEqual(allocator.allocate(), code)
+        self.assertEqual(len(callbacks), 1)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class RoomCodeBlockTestCase(TransactionTestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        room_codes.clear()
+        self.user = User.objects.get(username='@alice123')
+
+    def tearDown(self):
+        room_codes.clear()
+
+    def test_blocks_are_reserved_outside_transactions(self):
+        RoomCodeSequence.reserve(0)
+        allocator = RoomCodeAllocator(block_size=50)
+        with self.assertNumQueries(2):
+            # Reserving a block and checking it against codes already taken
+            first = allocator.allocate()
+        with self.assertNumQueries(0):
+            codes = [allocator.allocate() for _ in range(49)]
+        self.assertEqual(len({first, *codes}), 50)
+        self.assertEqual(RoomCodeSequence.objects.get().next_value, 50)
+
+        # Another process (allocator) continues the sequence
+        other = RoomCodeAllocator(block_size=50)
+        self.assertNotIn(other.allocate(), {first, *codes})
+        self.assertEqual(RoomCodeSequence.objects.get().next_value, 100)
+
+    def test_codes_already_taken_are_skipped(self):
+        secret, _ = RoomCodeSequence.reserve(0)
+        taken = encode(KeyedPermutation(secret)(3))
+        StudySession.objects.create(createdBy=self.user, sessionName="Old", roomCode=taken)
+        allocator = RoomCodeAllocator(block_size=10)
+        codes = [allocator.allocate() for _ in range(9)]
+        self.assertNotIn(taken, codes)
+
+    def test_benchmark(self):
+        results = benchmark_room_codes(rooms=1000, batch_size=250)
+        self.assertEqual(results["random"]["queries_per_1000"], 1000)
+        self.assertLess(results["allocator"]["queries_per_1000"], results["random"]["queries_per_1000"] / 50)
+        self.assertTrue(results["allocator"]["distinct"])
+        self.assertFalse(User.objects.filter(username="@benchrooms").exists())
+        self.assertFalse(StudySession.objects.exists())
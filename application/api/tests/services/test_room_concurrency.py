@@ -0,0 +1,116 @@
+"""Stress test for room membership under many simultaneous joins, leaves and creates."""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+
+from api.models import List, SessionUser, StudySession, User
+from api.realtime.roster import roster_cache
+from api.services.room_codes import room_codes
+from api.services.room_lookup import room_lookup
+from api.services.room_membership import RoomNotFound, create_room, join_room, leave_room
+
+USERS = 40
+OPERATIONS_PER_USER = 10
+THREADS = 16
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class RoomConcurrencyTestCase(TransactionTestCase):
+    """
+    The test database is in memory, where SQLite locks whole tables and fails at once instead
+    of waiting, so this runs on a copy of it in a WAL mode file (with the DATABASES options),
+    as the site does. Every thread gets its own connection to it.
+    """
+
+    def setUp(self):
+        roster_cache.clear()
+        room_lookup.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "rooms.sqlite3")
+        connection.ensure_connection()
+        copy = sqlite3.connect(path)
+        connection.connection.backup(copy)
+        copy.close()
+        self.in_memory = connections["default"]
+        self.settings_dict = {**self.in_memory.settings_dict, "NAME": path}
+        self.use_file_database()
+
+        self.users = [User.objects.create(firstname=f"Racer{index}", lastname="Stress",
+                                          email=f"racer{index}@test.invalid", username=f"@racer{index}")
+                      for index in range(USERS)]
+        # A few rooms to fight over, each opened by someone
+        self.room_codes = [create_room(user, "Contended").roomCode for user in self.users[:3]]
+        self.codes_lock = threading.Lock()
+
+    def tearDown(self):
+        connection.close()
+        connections["default"] = self.in_memory
+        self.directory.cleanup()
+        # Its codes were reserved in the file database
+        room_codes.clear()
+        roster_cache.clear()
+        room_lookup.clear()
+
+    def use_file_database(self):
+        connections["default"] = type(self.in_memory)(self.settings_dict, alias="default")
+
+    def run_user(self, index):
+        """One user's requests, in order; returns the room they should end up in."""
+        self.use_file_database()
+        user = self.users[index]
+        rng = random.Random(index)
+        room = self.room_codes[index] if index < 3 else None
+        try:
+            for _ in range(OPERATIONS_PER_USER):
+                with self.codes_lock:
+                    code = rng.choice(self.room_codes)
+                action = rng.random()
+                if action < 0.5:
+                    try:
+                        join_room(user, code)
+                        room = code
+                    except RoomNotFound:
+                        # Closed by its last participant in the meantime
+                        pass
+                elif action < 0.9:
+                    try:
+                        if leave_room(user, code):
+                            self.assertEqual(code, room)
+                            room = None
+                    except RoomNotFound:
+                        self.assertNotEqual(code, room)
+                else:
+                    room = create_room(user, "Mine").roomCode
+                    with self.codes_lock:
+                        self.room_codes.append(room)
+            return room
+        finally:
+            connection.close()
+
+    def test_concurrent_membership_changes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            expected = list(pool.map(self.run_user, range(USERS)))
+
+        participants = set(StudySession.participants.through.objects.values_list("user_id", "studysession__roomCode"))
+        session_users = set(SessionUser.objects.values_list("user_id", "session__roomCode"))
+        # Everyone is where their last successful request put them, and nowhere else
+        self.assertEqual(participants, {(user.pk, room) for user, room in zip(self.users, expected) if room})
+        self.assertEqual(session_users, participants)
+        # No room outlived its last participant, nor its to-do list
+        self.assertFalse(StudySession.objects.filter(participants__isnull=True).exists())
+        self.assertEqual(List.objects.filter(is_shared=True).count(), StudySession.objects.count())
+        # And the cached rosters agree with the database
+        for room_code in StudySession.objects.values_list("roomCode", flat=True):
+            self.assertEqual(set(roster_cache.load(room_code)),
+                             set(User.objects.filter(study_sessions__roomCode=room_code)
+                                 .values_list("username", flat=True)))
@@ -0,0 +1,106 @@
+"""Tests for the room code / session / to-do list lookup cache."""
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import StudySession, User
+from api.realtime.roster import roster_cache
+from api.services.room_lookup import RoomLookup, RoomRef, room_lookup
+
+
+class RoomLookupTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        room_lookup.clear()
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="Lookup Room")
+        self.ref = RoomRef(self.session.pk, self.session.roomCode, self.session.toDoList_id, "Lookup Room")
+
+    def tearDown(self):
+        room_lookup.clear()
+        roster_cache.clear()
+
+    def test_by_code_queries_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(room_lookup.by_code(self.session.roomCode), self.ref)
+        with self.assertNumQueries(0):
+            self.assertEqual(room_lookup.by_code(self.session.roomCode), self.ref)
+            self.assertEqual(room_lookup.by_list(self.session.toDoList_id), self.ref)
+
+    def test_by_list_fills_code_index(self):
+        self.assertEqual(room_lookup.by_list(self.session.toDoList_id), self.ref)
+        with self.assertNumQueries(0):
+            self.assertEqual(room_lookup.by_code(self.session.roomCode), self.ref)
+
+    def test_missing_rooms_are_not_cached(self):
+        self.assertIsNone(room_lookup.by_code("NOPE0000"))
+        self.assertIsNone(room_lookup.by_list(-1))
+        self.assertEqual(len(room_lookup), 0)
+
+    def test_save_refreshes_and_delete_evicts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.sessionName = "Renamed"
+            self.session.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(room_lookup.by_code(self.session.roomCode).session_name, "Renamed")
+
+        self.session.delete()
+        self.assertIsNone(room_lookup.by_code(self.ref.room_code))
+        self.assertIsNone(room_lookup.by_list(self.ref.list_id))
+
+    def test_rolled_back_save_is_not_cached(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.session.sessionName = "Never committed"
+            self.session.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(room_lookup), 0)
+
+    def test_lru_and_ttl(self):
+        lookup = RoomLookup(max_size=1, ttl=60)
+        other = StudySession.objects.create(createdBy=self.user, sessionName="Other Room")
+        lookup.by_code(self.session.roomCode)
+        lookup.by_code(other.roomCode)
+        self.assertEqual(len(lookup), 1)
+        self.assertIsNone(lookup._cached(self.session.roomCode))
+
+        expired = RoomLookup(ttl=0)
+        expired.by_code(self.session.roomCode)
+        with self.assertNumQueries(1):
+            expired.by_code(self.session.roomCode)
+
+
+class RoomLookupViewsTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        room_lookup.clear()
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="View Room")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        room_lookup.clear()
+        roster_cache.clear()
+
+    def test_room_details_and_participants_use_cache(self):
+        room_lookup.by_code(self.session.roomCode)
+        room_lookup.misses = 0
+
+        details = self.client.get(f"/api/get-room-details/?roomCode={self.session.roomCode}")
+        participants = self.client.get(f"/api/get-participants/?roomCode={self.session.roomCode}")
+
+        self.assertEqual(details.data, {"sessionName": "View Room", "roomList": self.session.toDoList_id})
+        self.assertEqual(participants.status_code, 200)
+        self.assertEqual(room_lookup.misses, 0)
+
+    def test_task_updates_find_room_from_cache(self):
+        room_lookup.by_code(self.session.roomCode)
+        room_lookup.misses = 0
+
+        response = self.client.post("/api/new_task/", {
+            "title": "Read", "content": "Chapter 1", "list_id": self.session.toDoList_id,
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(room_lookup.misses, 0)
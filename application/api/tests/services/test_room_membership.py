@@ -0,0 +1,183 @@
+"""Tests for joining, leaving and creating group study rooms in one transaction."""
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from api.models import List, SessionUser, StudySession, User
+from api.realtime.roster import roster_cache
+from api.services.room_lookup import room_lookup
+from api.services.room_membership import RoomNotFound, create_room, join_room, leave_room
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class RoomMembershipTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        roster_cache.clear()
+        room_lookup.clear()
+        self.alice = User.objects.get(username='@alice123')
+        self.bob = User.objects.get(username='@bob456')
+        self.target = StudySession.objects.create(createdBy=self.bob, sessionName="Target")
+        self.others = [StudySession.objects.create(createdBy=self.bob, sessionName=f"Other {index}")
+                       for index in range(3)]
+
+    def tearDown(self):
+        roster_cache.clear()
+        room_lookup.clear()
+
+    def enter(self, user, *sessions):
+        # The state the old views could leave behind: in several rooms at once
+        for session in sessions:
+            session.participants.add(user)
+            SessionUser.objects.create(user=user, session=session)
+
+    def rooms_of(self, user):
+        return (set(user.study_sessions.values_list("roomCode", flat=True)),
+                set(SessionUser.objects.filter(user=user).values_list("session__roomCode", flat=True)))
+
+    def test_join_leaves_every_other_room(self):
+        self.enter(self.alice, *self.others)
+        with self.captureOnCommitCallbacks(execute=True):
+            session_user = join_room(self.alice, self.target.roomCode)
+
+        self.assertEqual(session_user.session_id, self.target.pk)
+        self.assertEqual(self.rooms_of(self.alice), ({self.target.roomCode}, {self.target.roomCode}))
+        self.assertEqual(roster_cache.load(self.target.roomCode), ["@alice123"])
+        # She was the last one in them
+        self.assertFalse(StudySession.objects.filter(pk__in=[other.pk for other in self.others]).exists())
+
+    def test_join_keeps_rooms_still_in_use(self):
+        self.enter(self.alice, self.others[0])
+        self.enter(self.bob, self.others[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            join_room(self.alice, self.target.roomCode)
+        self.assertEqual(roster_cache.load(self.others[0].roomCode), ["@bob456"])
+
+    def test_query_count_does_not_depend_on_previous_rooms(self):
+        carol = User.objects.get(username='@john789')
+        # Carol keeps the other rooms open
+        self.enter(carol, *self.others)
+        self.enter(self.alice, self.others[0])
+        self.enter(self.bob, *self.others)
+
+        # Savepoint, lock user, lock rooms, lastActive, 2 deletes, emptiness check, 2 inserts, release
+        with self.assertNumQueries(10):
+            join_room(self.alice, self.target.roomCode)
+        with self.assertNumQueries(10):
+            join_room(self.bob, self.target.roomCode)
+
+        # Closing the rooms left empty is one cascade however many there are
+        with self.assertNumQueries(21):
+            join_room(carol, self.target.roomCode)
+
+        # Joining from nowhere skips the participant DELETE and the emptiness check
+        dave = User.objects.create(firstname="Dave", lastname="Doe", email="dave@test.invalid", username="@dave")
+        with self.assertNumQueries(9):
+            join_room(dave, self.target.roomCode)
+
+    def test_rejoining_the_same_room(self):
+        first = join_room(self.alice, self.target.roomCode)
+        with self.captureOnCommitCallbacks() as callbacks:
+            again = join_room(self.alice, self.target.roomCode)
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.target.participants.count(), 1)
+        self.assertEqual(SessionUser.objects.filter(user=self.alice).count(), 1)
+
+    def test_leave(self):
+        self.enter(self.alice, self.target)
+        self.enter(self.bob, self.target)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(leave_room(self.alice, self.target.roomCode))
+        self.assertEqual(self.rooms_of(self.alice), (set(), set()))
+        self.assertEqual(roster_cache.load(self.target.roomCode), ["@bob456"])
+
+        # Leaving again changes nothing
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertFalse(leave_room(self.alice, self.target.roomCode))
+        self.assertEqual(callbacks, [])
+
+    def test_last_leave_closes_the_room(self):
+        self.enter(self.alice, self.target)
+        list_id = self.target.toDoList_id
+        leave_room(self.alice, self.target.roomCode)
+        self.assertFalse(StudySession.objects.filter(pk=self.target.pk).exists())
+        self.assertFalse(List.objects.filter(pk=list_id).exists())
+
+        with self.assertRaises(RoomNotFound):
+            leave_room(self.alice, self.target.roomCode)
+        with self.assertRaises(RoomNotFound):
+            join_room(self.bob, self.target.roomCode)
+
+    def test_leave_adds_the_time_studied(self):
+        self.enter(self.alice, self.target)
+        SessionUser.objects.filter(user=self.alice).update(joined_at=now() - timedelta(hours=2, minutes=5))
+        hours, sessions = self.alice.hours_studied, self.alice.total_sessions
+        leave_room(self.alice, self.target.roomCode)
+        self.alice.refresh_from_db()
+        self.assertEqual((self.alice.hours_studied, self.alice.total_sessions), (hours + 2, sessions + 1))
+
+    def test_unknown_room_changes_nothing(self):
+        self.enter(self.alice, self.others[0])
+        with self.assertRaises(RoomNotFound):
+            join_room(self.alice, "NOPE0000")
+        self.assertEqual(self.rooms_of(self.alice), ({self.others[0].roomCode}, {self.others[0].roomCode}))
+
+    def test_create_room(self):
+        self.enter(self.alice, *self.others[:2])
+        with self.captureOnCommitCallbacks(execute=True):
+            session = create_room(self.alice, "Fresh")
+
+        self.assertEqual(session.createdBy, self.alice)
+        self.assertTrue(session.toDoList.is_shared)
+        self.assertEqual(self.rooms_of(self.alice), ({session.roomCode}, {session.roomCode}))
+        self.assertEqual(roster_cache.load(session.roomCode), ["@alice123"])
+
+    def test_create_room_query_budget(self):
+        self.enter(self.alice, *self.others)
+        self.enter(self.bob, *self.others)
+        # Savepoint, lock user, lock rooms, 2 deletes, emptiness check, room code check, list,
+        # room, participant, SessionUser, release
+        with self.assertNumQueries(12):
+            create_room(self.alice, "Budget")
+
+
+class RoomMembershipViewsTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        roster_cache.clear()
+        room_lookup.clear()
+        self.user = User.objects.get(username='@alice123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        roster_cache.clear()
+        room_lookup.clear()
+
+    def test_create_then_join(self):
+        created = self.client.post("/api/create-room/", {"sessionName": "Mine"}, format="json")
+        self.assertEqual(created.status_code, 200)
+        other = StudySession.objects.create(createdBy=self.user, sessionName="Other")
+
+        joined = self.client.post("/api/join-room/", {"roomCode": other.roomCode}, format="json")
+        self.assertEqual(joined.data, {"message": "Joined successfully!"})
+        self.assertEqual(list(self.user.study_sessions.values_list("roomCode", flat=True)), [other.roomCode])
+
+        missing = self.client.post("/api/join-room/", {"roomCode": "NOPE0000"}, format="json")
+        self.assertEqual(missing.status_code, 404)
+
+    def test_leave_twice(self):
+        room = StudySession.objects.create(createdBy=self.user, sessionName="Shared")
+        other = User.objects.get(username='@bob456')
+        join_room(other, room.roomCode)
+        join_room(self.user, room.roomCode)
+
+        for _ in range(2):
+            left = self.client.post("/api/leave-room/", {"roomCode": room.roomCode}, format="json")
+            self.assertEqual(left.data, {"message": "Left successfully!", "username": "@alice123"})
+        self.assertEqual(list(room.participants.values_list("username", flat=True)), ["@bob456"])
@@ -0,0 +1,120 @@
+"""Tests for the reaper of abandoned study rooms and stale SessionUser rows."""
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from api import routing
+from api.models import List, SessionUser, StudySession, User, toDoList
+from api.realtime.room_activity import room_activity
+from api.realtime.roster import roster_cache
+from api.services.room_lookup import room_lookup
+from api.services.room_membership import join_room
+from api.services.room_reaper import reap_rooms
+
+GRACE = 15 * 60
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+                   ROOM_REAPER_GRACE=GRACE)
+class RoomReaperTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        roster_cache.clear()
+        room_lookup.clear()
+        room_activity.clear()
+        self.alice = User.objects.get(username='@alice123')
+        self.bob = User.objects.get(username='@bob456')
+
+    def tearDown(self):
+        roster_cache.clear()
+        room_lookup.clear()
+        room_activity.clear()
+
+    def room(self, name, idle_seconds, *members):
+        session = StudySession.objects.create(createdBy=self.alice, sessionName=name)
+        toDoList.objects.create(list=session.toDoList, title=f"{name} task")
+        for user in members:
+            session.participants.add(user)
+            SessionUser.objects.create(user=user, session=session)
+        StudySession.objects.filter(pk=session.pk).update(lastActive=now() - timedelta(seconds=idle_seconds))
+        return session
+
+    def test_deletes_abandoned_rooms_with_their_data(self):
+        abandoned = self.room("Abandoned", GRACE + 60, self.alice)
+        recent = self.room("Recent", GRACE - 60, self.bob)
+
+        self.assertEqual(reap_rooms(), {"rooms": 1, "session_users": 0})
+        self.assertFalse(StudySession.objects.filter(pk=abandoned.pk).exists())
+        self.assertFalse(List.objects.filter(pk=abandoned.toDoList_id).exists())
+        self.assertFalse(toDoList.objects.filter(list_id=abandoned.toDoList_id).exists())
+        self.assertFalse(SessionUser.objects.filter(session_id=abandoned.pk).exists())
+        self.assertTrue(StudySession.objects.filter(pk=recent.pk).exists())
+
+    def test_batches(self):
+        for index in range(5):
+            self.room(f"Old {index}", GRACE + 60, self.alice)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reap_rooms(batch_size=2)["rooms"], 5)
+        # 3 batches of rooms and the one finding none, delete_rooms nested in the first 3, and the
+        # SessionUser batch finding none
+        savepoints = [query for query in queries if query["sql"].startswith("SAVEPOINT")]
+        self.assertEqual(len(savepoints), 4 + 3 + 1)
+        self.assertFalse(StudySession.objects.exists())
+
+    def test_live_and_joined_rooms_are_kept(self):
+        live = self.room("Live", GRACE + 60)
+        joined = self.room("Joined", GRACE + 60)
+        join_room(self.bob, joined.roomCode)
+
+        self.assertEqual(reap_rooms(live=[live.roomCode])["rooms"], 0)
+
+    def test_closes_stale_session_users(self):
+        room = self.room("Open", 0, self.alice, self.bob)
+        # Bob's socket dropped and he was taken out of the participants, but his row stayed open
+        room.participants.remove(self.bob)
+        closed = SessionUser.objects.create(user=self.bob, session=room, left_at=now() - timedelta(hours=1))
+
+        self.assertEqual(reap_rooms(batch_size=1), {"rooms": 0, "session_users": 1})
+        self.assertIsNotNone(SessionUser.objects.get(user=self.bob, pk__lt=closed.pk).left_at)
+        self.assertIsNone(SessionUser.objects.get(user=self.alice).left_at)
+
+    def test_command(self):
+        self.room("Abandoned", GRACE + 60, self.alice)
+        out = StringIO()
+        call_command("reap_rooms", "--dry-run", stdout=out)
+        self.assertIn("Would delete 1 rooms", out.getvalue())
+        self.assertEqual(StudySession.objects.count(), 1)
+
+        call_command("reap_rooms", "--batch-size", "10", stdout=out)
+        self.assertIn("Deleted 1 rooms", out.getvalue())
+        self.assertFalse(StudySession.objects.exists())
+
+    def test_sockets_keep_their_room_active(self):
+        room = self.room("Sockets", GRACE + 60)
+
+        async def run():
+            communicator = WebsocketCommunicator(URLRouter(routing.websocket_urlpatterns),
+                                                 f"/ws/room/{room.roomCode}/")
+            await communicator.connect()
+            await communicator.receive_json_from()  # roster_sync
+            live = room_activity.live_rooms()
+            reaped = await room_activity.tick(reap=True)
+            await communicator.disconnect()
+            return live, reaped
+
+        live, reaped = async_to_sync(run)()
+        self.assertEqual(live, [room.roomCode])
+        self.assertEqual(reaped["rooms"], 0)
+        self.assertEqual(room_activity.live_rooms(), [])
+        room.refresh_from_db()
+        self.assertGreater(room.lastActive, now() - timedelta(seconds=GRACE))
@@ -0,0 +1,119 @@
+"""Tests for batched task operations and the tasks_batch endpoint."""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.models import List, StudySession, User, toDoList
+from api.realtime.encoders import decode_frame
+from api.realtime.roster import roster_cache
+from api.services.room_lookup import room_lookup
+from api.services.task_batch import TaskBatchError, apply_task_operations
+
+
+class TaskBatchTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_lists.json']
+
+    def setUp(self):
+        self.todo_list = List.objects.get(pk=1)
+        self.first = toDoList.objects.create(list=self.todo_list, title="First")
+        self.second = toDoList.objects.create(list=self.todo_list, title="Second", is_completed=True)
+
+    def test_operations_are_applied_in_order(self):
+        _, results, event = apply_task_operations(self.todo_list.pk, [
+            {"op": "toggle", "task_id": self.first.pk},
+            {"op": "toggle", "task_id": self.second.pk},
+            {"op": "toggle", "task_id": self.second.pk},
+            {"op": "delete", "task_id": self.second.pk},
+            {"op": "create", "title": "Third", "content": "New"},
+        ])
+
+        self.assertEqual([result["op"] for result in results], ["toggle", "toggle", "toggle", "delete", "create"])
+        self.assertTrue(toDoList.objects.get(pk=self.first.pk).is_completed)
+        self.assertFalse(toDoList.objects.filter(pk=self.second.pk).exists())
+        third = toDoList.objects.get(title="Third")
+        self.assertEqual(event, {
+            "type": "tasks_batch",
+            "list_id": self.todo_list.pk,
+            "created": [{"id": third.pk, "title": "Third", "content": "New", "is_completed": False,
+                         "list_id": self.todo_list.pk}],
+            "toggled": [{"task_id": self.first.pk, "is_completed": True}],
+            "deleted": [self.second.pk],
+            "revision": List.objects.get(pk=self.todo_list.pk).revision,
+        })
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def batch(size):
+            return [{"op": "create", "title": f"Task {i}"} for i in range(size)] + [
+                {"op": "toggle", "task_id": self.first.pk},
+                {"op": "delete", "task_id": self.second.pk},
+            ]
+
+        # With the revision bump, the tombstones of the deleted tasks and pruning the old ones
+        with self.assertNumQueries(10):
+            apply_task_operations(self.todo_list.pk, batch(50))
+        self.assertEqual(toDoList.objects.filter(list=self.todo_list).count(), 51)
+
+    def test_invalid_batch_writes_nothing(self):
+        invalid = [
+            [],
+            [{"op": "rename", "task_id": self.first.pk}],
+            [{"op": "create", "title": ""}],
+            [{"op": "toggle", "task_id": "abc"}],
+            [{"op": "delete", "task_id": self.first.pk}, {"op": "toggle", "task_id": self.first.pk}],
+            [{"op": "create", "title": "Lost"}, {"op": "delete", "task_id": 99999}],
+        ]
+        for operations in invalid:
+            with self.subTest(operations=operations):
+                with self.assertRaises(TaskBatchError):
+                    apply_task_operations(self.todo_list.pk, operations)
+        with self.assertRaises(TaskBatchError):
+            apply_task_operations(99999, [{"op": "create", "title": "Nowhere"}])
+
+        self.assertEqual(toDoList.objects.filter(list=self.todo_list).count(), 2)
+        self.assertFalse(toDoList.objects.get(pk=self.first.pk).is_completed)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class TaskBatchViewTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        room_lookup.clear()
+        self.user = User.objects.get(username='@alice123')
+        self.session = StudySession.objects.create(createdBy=self.user, sessionName="Batch Room")
+        self.task = toDoList.objects.create(list=self.session.toDoList, title="Existing")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        room_lookup.clear()
+        roster_cache.clear()
+
+    def test_shared_list_gets_one_event(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"room_{self.session.roomCode}", channel)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/tasks_batch/", {
+                "list_id": self.session.toDoList_id,
+                "operations": [{"op": "create", "title": f"Imported {i}"} for i in range(20)]
+                              + [{"op": "delete", "task_id": self.task.pk}],
+            }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 21)
+        message = async_to_sync(channel_layer.receive)(channel)
+        event = decode_frame(message["json"])
+        self.assertEqual(event["type"], "tasks_batch")
+        self.assertEqual(len(event["created"]), 20)
+        self.assertEqual(event["deleted"], [self.task.pk])
+
+    def test_invalid_batch_is_rejected(self):
+        response = self.client.post("/api/tasks_batch/", {
+            "list_id": self.session.toDoList_id,
+            "operations": [{"op": "toggle", "task_id": 99999}],
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("isn't in this list", response.data["error"])
@@ -0,0 +1,205 @@
+"""Tests for list revisions and the api/todolists/changes/ delta sync."""
+import os
+import sqlite3
+import tempfile
+import threading
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.models import List, Permission, StudySession, TaskTombstone, User, toDoList
+from api.services.task_batch import apply_task_operations
+from api.services.todo_changes import changes_since
+
+
+class TodoChangesTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_lists.json']
+
+    def setUp(self):
+        self.todo_list = List.objects.get(pk=1)
+        self.first = toDoList.objects.create(list=self.todo_list, title="First")
+        self.second = toDoList.objects.create(list=self.todo_list, title="Second")
+        self.since = self.revision()
+
+    def revision(self):
+        return List.objects.get(pk=self.todo_list.pk).revision
+
+    def test_every_change_bumps_the_revision(self):
+        toDoList.objects.create(list=self.todo_list, title="Third")
+        self.assertEqual(self.revision(), self.since + 1)
+        toDoList.objects.filter(pk=self.first.pk).toggle_completed()
+        self.assertEqual(self.revision(), self.since + 2)
+        self.second.delete()
+        self.assertEqual(self.revision(), self.since + 3)
+        apply_task_operations(self.todo_list.pk, [{"op": "toggle", "task_id": self.first.pk},
+                                                  {"op": "create", "title": "Fourth"}])
+        self.assertEqual(self.revision(), self.since + 4)
+
+        # Other lists are left alone
+        self.assertEqual(List.objects.get(pk=2).revision, 0)
+
+    def test_saved_task_carries_the_revision(self):
+        self.first.title = "Renamed"
+        self.first.save()
+        self.assertEqual(self.first.revision, self.revision())
+        self.assertEqual(self.first.created_revision, self.since - 1)
+
+    def test_changes_since(self):
+        third = toDoList.objects.create(list=self.todo_list, title="Third")
+        toDoList.objects.filter(pk=self.first.pk).toggle_completed()
+        second_id = self.second.pk
+        self.second.delete()
+
+        with self.assertNumQueries(3):
+            changes = changes_since(self.todo_list.pk, self.since)
+        self.assertEqual(changes["revision"], self.since + 3)
+        self.assertFalse(changes["reset"])
+        self.assertEqual([task["id"] for task in changes["created"]], [third.pk])
+        self.assertEqual(changes["updated"], [{
+            "id": self.first.pk, "title": "First", "content": "", "is_completed": True,
+            "creation_date": self.first.creation_date,
+        }])
+        self.assertEqual(changes["deleted"], [second_id])
+
+        # Nothing changed since the latest revision
+        latest = changes_since(self.todo_list.pk, changes["revision"])
+        self.assertEqual((latest["created"], latest["updated"], latest["deleted"]), ([], [], []))
+
+    def test_batch_changes(self):
+        _, results, _ = apply_task_operations(self.todo_list.pk, [
+            {"op": "toggle", "task_id": self.first.pk},
+            {"op": "delete", "task_id": self.second.pk},
+            {"op": "create", "title": "Third"},
+        ])
+        changes = changes_since(self.todo_list.pk, self.since)
+        self.assertEqual([task["id"] for task in changes["created"]], [results[2]["task"]["id"]])
+        self.assertEqual([task["id"] for task in changes["updated"]], [self.first.pk])
+        self.assertEqual(changes["deleted"], [self.second.pk])
+
+    def test_since_ahead_of_the_list_resets(self):
+        changes = changes_since(self.todo_list.pk, self.since + 10)
+        self.assertTrue(changes["reset"])
+        self.assertEqual([task["id"] for task in changes["created"]], [self.first.pk, self.second.pk])
+        self.assertEqual(changes["deleted"], [])
+        self.assertIsNone(changes_since(99999, 0))
+
+    @override_settings(TASK_TOMBSTONE_REVISIONS=2)
+    def test_old_tombstones_are_pruned(self):
+        self.first.delete()
+        self.assertEqual(TaskTombstone.objects.count(), 1)
+        toDoList.objects.create(list=self.todo_list, title="Third")
+        toDoList.objects.create(list=self.todo_list, title="Fourth")
+        recent = self.revision()
+        apply_task_operations(self.todo_list.pk, [{"op": "delete", "task_id": self.second.pk}])
+        self.assertEqual(list(TaskTombstone.objects.values_list("task_id", flat=True)), [self.second.pk])
+
+        # The first deletion's tombstone is gone, a client from before it has to start over
+        changes = changes_since(self.todo_list.pk, self.since)
+        self.assertTrue(changes["reset"])
+        self.assertEqual([task["title"] for task in changes["created"]], ["Third", "Fourth"])
+        changes = changes_since(self.todo_list.pk, recent)
+        self.assertFalse(changes["reset"])
+        self.assertEqual(changes["deleted"], [self.second.pk])
+
+    def test_tombstones_go_with_the_list(self):
+        self.second.delete()
+        self.todo_list.delete()
+        self.assertFalse(TaskTombstone.objects.exists())
+
+
+class TodoChangesViewTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json', 'api/tests/fixtures/default_lists.json']
+
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.get(username='@alice123')
+        self.client.force_authenticate(user=self.alice)
+        Permission.objects.create(user_id=self.alice, list_id=List.objects.get(pk=1))
+        self.task = toDoList.objects.create(list_id=1, title="Task")
+
+    def test_changes(self):
+        since = List.objects.get(pk=1).revision
+        self.client.patch(f"/api/update_task/{self.task.pk}/")
+        response = self.client.get(f"/api/todolists/changes/?list_id=1&since={since}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["revision"], since + 1)
+        self.assertEqual([task["id"] for task in response.data["updated"]], [self.task.pk])
+
+    def test_creating_a_task_is_one_change(self):
+        since = List.objects.get(pk=1).revision
+        response = self.client.post("/api/new_task/", {"list_id": 1, "title": "New", "content": ""}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(List.objects.get(pk=1).revision, since + 1)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get("/api/todolists/changes/?since=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/todolists/changes/?list_id=1&since=-1").status_code, 400)
+        self.assertEqual(self.client.get("/api/todolists/changes/?list_id=99999").status_code, 404)
+
+    def test_only_owners_and_room_participants_see_changes(self):
+        self.client.force_authenticate(user=User.objects.get(username='@bob456'))
+        self.assertEqual(self.client.get("/api/todolists/changes/?list_id=1").status_code, 404)
+
+        room = StudySession.objects.create(createdBy=self.alice, sessionName="Changes Room")
+        room.participants.add(User.objects.get(username='@bob456'))
+        response = self.client.get(f"/api/todolists/changes/?list_id={room.toDoList_id}")
+        self.assertEqual(response.status_code, 200)
+
+
+class TodoChangesInterleavingTestCase(TransactionTestCase):
+    """
+    changes_since from another connection while a task is being saved. Runs on a copy of the
+    in-memory test database in a WAL mode file, like test_room_concurrency, so the reader
+    thread sees only what the saving connection has committed.
+    """
+    fixtures = ['api/tests/fixtures/default_lists.json']
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "lists.sqlite3")
+        connection.ensure_connection()
+        copy = sqlite3.connect(path)
+        connection.connection.backup(copy)
+        copy.close()
+        self.in_memory = connections["default"]
+        self.settings_dict = {**self.in_memory.settings_dict, "NAME": path}
+        self.use_file_database()
+
+    def tearDown(self):
+        connection.close()
+        connections["default"] = self.in_memory
+        self.directory.cleanup()
+
+    def use_file_database(self):
+        connections["default"] = type(self.in_memory)(self.settings_dict, alias="default")
+
+    def read_changes(self, since, results):
+        self.use_file_database()
+        try:
+            results.append(changes_since(1, since))
+        finally:
+            connection.close()
+
+    def test_changes_read_while_a_task_is_saved_are_not_lost(self):
+        task = toDoList.objects.create(list_id=1, title="Task")
+        since = List.objects.get(pk=1).revision
+        bump_revision = List.bump_revision
+        seen = []
+
+        def bump_then_read(list_ids):
+            bump_revision(list_ids)
+            # Between bumping the list and stamping the task
+            reader = threading.Thread(target=self.read_changes, args=(since, seen))
+            reader.start()
+            reader.join()
+
+        task.title = "Renamed"
+        with mock.patch.object(List, "bump_revision", side_effect=bump_then_read):
+            task.save()
+
+        # The reader didn't see the new revision yet, so its next sync picks up the rename
+        self.assertEqual(seen[0]["revision"], since)
+        changes = changes_since(1, seen[0]["revision"])
+        self.assertEqual([change["title"] for change in changes["updated"]], ["Renamed"])
@@ -0,0 +1,59 @@
+"""Tests for the to-do list loader behind ViewToDoList.get."""
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import List, Permission, User, toDoList
+from api.services.todo_loader import group_list, user_lists
+
+
+class TodoLoaderTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json',
+                'api/tests/fixtures/default_lists.json',
+                'api/tests/fixtures/default_permissions.json',
+                'api/tests/fixtures/default_list_task.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='@alice123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_lists(self, count, tasks_per_list=3):
+        for i in range(count):
+            todo_list = List.objects.create(name=f"Extra {i}", is_shared=False)
+            Permission.objects.create(user_id=self.user, list_id=todo_list)
+            toDoList.objects.bulk_create([
+                toDoList(list=todo_list, title=f"Task {j}", content="") for j in range(tasks_per_list)
+            ])
+
+    def expected(self, lists):
+        return [{
+            "id": todo_list.pk,
+            "name": todo_list.name,
+            "is_shared": todo_list.is_shared,
+            "revision": todo_list.revision,
+            "tasks": [{
+                "id": task.pk,
+                "title": task.title,
+                "content": task.content,
+                "is_completed": task.is_completed,
+                "creation_date": task.creation_date,
+            } for task in toDoList.objects.filter(list=todo_list).order_by("pk")],
+        } for todo_list in lists]
+
+    def test_matches_per_list_queries(self):
+        self.add_lists(2)
+        lists = List.objects.filter(permission__user_id=self.user, is_shared=False).order_by("pk")
+        self.assertEqual(user_lists(self.user), self.expected(lists))
+
+    def test_group_list(self):
+        todo_list = List.objects.get(name='Default List1')
+        self.assertEqual(group_list(todo_list.pk), self.expected([todo_list]))
+        self.assertEqual(group_list(999999), [])
+
+    def test_query_count_is_constant(self):
+        with self.assertNumQueries(2):
+            few = self.client.get('/api/todolists/')
+        self.add_lists(25)
+        with self.assertNumQueries(2):
+            many = self.client.get('/api/todolists/')
+        self.assertEqual(len(many.data), len(few.data) + 25)
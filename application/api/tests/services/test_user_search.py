@@ -0,0 +1,152 @@
+"""Tests for the find-friend search index."""
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.management.commands.bench_user_search import benchmark_user_search
+from api.models import Friends, Status, User, UserSearchToken
+from api.services.friend_graph import friend_graph
+from api.services.user_search import query_tokens, search_users, search_words, user_tokens
+from api.signals import index_users_after_migrate
+
+
+class UserSearchTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        friend_graph.clear()
+        self.alice = User.objects.get(username='@alice123')
+        self.users = {
+            name: User.objects.create(firstname=first, lastname=last, email=f"{name}@test.invalid",
+                                      username=f"@{name}")
+            for name, first, last in [
+                ("ann", "Zed", "Quinn"),
+                ("annabel", "Annabel", "Lee"),
+                ("joanna", "Joanna", "Smith"),
+                ("hannah", "Hannah", "Anniston"),
+            ]
+        }
+
+    def tearDown(self):
+        friend_graph.clear()
+
+    def usernames(self, query, **kwargs):
+        return [user.username for user in search_users(query, **kwargs)]
+
+    def test_tokens(self):
+        self.assertEqual(search_words("@alice_1 Smith"), ["alice", "1", "smith"])
+        self.assertEqual(user_tokens(User(username="@al", firstname="Bo", lastname="X")),
+                         {"  a", " al", "  b", " bo", "  x"})
+        self.assertEqual(query_tokens(["a", "ann"]), {"  a", "ann"})
+
+    def test_users_are_indexed_on_save(self):
+        user = self.users["ann"]
+        self.assertEqual(set(user.search_tokens.values_list("token", flat=True)), user_tokens(user))
+
+        user.lastname = "Renamed"
+        user.save()
+        self.assertIn("ren", set(user.search_tokens.values_list("token", flat=True)))
+        self.assertNotIn("qui", set(user.search_tokens.values_list("token", flat=True)))
+
+        # Saving other fields (like a login) leaves the index alone
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+
+    def test_full_saves_without_name_changes_skip_the_index(self):
+        user = User.objects.get(username="@ann")
+        user.hours_studied += 1
+        # Only the UPDATE of the user, the trigram rows stay as they are
+        with self.assertNumQueries(1):
+            user.save()
+
+        user.firstname = "Ziggy"
+        user.save()
+        self.assertIn("zig", set(user.search_tokens.values_list("token", flat=True)))
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_ranking(self):
+        # Exact username, then prefixes, then substrings, by username within each
+        self.assertEqual(self.usernames("ann"), ["@ann", "@annabel", "@hannah", "@joanna"])
+        self.assertEqual(self.usernames("@ann"), ["@ann", "@annabel", "@hannah", "@joanna"])
+        self.assertEqual(self.usernames("ANNIS"), ["@hannah"])
+        self.assertEqual(self.usernames("an"), ["@ann", "@annabel", "@hannah"])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.usernames("joanna smi"), ["@joanna"])
+        self.assertEqual(self.usernames("joanna lee"), [])
+        # @hannah has "anna" but no "bel"
+        self.assertEqual(self.usernames("anna bel"), ["@annabel"])
+
+    def test_limit_and_after(self):
+        first_page = list(search_users("ann", limit=2))
+        self.assertEqual([user.username for user in first_page], ["@ann", "@annabel"])
+        last = first_page[-1]
+        self.assertEqual(self.usernames("ann", limit=2, after=(last.rank, last.pk)), ["@hannah", "@joanna"])
+
+    def test_excludes_the_user_and_friends(self):
+        Friends.objects.create(user1=self.alice, user2=self.users["annabel"], status=Status.ACCEPTED,
+                               requested_by=self.alice)
+        Friends.objects.create(user1=self.alice, user2=self.users["hannah"], status=Status.PENDING,
+                               requested_by=self.alice)
+        self.assertEqual(self.usernames("a", user=self.alice), ["@ann", "@hannah"])
+        self.assertIn("@annabel", self.usernames("a", user=self.alice, exclude_friends=False))
+
+    def test_search_goes_through_the_index(self):
+        sql, params = search_users("ann").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertNotIn("SCAN api_user ", plan + " ")
+        self.assertNotIn("SCAN api_usersearchtoken", plan)
+
+    def test_rebuild(self):
+        UserSearchToken.objects.all().delete()
+        call_command("rebuild_user_search", "--batch-size", "2", stdout=open("/dev/null", "w"))
+        self.assertEqual(self.usernames("joanna"), ["@joanna"])
+        self.assertEqual(UserSearchToken.objects.values("user").distinct().count(), User.objects.count())
+
+    def test_users_without_tokens_are_indexed_after_migrate(self):
+        UserSearchToken.objects.filter(user=self.users["joanna"]).delete()
+        self.assertEqual(self.usernames("joanna"), [])
+        index_users_after_migrate(apps.get_app_config("api"))
+        self.assertEqual(self.usernames("joanna"), ["@joanna"])
+
+    def test_query_without_words_lists_everyone(self):
+        everyone = list(User.objects.exclude(pk=self.alice.pk).order_by("pk").values_list("username", flat=True))
+        self.assertEqual(self.usernames("", user=self.alice, limit=100), everyone)
+        self.assertEqual(self.usernames(" @ ", user=self.alice, limit=100), everyone)
+
+    def test_benchmark(self):
+        results = benchmark_user_search(users=300, queries=("user12",), repeat=1)
+        self.assertGreaterEqual(results["users"], 300)
+        self.assertEqual(results["user12"]["matches"], 11)
+        self.assertEqual(results["user12"]["indexed_queries"], 1)
+        self.assertFalse(User.objects.filter(username="@user12").exists())
+
+
+class FindFriendViewTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json', 'api/tests/fixtures/default_friends.json']
+
+    def setUp(self):
+        friend_graph.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.get(username='@alice123'))
+
+    def tearDown(self):
+        friend_graph.clear()
+
+    def test_find_friend(self):
+        # Bob Johnson is already Alice's friend
+        response = self.client.get('/api/find_friend/?q=joh')
+        self.assertEqual([user["username"] for user in response.data], ["@john789"])
+        self.assertEqual(self.client.get('/api/find_friend/?q=a&page_size=x').status_code, 400)
+
+    def test_empty_query_lists_everyone_but_friends(self):
+        response = self.client.get('/api/find_friend/?q=')
+        usernames = [user["username"] for user in response.data]
+        self.assertIn("@john789", usernames)
+        self.assertNotIn("@bob456", usernames)
+        self.assertNotIn("@alice123", usernames)
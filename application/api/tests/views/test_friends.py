@@ -3,6 +3,7 @@ from django.test import RequestFactory
 from rest_framework import status
 from rest_framework.test import APITestCase
 from api.models import User,Friends, Status
+from api.services.friend_graph import friend_graph
 
 class FriendsViewTestCase(APITestCase):
     fixtures = ['api/tests/fixtures/default_user.json',
@@ -11,6 +12,7 @@ class FriendsViewTestCase(APITestCase):
     def setUp(self):
         """Set up data for testing using fixtures."""
 
+        friend_graph.clear()
         self.factory = RequestFactory()
         self.user = User.objects.get(username='@alice123')
         self.friends = Friends.objects.get(pk=1)
@@ -18,6 +20,9 @@ class FriendsViewTestCase(APITestCase):
         self.client = APIClient()
         self.client.force_authenticate(user=self.user)
 
+    def tearDown(self):
+        friend_graph.clear()
+
     def test_get_lists_of_friends(self):
         """Test if the API correctly returns lists for an authenticated user based on permissions."""
 
@@ -63,6 +68,35 @@ class FriendsViewTestCase(APITestCase):
         self.assertEqual(list_data['surname'], check_data[0].user2.lastname)
         self.assertEqual(list_data['username'], check_data[0].user2.username)
         
+    def test_friends_page_is_one_query(self):
+        """Test that each friends list is read in one query, however many friends there are."""
+
+        for index in range(5):
+            friend = User.objects.create(firstname=f"Friend{index}", lastname="Test",
+                                         email=f"friend{index}@test.invalid", username=f"@friend{index}")
+            Friends.objects.create(user1=self.user, user2=friend, status=Status.ACCEPTED, requested_by=friend)
+
+        for url in ('/api/get_friends/', '/api/get_made_requests/', '/api/get_pending_friends/'):
+            with self.subTest(url=url):
+                with self.assertNumQueries(1):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), len(Friends.get_invitations_received(self.user)))
+
+        response = self.client.get('/api/get_friends/')
+        self.assertEqual(len(response.data), 6)
+        self.assertIn({"id": Friends.objects.get(user2__username="@friend0").pk, "name": "Friend0",
+                       "surname": "Test", "username": "@friend0"}, response.data)
+
+    def test_invitations_filter_in_the_database(self):
+        """Test that the invitation lists load both users without extra queries."""
+
+        with self.assertNumQueries(2):
+            received = [(i.user1.username, i.user2.username) for i in Friends.get_invitations_received(self.user)]
+            sent = [(i.user1.username, i.user2.username) for i in Friends.get_invitations_sent(self.user)]
+        self.assertEqual(len(received), 1)
+        self.assertEqual(len(sent), 1)
+
     def test_get_find_friends(self):
         """Test if the API correctly returns lists for an authenticated user based on permissions."""
 
@@ -70,7 +104,7 @@ class FriendsViewTestCase(APITestCase):
         response = self.client.get(f'/api/find_friend/?q={query}')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        check_data = User.find_user(query)
+        check_data = User.find_user(query, user=self.user)
         self.assertEqual(len(response.data), len(check_data))
 
         list_data = response.data[0]
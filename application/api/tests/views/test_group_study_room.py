@@ -6,7 +6,8 @@ from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 from api.models import StudySession, SessionUser, User
-from api.views import create_room, join_room, get_room_details, leave_room, notify_participants
+from api.realtime.broadcast import notify_participants
+from api.views import create_room, join_room, get_room_details, leave_room
 
 
 class GroupStudyRoomViewsTests(TestCase):
@@ -0,0 +1,107 @@
+"""Tests for the keyset pagination of the friends and find-friend endpoints."""
+import re
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import Friends, Status, User
+from api.services.friend_graph import friend_graph
+from api.views.pagination import PaginationError, decode_cursor, encode_cursor
+
+
+def next_link(response):
+    match = re.match(r'<(.+)>; rel="next"', response.get("Link", ""))
+    return match.group(1) if match else None
+
+
+class FriendsPaginationTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        friend_graph.clear()
+        self.user = User.objects.get(username='@alice123')
+        self.friends = []
+        for index in range(7):
+            friend = User.objects.create(firstname=f"Pal{index}", lastname="Page", email=f"pal{index}@test.invalid",
+                                         username=f"@pal{index}")
+            Friends.objects.create(user1=self.user, user2=friend, status=Status.ACCEPTED, requested_by=self.user)
+            self.friends.append(friend.username)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        friend_graph.clear()
+
+    def collect(self, url):
+        usernames, pages = [], 0
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            usernames += [friend["username"] for friend in response.data]
+            url = next_link(response)
+            pages += 1
+        return usernames, pages
+
+    def test_pages_follow_the_link(self):
+        usernames, pages = self.collect('/api/get_friends/?page_size=3')
+        self.assertEqual(usernames, self.friends)
+        self.assertEqual(pages, 3)
+
+    def test_default_page_has_no_link(self):
+        response = self.client.get('/api/get_friends/')
+        self.assertEqual(len(response.data), 7)
+        self.assertNotIn("Link", response)
+
+    def test_browsers_can_read_the_link(self):
+        response = self.client.get('/api/get_friends/?page_size=3', HTTP_ORIGIN="http://localhost:3000")
+        self.assertIsNotNone(next_link(response))
+        self.assertIn("link", response["Access-Control-Expose-Headers"].lower().split(", "))
+
+    def test_new_rows_dont_shift_pages(self):
+        response = self.client.get('/api/get_friends/?page_size=4')
+        latecomer = User.objects.create(firstname="Late", lastname="Page", email="late@test.invalid",
+                                        username="@late")
+        Friends.objects.create(user1=self.user, user2=latecomer, status=Status.ACCEPTED, requested_by=self.user)
+        Friends.objects.get(user2__username=self.friends[0]).delete()
+
+        rest = self.client.get(next_link(response))
+        self.assertEqual([friend["username"] for friend in rest.data], self.friends[4:] + ["@late"])
+
+    def test_invalid_parameters(self):
+        for query in ("page_size=0", "page_size=x", "cursor=!!", f"cursor={encode_cursor(1, 2)}"):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/get_friends/?{query}').status_code, 400)
+
+    def test_cursor_roundtrip(self):
+        self.assertEqual(decode_cursor(encode_cursor(2, 15), 2), (2, 15))
+        self.assertIsNone(decode_cursor(""))
+        with self.assertRaises(PaginationError):
+            decode_cursor(encode_cursor(1), 2)
+
+
+class FindFriendPaginationTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/default_user.json']
+
+    def setUp(self):
+        friend_graph.clear()
+        for index in range(5):
+            User.objects.create(firstname="Page", lastname=f"Reader{index}", email=f"reader{index}@test.invalid",
+                                username=f"@reader{index}")
+        User.objects.create(firstname="Some", lastname="One", email="pager@test.invalid", username="@pagereader")
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.get(username='@alice123'))
+
+    def tearDown(self):
+        friend_graph.clear()
+
+    def test_search_pages(self):
+        url, usernames = '/api/find_friend/?q=reader&page_size=2', []
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data), 2)
+            usernames += [user["username"] for user in response.data]
+            url = next_link(response)
+
+        # Prefix matches first, then the substring match, none repeated or lost
+        self.assertEqual(usernames, [f"@reader{index}" for index in range(5)] + ["@pagereader"])
@@ -2,7 +2,8 @@ from rest_framework.test import APIClient
 from django.test import RequestFactory
 from rest_framework import status
 from rest_framework.test import APITestCase
-from api.models import User, List, Permission, toDoList
+from unittest import mock
+from api.models import User, List, Permission, StudySession, toDoList
 from api.views.to_do_list import ViewToDoList
 from random import choice
 
@@ -79,6 +80,32 @@ class ListViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Invalid request", response.data["error"])
 
+    def test_delete_shared_task_broadcasts_after_commit(self):
+        """Deleting a room's task tells the room once the delete has committed"""
+        session = StudySession.objects.create(createdBy=self.user, sessionName="Delete Room")
+        task = toDoList.objects.create(list=session.toDoList, title="Shared task")
+
+        with mock.patch("api.views.to_do_list.broadcast") as broadcast:
+            response = self.client.delete(f'/api/delete_task/{task.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        broadcast.assert_called_once_with(session.roomCode, {"type": "remove_task", "task_id": task.pk})
+
+    def test_failed_delete_publishes_nothing(self):
+        """A delete that fails isn't announced to the room"""
+        session = StudySession.objects.create(createdBy=self.user, sessionName="Delete Room")
+        task = toDoList.objects.create(list=session.toDoList, title="Shared task")
+
+        with mock.patch.object(toDoList, "delete", side_effect=RuntimeError("disk full")), \
+                mock.patch("api.views.to_do_list.broadcast") as broadcast, \
+                self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(f'/api/delete_task/{task.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        broadcast.assert_not_called()
+        self.assertEqual(callbacks, [])
+        self.assertTrue(toDoList.objects.filter(pk=task.pk).exists())
+
 
     def test_delete_list_success(self):
         """ Make an authenticated DELETE request to delete a list"""
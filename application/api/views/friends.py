@@ -1,4 +1,7 @@
 from api.models import Friends, Status, User
+from api.services.user_search import MAX_LIMIT
+from api.views.pagination import PaginationError, error_response, page_params, paginated_response
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -14,15 +17,15 @@ class FriendsView(APIView):
         url_name = request.resolver_match.view_name
         user = request.user
 
-        friends = []
+        friends = Friends.objects.none()
         if url_name == "friends":
             friends = Friends.get_friends_with_status(user, Status.ACCEPTED)
         
         elif url_name == "pending_friends":
-            friends = Friends.get_invitations_received(user)
+            friends = Friends.pending_invitations(user, sent=False)
 
         elif url_name == "friends_requested":
-            friends = Friends.get_invitations_sent(user)
+            friends = Friends.pending_invitations(user, sent=True)
         
         elif url_name == "friends_profile":
             friend = Friends.get_friend(id, user)
@@ -42,38 +45,37 @@ class FriendsView(APIView):
 
         elif url_name == "find_friend":
             search_query = request.GET.get('q', '')
-
-            users = User.find_user(search_query)
-
-            response_data = []
-            for user in users:
-                response_data.append({
-                    "id": user.id,
-                    "name": user.firstname,
-                    "surname": user.lastname,
-                    "username": user.username
+            try:
+                page_size, after = page_params(request, settings.USER_SEARCH_LIMIT, MAX_LIMIT, cursor_length=2)
+            except PaginationError as e:
+                return error_response(e)
+
+            # Ranked and paged through the search index, without the user and their friends
+            users = User.find_user(search_query, user=user, limit=page_size + 1, after=after)
+
+            return paginated_response(
+                request, users, page_size,
+                cursor_of=lambda found: (found.rank, found.pk),
+                serialize=lambda found: {
+                    "id": found.id,
+                    "name": found.firstname,
+                    "surname": found.lastname,
+                    "username": found.username
                 })
-            return Response(response_data, status=status.HTTP_200_OK)
 
         return self.get_friends(request, friends)
 
     def get_friends(self, request, data):
-
-        user = request.user
-        friends = [(friend.pk, friend.user2) if friend.user1 == user else 
-                    (friend.pk, friend.user1) 
-                   for friend in data]
-
-
-        response_data = []
-        for friend in friends:
-            response_data.append({
-                    "id": friend[0],
-                    "name": friend[1].firstname,
-                    "surname": friend[1].lastname,
-                    "username": friend[1].username
-            })
-        return Response(response_data, status=status.HTTP_200_OK)
+        try:
+            page_size, after = page_params(request, settings.FRIENDS_PAGE_SIZE, settings.FRIENDS_MAX_PAGE_SIZE)
+        except PaginationError as e:
+            return error_response(e)
+
+        # One query joined to the user table per page, keyset on the friendship id
+        if after is not None:
+            data = data.filter(pk__gt=after[0])
+        rows = Friends.friend_values(data, request.user)[:page_size + 1]
+        return paginated_response(request, rows, page_size, cursor_of=lambda row: (row["id"],))
 
     def patch(self, request, id):
         url_name = request.resolver_match.view_name
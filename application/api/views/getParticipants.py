@@ -5,6 +5,8 @@ from rest_framework.permissions import IsAuthenticated
 
 from ..models import SessionUser
 from ..models.study_session import StudySession
+from ..realtime.roster import roster_cache
+from ..services.room_lookup import room_lookup
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -18,12 +20,13 @@ def get_participants(request):
     print("Retrieving participants for the study room", room_code)
 
     try:
-        # get the room
-        study_session = StudySession.objects.get(roomCode=room_code)
-        participants = study_session.participants.all()
+        # get the room, the participants come from the roster cache
+        room = room_lookup.by_code(room_code)
+        if room is None:
+            raise StudySession.DoesNotExist("StudySession matching query does not exist.")
         participants_list = [{
-            'username': participant.username,
-        } for participant in participants]
+            'username': username,
+        } for username in roster_cache.load(room.room_code)]
 
 
         return Response({"participantsList" : participants_list})
@@ -1,17 +1,13 @@
-from asgiref.sync import async_to_sync
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
-from ..models import SessionUser, User, toDoList
+from ..models import User, toDoList
 from ..models.study_session import StudySession
 
-from .to_do_list import ViewToDoList
-
-# for websockets
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from ..services import room_membership
+from ..services.room_lookup import room_lookup
 
 # These are APIs related to the group study room!
 # create_room will send create a study session, use the room_id as the room code, and created_by user
@@ -40,49 +36,14 @@ def create_room(request):
     # use as default session name for now, later take as input field for user to type in
     #session_name = "Untitled Study Session"
 
-     # if the user is already in another room they have to 'leave' that room first
-    if SessionUser.objects.filter(user=user).exists():
-        print("Deleting user from old session")
-        session_users = SessionUser.objects.filter(user=user)
-        for session_user in session_users:
-            previous_session = session_user.session
-            user = session_user.user
-            previous_session.participants.remove(user)
-            session_user.delete()
-            print(" user removed from old session")
-            
     try:
-
-        print("Room start")
-        room = StudySession.objects.create(
-                createdBy = user,
-                sessionName = session_name
-        )
-
-        print("Room ", room)
-
-        # is using the study session auto generated ID as the room code
-        # Add the user to the participants field
-        room.participants.add(user)
-
-        print("Room ", room)
-        room.save()
-
-        print("Room ", room)
-        if SessionUser.objects.filter(user=user, session=room).exists():
-            print("User is already in the session. Updating join sequence.")
-            session_user = SessionUser.objects.filter(user=user, session=room).first()
-            session_user.rejoin_session(user, room)
-        else:
-            print("Creating new SessionUser instance.")
-            session_user = SessionUser.objects.create(
-                user=user,
-                session=room,
-            )
+        # Leaving the user's other rooms, creating this one and joining it happen in one
+        # transaction (see api/services/room_membership.py)
+        room = room_membership.create_room(user, session_name)
 
         print("User", user, "has successfully made the room:", session_name, "with code:", room.roomCode)
         return Response({"roomCode" : room.roomCode,
-                        "roomList": room.toDoList.id
+                        "roomList": room.toDoList_id
         })
         # returns the room ID as the room code
     except Exception as e:
@@ -108,46 +69,14 @@ def join_room(request):
           request.data.get("roomCode"))
     # takes the room code
 
-    # if the user is already in another room they have to 'leave' that room first
-    if SessionUser.objects.filter(user=user).exists():
-        print("Deleting user from old session")
-        session_users = SessionUser.objects.filter(user=user)
-        for session_user in session_users:
-            previous_session = session_user.session
-            user = session_user.user
-            previous_session.participants.remove(user)
-            session_user.delete()
-            print(" user removed from old session")
-
     room_code = request.data.get('roomCode')
-    if StudySession.objects.filter(roomCode=room_code).exists():
-        # Fetch the study session using the room code
-        study_session = StudySession.objects.get(roomCode=room_code)
-
-        # Add the user to the participants field
-        study_session.participants.add(user)
-        study_session.save()
-
-        # Notify all clients in the room
-        participants = study_session.participants.all()
-        notify_participants(room_code, participants)
-
-        print(f"Notifying participants in room {room_code}: {participants}")
-
-        # create an instance of session user
-        if SessionUser.objects.filter(user=user, session=study_session).exists():
-            print("User is already in the session. Updating join sequence.")
-            session_user = SessionUser.objects.filter(
-                user=user, session=study_session).first()
-            session_user.rejoin_session(user, study_session)
-        else:
-            print("Creating new SessionUser instance.")
-            session_user = SessionUser.objects.create(
-                user=user,
-                session=study_session,
-            )
-        return Response({"message": "Joined successfully!"})
-    return Response({"error": "Room not found"}, status=404)
+    try:
+        # Leaving the user's other rooms and joining this one happen in one transaction, the
+        # room is notified with a participant_joined delta (see api/services/room_membership.py)
+        room_membership.join_room(user, room_code)
+    except room_membership.RoomNotFound:
+        return Response({"error": "Room not found"}, status=404)
+    return Response({"message": "Joined successfully!"})
 
 
 @api_view(['GET'])
@@ -163,11 +92,13 @@ def get_room_details(request):
 
     try:
         # get the room and get the name of the room
-        study_session = StudySession.objects.get(roomCode=room_code)
-        session_name = study_session.sessionName
+        room = room_lookup.by_code(room_code)
+        if room is None:
+            raise StudySession.DoesNotExist("StudySession matching query does not exist.")
+        session_name = room.session_name
         print("Retrieved the room name", session_name)
         return Response({"sessionName" : session_name,
-                         "roomList": study_session.toDoList.id
+                         "roomList": room.list_id
         })
         # returns the room name
     except Exception as e:
@@ -193,61 +124,11 @@ def leave_room(request):
     # takes the room code
 
     room_code = request.data.get('roomCode')
-    if StudySession.objects.filter(roomCode=room_code).exists():
-        print("room found")
-        # Fetch the study session using the room code
-        study_session = StudySession.objects.get(roomCode=room_code)
-
-        # Remove the user from the participants field
-        study_session.participants.remove(user)
-        study_session.save()
-
-        # Fetch the updated participants list
-        participants = study_session.participants.all()
-
-        # Notify all clients in the room
-        notify_participants(room_code, participants)
-
-        print(f"Notifying participants in room {room_code}: {participants}")
-
-        try:
-            session_user = SessionUser.objects.get(user=user, session=study_session)
-            session_user.leave_session()
-
-            if (study_session.participants.count() == 0):
-                destroy_room(request, study_session)
-
-            user1 = session_user.user
-            return Response({"message": "Left successfully!", "username": user.username})
-        except SessionUser.DoesNotExist:
-            return Response({"error": "User is not in the session"}, status=404)
+    try:
+        # The room is locked while the user leaves it, and deleted in the same transaction if
+        # they were the last one in it (see api/services/room_membership.py). Leaving twice
+        # is fine, the second time just changes nothing
+        room_membership.leave_room(user, room_code)
+    except room_membership.RoomNotFound:
         return Response({"error": "Room not found"}, status=404)
-
-# update the participants in real time as someone joins the room, and leaves the room
-def notify_participants(room_code, participants):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"room_{room_code}",
-        {
-            'type': 'participants_update',
-            'participants': [participant.username for participant in participants],
-        }
-    )
-
-# destroy the room if there are no participants in it
-def destroy_room(request, study_session):
-
-    toDo = ViewToDoList()
-
-    # delete the to do list in the room
-    toDoList = study_session.toDoList.pk
-    if toDoList:
-        toDo.delete_list(request = request, list_id = toDoList)
-    print("to do list deleted")
-    print("session name: ", study_session.sessionName)
-    study_session.delete()
-    print("session deleted")
-
-
-
-
+    return Response({"message": "Left successfully!", "username": user.username})
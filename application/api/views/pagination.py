@@ -0,0 +1,74 @@
+import base64
+
+from rest_framework import status
+from rest_framework.response import Response
+
+'''
+Keyset (cursor) pagination for list endpoints that return a plain JSON list.
+
+A page holds at most page_size rows (?page_size=, bounded by the view's maximum). When there
+are more, the response has a Link header to the next page:
+
+    Link: <http://.../api/get_friends/?cursor=MTI&page_size=50>; rel="next"
+
+The cursor is the sort key of the last row sent (its id, or its rank and id for searches),
+encoded so clients treat it as opaque. The next page is read with WHERE key > cursor, so
+every page costs the same however deep it is, and rows added meanwhile don't shift it.
+'''
+
+
+class PaginationError(ValueError):
+    """The page_size or cursor of the request is invalid."""
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(",".join(map(str, values)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length=1):
+    """The integers encoded in a cursor (a tuple of length of them), or None if there is none."""
+    if not cursor:
+        return None
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        values = tuple(int(value) for value in text.split(","))
+    except (ValueError, UnicodeDecodeError):
+        raise PaginationError("Invalid cursor")
+    if len(values) != length:
+        raise PaginationError("Invalid cursor")
+    return values
+
+
+def page_params(request, default_size, max_size, cursor_length=1):
+    """Return (page_size, cursor values or None) from the query string."""
+    try:
+        page_size = int(request.GET.get("page_size") or default_size)
+    except ValueError:
+        raise PaginationError("page_size must be a number")
+    if page_size < 1:
+        raise PaginationError("page_size must be positive")
+    return min(page_size, max_size), decode_cursor(request.GET.get("cursor"), cursor_length)
+
+
+def paginated_response(request, rows, page_size, cursor_of, serialize=None):
+    """
+    Respond with a page of rows, with a next Link if there are more.
+
+    :param rows: up to page_size + 1 rows, the extra one only tells there is a next page
+    :param cursor_of: row -> tuple of the values the next page starts after
+    :param serialize: row -> what is sent for it, the row itself by default
+    """
+    rows = list(rows)
+    page = rows[:page_size]
+    response = Response([serialize(row) for row in page] if serialize else page, status=status.HTTP_200_OK)
+    if len(rows) > page_size:
+        query = request.GET.copy()
+        query["cursor"] = encode_cursor(*cursor_of(rows[page_size - 1]))
+        query["page_size"] = page_size
+        url = request.build_absolute_uri(request.path + "?" + query.urlencode())
+        response["Link"] = f'<{url}>; rel="next"'
+    return response
+
+
+def error_response(error):
+    return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
@@ -1,4 +1,5 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
 from api.models import List, toDoList, Permission
 from rest_framework.decorators import api_view
 from rest_framework.views import APIView
@@ -6,10 +7,13 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.views import View
 from rest_framework.permissions import IsAuthenticated
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 
-from api.models import StudySession
+from api.realtime.broadcast import broadcast
+from api.services.list_deletion import delete_list
+from api.services.room_lookup import room_lookup
+from api.services.task_batch import TaskBatchError, apply_task_operations
+from api.services.todo_changes import changes_since
+from api.services.todo_loader import group_list, readable_lists, user_lists
 
 class ViewToDoList(APIView):
 
@@ -21,42 +25,34 @@ class ViewToDoList(APIView):
         url_name = request.resolver_match.view_name
 
         print(url_name)
+        if url_name == "to_do_list_changes":
+            return self.list_changes(request)
+        # Lists and their tasks are loaded in two queries (see api/services/todo_loader.py)
         if url_name == "group_to_do_list":
-            user_lists = List.objects.filter(pk=id)
-            print(user_lists)
+            response_data = group_list(id)
         else:
-    
-            user_permissions = Permission.objects.filter(user_id=user)
-            user_lists = List.objects.filter(
-                id__in=user_permissions.values_list('list_id', flat=True),
-                is_shared=False
-                )
-
-        
-        response_data = []
-        for todo_list in user_lists:
-            # Fetch related tasks manually
-            tasks = toDoList.objects.filter(list=todo_list)
-
-
-            response_data.append({
-                "id": todo_list.pk,
-                "name": todo_list.name,
-                "is_shared": todo_list.is_shared,
-                "tasks": [
-                    {
-                        "id": task.pk,
-                        "title": task.title,
-                        "content": task.content,
-                        "is_completed": task.is_completed,
-                        "creation_date": task.creation_date
-                    }
-                    for task in tasks
-                ]
-            })
+            response_data = user_lists(user)
 
         return Response(response_data, status=status.HTTP_200_OK)
 
+    def list_changes(self, request):
+        # Only the tasks changed since the client's revision, see api/services/todo_changes.py
+        try:
+            list_id = int(request.query_params["list_id"])
+            since = int(request.query_params.get("since", 0))
+        except (KeyError, ValueError):
+            return Response({"error": "list_id and since must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0:
+            return Response({"error": "since can't be negative"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Strangers get the same 404 as for a list that doesn't exist
+        if not readable_lists(request.user).filter(pk=list_id).exists():
+            return Response({"error": "List not found"}, status=status.HTTP_404_NOT_FOUND)
+        changes = changes_since(list_id, since)
+        if changes is None:
+            return Response({"error": "List not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(changes, status=status.HTTP_200_OK)
+
     def post(self, request):
         # Define the action type in request body
 
@@ -66,6 +62,8 @@ class ViewToDoList(APIView):
             return self.create_task(request)
         elif url_name == "create_new_list":
             return self.create_list(request)
+        elif url_name == "tasks_batch":
+            return self.tasks_batch(request)
         return Response({"error": "Invalid action"}, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, id = None):
@@ -79,34 +77,35 @@ class ViewToDoList(APIView):
 
     def delete_task(self, request, task_id):
         try:
-
-            if toDoList.objects.filter(pk=task_id).exists():
-                task = toDoList.objects.get(id=task_id)
-
-                # Send WebSocket update
+            # The event is only queued once the task is gone and only sent if the transaction
+            # commits, so clients never hear about a delete that failed
+            with transaction.atomic():
+                task = toDoList.objects.select_related("list").filter(pk=task_id).first()
+                if task is None:
+                    return Response({"error": "Task doesn't exist"}, status=status.HTTP_400_BAD_REQUEST)
+
+                room_code = None
                 if task.list.is_shared:
 
-                    try:
-                        study_session = StudySession.objects.get(toDoList=task.list)  # ✅ Fix: Use correct variable
-                        room_code = study_session.roomCode  # Get the correct room code
-                    except StudySession.DoesNotExist:
+                    room = room_lookup.by_list(task.list_id)  # cached, see api/services/room_lookup.py
+                    if room is None:
                         return Response({"error": "No study session found for this list"}, status=status.HTTP_400_BAD_REQUEST)
+                    room_code = room.room_code  # Get the correct room code
 
-                    channel_layer = get_channel_layer()
-                    async_to_sync(channel_layer.group_send)(
-                        f"room_{room_code}",
+                task.delete()
+
+                # Send WebSocket update
+                if room_code is not None:
+                    broadcast(
+                        room_code,
                         {
                             "type": "remove_task",
                             "task_id": task_id,
                         }
                     )
 
-                toDoList.objects.get(pk=task_id).delete()
+            return Response({"data": task_id}, status=status.HTTP_200_OK)
 
-                return Response({"data": task_id}, status=status.HTTP_200_OK)
-            else:
-                return Response({"error": "Task doesn't exist"}, status=status.HTTP_400_BAD_REQUEST)
-                
         except Exception as e:
             return Response({"error": "Invalid request", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -114,13 +113,12 @@ class ViewToDoList(APIView):
         print("Deleting ..")
         try:
 
-            if List.objects.filter(pk=list_id).exists():
-                toDoList.objects.filter(list=list_id).delete()
-                Permission.objects.filter(list_id = list_id).delete()
-                List.objects.get(pk=list_id).delete()
-
-
-                return self.get(request)
+            # Tasks, permissions and any room using the list go with it, in one transaction
+            if delete_list(list_id):
+                # Only the deleted id, unless the client asks for all of its lists back
+                if request.query_params.get("full_state") in ("1", "true"):
+                    return self.get(request)
+                return Response({"listId": int(list_id)}, status=status.HTTP_200_OK)
             else:
                 return Response({"error": "Task doesn't exist"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -141,21 +139,18 @@ class ViewToDoList(APIView):
                 task = toDoList.objects.create(
                     title=title, content=content, list=list_obj
                 )
-                task.save()
 
                 # Send WebSocket update if the list is shared
                 if task.list.is_shared:
                     
-                    try:
-                        study_session = StudySession.objects.get(toDoList=list_obj)  
-                        room_code = study_session.roomCode  # Get the correct room code
-                    except StudySession.DoesNotExist:
+                    room = room_lookup.by_list(list_obj.pk)  # cached, see api/services/room_lookup.py
+                    if room is None:
                         return Response({"error": "No study session found for this list"}, status=status.HTTP_400_BAD_REQUEST)
+                    room_code = room.room_code  # Get the correct room code
 
                     # Now send WebSocket message using room_code
-                    channel_layer = get_channel_layer() 
-                    async_to_sync(channel_layer.group_send)(
-                        f"room_{room_code}",
+                    broadcast(
+                        room_code,
                         {
                             "type": "add_task",
                             "task": {
@@ -207,36 +202,56 @@ class ViewToDoList(APIView):
             return Response({"error": "Invalid request", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+    def tasks_batch(self, request):
+        # Several create/toggle/delete operations on one list, see api/services/task_batch.py
+        try:
+            data = request.data
+            todo_list, results, event = apply_task_operations(data.get("list_id"), data.get("operations"))
+
+            # One tasks_batch event for the whole batch instead of one per task
+            if todo_list["is_shared"]:
+                room = room_lookup.by_list(todo_list["id"])  # cached, see api/services/room_lookup.py
+                if room is not None:
+                    broadcast(room.room_code, event)
+
+            return Response({"listId": todo_list["id"], "results": results}, status=status.HTTP_200_OK)
+
+        except TaskBatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            return Response({"error": "Invalid request", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     def patch(self, request, task_id):
         print(f"Received PATCH request for task_id: {task_id}")
 
         try:
-        # This line throws DoesNotExist if not found
-            task = toDoList.objects.get(pk=task_id)
-            new_task_status = not task.is_completed
-            task.is_completed = new_task_status
-            task.save()
+            # Flip the status with a single UPDATE, then read back what the room needs
+            toggled = toDoList.objects.filter(pk=task_id).toggle_completed(
+                "is_completed", "list_id", "list__is_shared", "revision")
+            if not toggled:
+                raise toDoList.DoesNotExist
+            task = toggled[0]
 
             # Send WebSocket update
-            if task.list.is_shared:
+            if task["list__is_shared"]:
 
-                try:
-                    study_session = StudySession.objects.get(toDoList=task.list)  # ✅ Fix: Use correct variable
-                    room_code = study_session.roomCode  # Get the correct room code
-                except StudySession.DoesNotExist:
+                room = room_lookup.by_list(task["list_id"])  # cached, see api/services/room_lookup.py
+                if room is None:
                     return Response({"error": "No study session found for this list"}, status=status.HTTP_400_BAD_REQUEST)
+                room_code = room.room_code  # Get the correct room code
 
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    f"room_{room_code}",
+                broadcast(
+                    room_code,
                     {
                         "type": "toggle_task",
                         "task_id": task_id,
-                        "is_completed": task.is_completed,
+                        "is_completed": task["is_completed"],
+                        "revision": task["revision"],
                     }
                 )
 
-            return Response({"is_completed": task.is_completed}, status=status.HTTP_200_OK)
+            return Response({"is_completed": task["is_completed"]}, status=status.HTTP_200_OK)
 
         except toDoList.DoesNotExist:  # Catch the specific exception
             return Response({"error": "Task not found"}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,103 @@
+import os
+
+'''
+Builds the CHANNEL_LAYERS setting from environment variables.
+
+With the in-memory layer a group_send from a REST view only reaches sockets in the same
+process, so anything running more than one ASGI worker needs the Redis layer:
+
+    CHANNEL_LAYER             memory (default), redis, or local-redis (the in-process stand-in
+                              in api.realtime.layers, for development and tests)
+    CHANNEL_REDIS_HOSTS       comma separated Redis URLs, falls back to REDIS_URL. With several
+                              hosts channels_redis shards channels and groups across them
+    CHANNEL_PREFIX            key prefix, to share one Redis between deployments
+    CHANNEL_EXPIRY            seconds an undelivered message is kept (default 60)
+    CHANNEL_GROUP_EXPIRY      seconds a group membership is kept, must outlast the longest
+                              study session since consumers never renew it (default 86400)
+    CHANNEL_CAPACITY          messages buffered per channel before ChannelFull (default 100)
+    CHANNEL_CAPACITY_OVERRIDES  per channel name pattern capacities, e.g. "http.request=200,
+                              websocket.send*=20"
+
+With CHANNEL_LAYER=redis, caches_from_env also adds a Redis backed "shared" cache, on
+CACHE_REDIS_URL or else the first channel layer host, and backend/settings.py moves the state
+the workers must agree on to Redis: the room rosters and presence go in that cache and the
+friend graph uses the same Redis unless FRIEND_GRAPH_REDIS_URL says otherwise. Typing batches
+are per worker and merged by the clients. Each worker still keeps its own room_lookup cache
+(api/services/room_lookup.py), so a room renamed or deleted through another worker can be
+looked up as it was for up to ROOM_LOOKUP_TTL seconds, and its own room code block and
+room_activity keep-alive, which need no sharing.
+'''
+
+LAYER_BACKENDS = {
+    "memory": "channels.layers.InMemoryChannelLayer",
+    "local-redis": "api.realtime.layers.LocalRedisChannelLayer",
+    "redis": "channels_redis.core.RedisChannelLayer",
+}
+
+DEFAULT_REDIS_URL = "redis://127.0.0.1:6379"
+
+SHARED_CACHE_ALIAS = "shared"
+
+
+def _split(value):
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+def _capacity_overrides(value):
+    overrides = {}
+    for pair in _split(value):
+        pattern, _, capacity = pair.rpartition("=")
+        if not pattern:
+            raise ValueError(f"CHANNEL_CAPACITY_OVERRIDES entry {pair!r} should be pattern=capacity")
+        overrides[pattern.strip()] = int(capacity)
+    return overrides
+
+
+def redis_hosts(environ=None):
+    environ = os.environ if environ is None else environ
+    hosts = _split(environ.get("CHANNEL_REDIS_HOSTS", ""))
+    return hosts or [environ.get("REDIS_URL", DEFAULT_REDIS_URL)]
+
+
+def channel_layers_from_env(environ=None):
+    """Return a CHANNEL_LAYERS dict for the environment (os.environ by default)."""
+    environ = os.environ if environ is None else environ
+    layer = environ.get("CHANNEL_LAYER", "memory")
+    if layer not in LAYER_BACKENDS:
+        raise ValueError(f"CHANNEL_LAYER must be one of {', '.join(LAYER_BACKENDS)}, not {layer!r}")
+
+    config = {
+        "expiry": int(environ.get("CHANNEL_EXPIRY", 60)),
+        "group_expiry": int(environ.get("CHANNEL_GROUP_EXPIRY", 86400)),
+        "capacity": int(environ.get("CHANNEL_CAPACITY", 100)),
+    }
+    overrides = _capacity_overrides(environ.get("CHANNEL_CAPACITY_OVERRIDES", ""))
+    if overrides:
+        config["channel_capacity"] = overrides
+    if layer != "memory":
+        config["hosts"] = redis_hosts(environ)
+        config["prefix"] = environ.get("CHANNEL_PREFIX", "asgi")
+
+    return {"default": {"BACKEND": LAYER_BACKENDS[layer], "CONFIG": config}}
+
+
+def shared_redis_url(environ=None):
+    """The Redis URL for state shared by the workers, or None unless CHANNEL_LAYER=redis."""
+    environ = os.environ if environ is None else environ
+    if environ.get("CHANNEL_LAYER", "memory") != "redis":
+        return None
+    return environ.get("CACHE_REDIS_URL") or redis_hosts(environ)[0]
+
+
+def caches_from_env(environ=None):
+    """Return a CACHES dict: in-process by default, plus the "shared" Redis cache with CHANNEL_LAYER=redis."""
+    environ = os.environ if environ is None else environ
+    caches = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    url = shared_redis_url(environ)
+    if url:
+        caches[SHARED_CACHE_ALIAS] = {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": url,
+            "KEY_PREFIX": environ.get("CHANNEL_PREFIX", "asgi"),
+        }
+    return caches
@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from .channel_layers import SHARED_CACHE_ALIAS, caches_from_env, channel_layers_from_env, shared_redis_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -83,11 +85,73 @@ REST_FRAMEWORK = {
 }
 
 ASGI_APPLICATION = "backend.asgi.application"
-CHANNEL_LAYERS = {
-        "default": {
-            "BACKEND": "channels.layers.InMemoryChannelLayer", # when we deploy change to redis?
-        }
-}
+# In-memory by default, set CHANNEL_LAYER=redis and CHANNEL_REDIS_HOSTS (or REDIS_URL) to run
+# several ASGI workers, see backend/channel_layers.py for the other variables
+CHANNEL_LAYERS = channel_layers_from_env()
+# In-process, plus a Redis cache shared by the workers with CHANNEL_LAYER=redis
+CACHES = caches_from_env()
+
+# Room rosters are kept in the shared cache when there is one, so every worker serves the same
+# roster and version; shared entries expire after ROSTER_CACHE_TTL seconds without a change
+ROSTER_CACHE_ALIAS = SHARED_CACHE_ALIAS if SHARED_CACHE_ALIAS in CACHES else None
+ROSTER_CACHE_TTL = 24 * 60 * 60
+
+# Typing indicators are sent to a room at most once per interval (seconds) and a
+# sender stops being shown as typing this long after their last keystroke
+TYPING_BATCH_INTERVAL = 0.3
+TYPING_EXPIRY = 3.0
+
+# Seconds after its last heartbeat message a room socket is taken as dead (api/realtime/presence.py)
+PRESENCE_TTL = 30.0
+# Which sockets are in which room is shared by the workers the same way as the rosters
+PRESENCE_CACHE_ALIAS = ROSTER_CACHE_ALIAS
+PRESENCE_CACHE_TTL = 24 * 60 * 60
+
+# Upper bounds for clients that opt in to batched WebSocket frames
+WS_BATCH_MAX_SIZE = 50
+WS_BATCH_MAX_DELAY_MS = 10
+
+# JSON encoder for WebSocket frames: "auto" uses orjson when it is installed
+WS_JSON_ENCODER = "auto"
+# Offer MessagePack binary frames to clients asking for the "msgpack" subprotocol
+WS_MSGPACK_ENABLED = True
+
+# Most events for one room sent in a single channel layer message by the REST publisher
+WS_PUBLISH_BATCH_SIZE = 100
+
+# Deleted task tombstones kept per to-do list, in revisions, for api/todolists/changes/ (older
+# clients refetch the whole list)
+TASK_TOMBSTONE_REVISIONS = 1000
+
+# Room code <-> session <-> to-do list lookups kept in memory (rooms, seconds), each worker has its
+# own so a room renamed or deleted through another worker can be seen for up to ROOM_LOOKUP_TTL
+ROOM_LOOKUP_MAX_SIZE = 1024
+ROOM_LOOKUP_TTL = 300
+
+# Accepted friendships cached per user (users, seconds), in Redis when the URL is set, which it is
+# by default with CHANNEL_LAYER=redis
+FRIEND_GRAPH_MAX_SIZE = 10000
+FRIEND_GRAPH_TTL = 600
+FRIEND_GRAPH_REDIS_URL = os.environ.get("FRIEND_GRAPH_REDIS_URL") or shared_redis_url()
+
+# Study rooms with open sockets are marked active every ROOM_ACTIVITY_INTERVAL seconds; rooms
+# inactive for ROOM_REAPER_GRACE seconds are deleted ROOM_REAPER_BATCH_SIZE per transaction,
+# by the reap_rooms command or, with ROOM_REAPER_INTERVAL set, every that many seconds in the
+# ASGI process (see api/services/room_reaper.py)
+ROOM_ACTIVITY_INTERVAL = 60
+ROOM_REAPER_GRACE = 15 * 60
+ROOM_REAPER_BATCH_SIZE = 100
+ROOM_REAPER_INTERVAL = None
+
+# Room codes a process reserves at a time, see api/services/room_codes.py
+ROOM_CODE_BLOCK_SIZE = 1000
+
+# Users returned per find-friend search page by default (at most 50)
+USER_SEARCH_LIMIT = 20
+
+# Friends and friend requests per page, see api/views/pagination.py
+FRIENDS_PAGE_SIZE = 100
+FRIENDS_MAX_PAGE_SIZE = 500
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -148,6 +212,11 @@ CORS_ALLOW_METHODS = [
     'OPTIONS',
 ]
 
+# Paginated lists link to their next page in this header (api/views/pagination.py)
+CORS_EXPOSE_HEADERS = [
+    'link',
+]
+
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 
@@ -158,6 +227,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transactions take the write lock when they begin, so two requests changing a
+            # room can't both read it and then deadlock upgrading to write; a blocked one
+            # waits up to timeout seconds. WAL lets reads go on while one of them writes.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
     }
 }
 
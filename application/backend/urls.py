@@ -54,12 +54,14 @@ urlpatterns = [
 
 
     path('api/todolists/', views.ViewToDoList.as_view(), name='to_do_list'),
+    path('api/todolists/changes/', views.ViewToDoList.as_view(), name='to_do_list_changes'),
     path('api/todolists/<int:id>/', views.ViewToDoList.as_view(), name='group_to_do_list'),
 
 
     path('api/update_task/<int:task_id>/', views.ViewToDoList.as_view(), name='update_task_status'),
     path('api/new_task/', views.ViewToDoList.as_view(), name='create_new_task'),
     path('api/delete_task/<int:id>/', views.ViewToDoList.as_view(), name='delete_task'),
+    path('api/tasks_batch/', views.ViewToDoList.as_view(), name='tasks_batch'),
 
     path('api/new_list/', views.ViewToDoList.as_view(), name='create_new_list'),
     path('api/delete_list/<int:id>/', views.ViewToDoList.as_view(), name='delete_list'),
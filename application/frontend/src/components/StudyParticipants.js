@@ -37,10 +37,31 @@ const StudyParticipants = () => {
   const setupWebSocket = (roomCode) =>{
    const socket = new WebSocket(`ws://localhost:8000/ws/room/${roomCode}/`);
 
+    // Version of the participants list we last applied
+    let rosterVersion = null;
+
     socket.onmessage = (event) => {
       const data = JSON.parse(event.data);
-      if (data.type === "participants_update") {
-        setParticipants(data.participants);
+      if (data.type === "roster_sync") {
+        rosterVersion = data.version;
+        setParticipants(data.participants.map((username) => ({ username })));
+      } else if (
+        data.type === "participant_joined" ||
+        data.type === "participant_left"
+      ) {
+        if (rosterVersion !== null && data.version <= rosterVersion) return;
+        if (rosterVersion === null || data.version !== rosterVersion + 1) {
+          // We missed an update, ask the server for the full list
+          socket.send(JSON.stringify({ type: "roster_sync" }));
+          return;
+        }
+        rosterVersion = data.version;
+        setParticipants((prev) => {
+          const others = prev.filter((p) => !data.usernames.includes(p.username));
+          return data.type === "participant_left"
+            ? others
+            : [...others, ...data.usernames.map((username) => ({ username }))];
+        });
       }
     };
 
@@ -16,7 +16,7 @@ const ToDoList = ({ isShared, listId = undefined, socket, roomCode = undefined }
     const [expandedTasks, setExpandedTasks] = useState({});
 
     // WebSocket Hook
-    useWebSocket(isShared, socket, listId, setLists, roomCode);
+    useWebSocket(isShared, socket, listId, setLists, roomCode, lists);
 
     const toggleTaskCompletion = async (taskId) => {
         try {
@@ -74,7 +74,7 @@ const ToDoList = ({ isShared, listId = undefined, socket, roomCode = undefined }
     const handleDeleteList = async (listId) => {
         try {
             const data = await getAuthenticatedRequest(`/delete_list/${listId}/`, "DELETE");
-            setLists(data);
+            setLists(prevLists => prevLists.filter(list => list.id !== data.listId));
         } catch (error) {
             console.error("Error fetching to-do lists:", error);
         } 
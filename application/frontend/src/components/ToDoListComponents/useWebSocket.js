@@ -1,16 +1,61 @@
-import { useEffect } from 'react';
+import { useEffect, useRef } from 'react';
+import { getAuthenticatedRequest } from "../../utils/authService";
+
+// Apply the response of /todolists/changes/ to a list
+const applyChanges = (list, changes) => {
+    if (changes.reset) {
+        return { ...list, tasks: changes.created, revision: changes.revision };
+    }
+    const deleted = new Set(changes.deleted);
+    const changed = new Map([...changes.created, ...changes.updated].map(task => [task.id, task]));
+    const tasks = list.tasks.filter(task => !deleted.has(task.id) && !changed.has(task.id));
+    return {
+        ...list,
+        tasks: [...tasks, ...changed.values()].sort((a, b) => a.id - b.id),
+        revision: Math.max(list.revision || 0, changes.revision),
+    };
+};
+
+const useWebSocket = (isShared, socket, listId, setLists, roomCode, lists = []) => {
+    // Revision of the list we have, to only fetch what changed after a reconnect
+    const revision = useRef(0);
+    const list = lists.find(l => l.id === listId);
+    revision.current = list ? list.revision || 0 : 0;
 
-const useWebSocket = (isShared, socket, listId, setLists, roomCode) => {
     useEffect(() => {
         if (!isShared) return;
 
-        const wsSocket = new WebSocket(`ws://localhost:8000/ws/todolist/${roomCode}/`);
+        let wsSocket;
+        let reconnectTimer;
+        let closed = false;
 
-        wsSocket.onopen = () => {
-            console.log("WebSocket connected");
+        const resync = async () => {
+            try {
+                const changes = await getAuthenticatedRequest(
+                    `/todolists/changes/?list_id=${listId}&since=${revision.current}`);
+                setLists(prevLists => prevLists.map(l => l.id === listId ? applyChanges(l, changes) : l));
+            } catch (error) {
+                console.error("Error fetching to-do list changes:", error);
+            }
         };
 
-        wsSocket.onmessage = (event) => {
+        const connect = (reconnecting) => {
+            wsSocket = new WebSocket(`ws://localhost:8000/ws/todolist/${roomCode}/`);
+
+            wsSocket.onopen = () => {
+                console.log("WebSocket connected");
+                // Events sent while we were disconnected are lost, catch up on them
+                if (reconnecting) resync();
+            };
+
+            wsSocket.onclose = () => {
+                if (!closed) reconnectTimer = setTimeout(() => connect(true), 1000);
+            };
+
+            wsSocket.onmessage = onMessage;
+        };
+
+        const onMessage = (event) => {
             const data = JSON.parse(event.data);
 
             setLists(prevLists => {
@@ -33,6 +78,16 @@ const useWebSocket = (isShared, socket, listId, setLists, roomCode) => {
                         };
                     }
 
+                    if (data.type === "tasks_batch") {
+                        const deleted = new Set(data.deleted);
+                        const toggled = new Map(data.toggled.map(t => [t.task_id, t.is_completed]));
+                        const tasks = list.tasks
+                            .filter(task => !deleted.has(task.id))
+                            .map(task => toggled.has(task.id) ? { ...task, is_completed: toggled.get(task.id) } : task);
+                        const created = data.created.filter(c => !tasks.some(task => task.id === c.id));
+                        return { ...list, tasks: [...tasks, ...created] };
+                    }
+
                     if (data.type === "add_task") {
                         if (!list.tasks.some(task => task.id === data.task.id)) {
                             return {
@@ -47,7 +102,11 @@ const useWebSocket = (isShared, socket, listId, setLists, roomCode) => {
             });
         };
 
+        connect(false);
+
         return () => {
+            closed = true;
+            clearTimeout(reconnectTimer);
             wsSocket.close();
         };
     }, [isShared, roomCode, listId, setLists]);
@@ -7,6 +7,7 @@ import { getDownloadURL } from 'firebase/storage';
 // Mock API responses for the data we want to fetch
 jest.mock('../../../utils/authService', () => ({
     getAuthenticatedRequest: jest.fn(),
+    getAllPages: jest.fn(),
 }));
 
 
@@ -85,17 +86,18 @@ describe('FriendsContext', () => {
 
         getDownloadURL.mockResolvedValue('https://example.com/avatar.png');
         authService.getAuthenticatedRequest.mockResolvedValue(mockRequestData);
+        authService.getAllPages.mockResolvedValue(mockRequestData);
     });
     afterEach(() => {
         jest.restoreAllMocks(); // ✅ Restores all spies/mocks to their original behavior
     }); 
 
     test('should correctly fetch and render friends data', async () => {
-        // Mocking the API call to return friends data
-        getAuthenticatedRequest.mockResolvedValueOnce([
+        // Mocking the API call to return friends data, every page of it
+        authService.getAllPages.mockImplementation(async (url) => url === "/get_friends/" ? [
             { id: 1, username: 'john_doe', name: 'John Doe' },
             { id: 2, username: 'jane_doe', name: 'Jane Doe' },
-        ]);
+        ] : []);
 
         render(
             <FriendsProvider>
@@ -111,6 +113,7 @@ describe('FriendsContext', () => {
             expect(screen.getByText('John Doe')).toBeInTheDocument();
             expect(screen.getByText('Jane Doe')).toBeInTheDocument();
         });
+        expect(authService.getAllPages).toHaveBeenCalledWith("/get_friends/");
     });
 
     test('should use default avatar if image fetch fails', async () => {
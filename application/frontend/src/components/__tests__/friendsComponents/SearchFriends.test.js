@@ -6,7 +6,7 @@ import * as authService from "../../../utils/authService";
 import { getDownloadURL } from 'firebase/storage';
 
 jest.mock('../../../utils/authService', () => ({
-    getAuthenticatedRequest: jest.fn(),
+    getPage: jest.fn(),
 }));
 
 jest.mock('firebase/storage');
@@ -55,7 +55,7 @@ describe("SearchFriends Component", () => {
         jest.spyOn(window, 'alert').mockImplementation(() => { });
 
         getDownloadURL.mockResolvedValue('https://example.com/avatar.png');
-        authService.getAuthenticatedRequest.mockResolvedValue(mockRequestData);
+        authService.getPage.mockResolvedValue({ data: mockRequestData, next: null });
     });
     afterEach(() => {
         jest.restoreAllMocks(); // ✅ Restores all spies/mocks to their original behavior
@@ -75,7 +75,7 @@ describe("SearchFriends Component", () => {
         });
 
         await waitFor(() => {
-            expect(authService.getAuthenticatedRequest).toHaveBeenCalledWith("/find_friend/?q=Sam");
+            expect(authService.getPage).toHaveBeenCalledWith("/find_friend/?q=Sam");
             expect(screen.getByText("Sam Smith (sam_smith)")).toBeInTheDocument();
             expect(screen.getByRole("img")).toHaveAttribute("src", "https://example.com/avatar.png");
         });
@@ -216,4 +216,22 @@ describe("SearchFriends Component", () => {
 
 
 
+    test("loads the next page of results", async () => {
+        authService.getPage
+            .mockResolvedValueOnce({ data: mockRequestData, next: "http://127.0.0.1:8000/api/find_friend/?q=Sam&cursor=MQ" })
+            .mockResolvedValueOnce({ data: [{ id: 4, name: "Sam", surname: "Jones", username: "sam_jones" }], next: null });
+        renderWithContext();
+
+        fireEvent.change(screen.getByPlaceholderText("Add new friends..."), {
+            target: { value: "Sam" },
+        });
+        fireEvent.click(await screen.findByText("More results"));
+
+        await waitFor(() => {
+            expect(authService.getPage).toHaveBeenCalledWith("http://127.0.0.1:8000/api/find_friend/?q=Sam&cursor=MQ");
+            expect(screen.getByText("Sam Smith (sam_smith)")).toBeInTheDocument();
+            expect(screen.getByText("Sam Jones (sam_jones)")).toBeInTheDocument();
+            expect(screen.queryByText("More results")).not.toBeInTheDocument();
+        });
+    });
 });
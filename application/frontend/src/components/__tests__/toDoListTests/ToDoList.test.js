@@ -235,17 +235,6 @@ describe("ToDoList", () => {
         });
     });
 
-    const newList = [
-        {
-            id: 1,
-            name: "List 1",
-            tasks: [
-                { id: 1, title: "Task 1", content: "Task 1 details", is_completed: false },
-                { id: 2, title: "Task 2", content: "Task 2 details", is_completed: true },
-            ],
-        },
-    ];
-    
     test("delete list", async () => {
 
         authService.getAuthenticatedRequest.mockResolvedValueOnce(mockListsData); // Initial state
@@ -256,7 +245,7 @@ describe("ToDoList", () => {
         expect(screen.getByText("List 1")).toBeInTheDocument(); // Ensure list is displayed
         expect(screen.getByText("Task 1")).toBeInTheDocument(); // Ensure Task 1 is present
 
-        authService.getAuthenticatedRequest.mockResolvedValueOnce(newList); // Updated data after deletion
+        authService.getAuthenticatedRequest.mockResolvedValueOnce({ listId: 2 }); // Id of the deleted list
 
         const deleteListButton = screen.getAllByRole("button", { hidden: true }).find(button => {
             return button.classList.contains("btn-danger") && button.querySelector("i.bi-trash"); // Identify the delete list button
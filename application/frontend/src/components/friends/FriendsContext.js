@@ -1,6 +1,6 @@
 import React, { useContext } from "react";
 import { createContext, useState, useEffect } from "react";
-import { getAuthenticatedRequest } from "../../utils/authService";
+import { getAllPages, getAuthenticatedRequest } from "../../utils/authService";
 import defaultAvatar from '../../assets/avatars/avatar_2.png';
 import { storage } from "../../firebase-config";
 import { ref, getDownloadURL, uploadBytes } from "firebase/storage";
@@ -23,9 +23,10 @@ export const FriendsProvider = ({ children }) => {
     const fetchData = async (userId = null) => {
         setLoading(true);
         try {
-            const requestsData = await getAuthenticatedRequest("/get_pending_friends/");
-            const invitationsData = await getAuthenticatedRequest("/get_made_requests/");
-            const friendsData = await getAuthenticatedRequest("/get_friends/");
+            // These lists are paginated, every page is fetched
+            const requestsData = await getAllPages("/get_pending_friends/");
+            const invitationsData = await getAllPages("/get_made_requests/");
+            const friendsData = await getAllPages("/get_friends/");
 
             // Set invitations and requests without images initially
             setInvitations(invitationsData);
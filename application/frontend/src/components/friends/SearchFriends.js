@@ -2,7 +2,7 @@ import React, { useContext, useEffect, useState } from "react";
 import { FriendsContext } from "./FriendsContext";
 import "../../styles/friends/SearchFriends.css";
 import "../../styles/friends/PendingFriends.css";
-import { getAuthenticatedRequest } from "../../utils/authService";
+import { getPage } from "../../utils/authService";
 
 import defaultAvatar from '../../assets/avatars/avatar_2.png';
 import { storage } from "../../firebase-config";
@@ -13,27 +13,29 @@ const SearchFriends = () => {
 
     const [search, setSearch] = useState("");
     const [result, setResult] = useState([]);
+    // URL of the next page of results, null when there are no more
+    const [next, setNext] = useState(null);
 
     const handleChange = (event) => {
         setSearch(event.target.value);
     };
 
+    // Process friendsData with images
+    const withImages = (friendsData) => Promise.all(
+        friendsData.map(async (friend) => {
+            const imageRef = ref(storage, `avatars/${friend.username}`);
+            const imageUrl = await getDownloadURL(imageRef).catch(() => defaultAvatar); // Default if not found
+            return { ...friend, image: imageUrl }; // Add profileImage to friend object
+        })
+    );
+
     useEffect(() => {
         if (search.length > 2) {
             const fetchData = async () => {
                 try {
-                    const friendsData = await getAuthenticatedRequest(`/find_friend/?q=${search}`);
-
-                    // Process friendsData with images
-                    const friendsWithImages = await Promise.all(
-                        friendsData.map(async (friend) => {
-                            const imageRef = ref(storage, `avatars/${friend.username}`);
-                            const imageUrl = await getDownloadURL(imageRef).catch(() => defaultAvatar); // Default if not found
-                            return { ...friend, image: imageUrl }; // Add profileImage to friend object
-                        })
-                    );
-
-                    setResult(friendsWithImages); // Set state with updated friends
+                    const page = await getPage(`/find_friend/?q=${search}`);
+                    setResult(await withImages(page.data)); // Set state with updated friends
+                    setNext(page.next);
                 } catch (error) {
                     console.error("Error fetching friends:", error);
                 }
@@ -42,9 +44,21 @@ const SearchFriends = () => {
             fetchData();
         } else {
             setResult([]); // Clear the result if search length is less than or equal to 2
+            setNext(null);
         }
     }, [search]);
 
+    const loadMore = async () => {
+        try {
+            const page = await getPage(next);
+            const more = await withImages(page.data);
+            setResult(prev => [...prev, ...more]);
+            setNext(page.next);
+        } catch (error) {
+            console.error("Error fetching friends:", error);
+        }
+    };
+
     if (loading) return <div className="loading">Loading Friends...</div>;
 
     return (
@@ -102,6 +116,9 @@ const SearchFriends = () => {
                     </li>
                 ))}
             </ul>
+            {next && (
+                <button className="btn btn-secondary btn-sm" onClick={loadMore}>More results</button>
+            )}
         </div>
     );
 };
@@ -116,12 +116,28 @@ function GroupStudyPage() {
     }
 
     const ws = new WebSocket(`ws://localhost:8000/ws/room/${finalRoomCode}/`);
+    // Version of the participants list we last applied for this connection
+    let rosterVersion = null;
+    // Heartbeats keep us in the room, the server closes connections that stop sending them
+    let heartbeat = null;
+    // Who is typing, per server worker: each worker only reports its own connections
+    const typingByWorker = {};
 
     //Logs when connection is established
     ws.onopen = () => {
       console.log("Connected to Websocket");
       setSocket(ws);
       console.log("socket", ws);
+      // The token tells the server who we are, so the participants list follows our connection.
+      // It goes in the first message rather than the URL, which ends up in server logs
+      const token = localStorage.getItem("access_token");
+      if (token) {
+        ws.send(JSON.stringify({ type: "authenticate", token }));
+      }
+      ws.send(JSON.stringify({ type: "heartbeat" }));
+      heartbeat = setInterval(() => {
+        ws.send(JSON.stringify({ type: "heartbeat" }));
+      }, 10000);
     };
 
     //Handles incoming messages.
@@ -137,10 +153,10 @@ function GroupStudyPage() {
           { sender: data.sender, text: data.message },
         ]);
       }
-      if (data.type === "participants_update") {
+      if (data.type === "roster_sync") {
         console.log("Re-rendering the participants on the page...");
-        // Update the participants list
-        // Update the participants list
+        // Full participants list, sent on connect or when we asked for it
+        rosterVersion = data.version;
         const updatedParticipants = await Promise.all(
           data.participants.map(async (username) => {
             const imageUrl = await fetchParticipantData(username);
@@ -148,19 +164,47 @@ function GroupStudyPage() {
           })
         );
         setParticipants(updatedParticipants);
-      } else if (data.type === "typing") {
-        setTypingUser(data.sender);
-
-        // Remove "typing" message after 3 seconds
-        setTimeout(() => {
-          setTypingUser("");
-        }, 3000);
+      } else if (
+        data.type === "participant_joined" ||
+        data.type === "participant_left"
+      ) {
+        // Deltas must arrive in version order, older ones are already in our list
+        if (rosterVersion !== null && data.version <= rosterVersion) return;
+        if (rosterVersion === null || data.version !== rosterVersion + 1) {
+          // We missed an update, ask the server for the full list
+          ws.send(JSON.stringify({ type: "roster_sync" }));
+          return;
+        }
+        rosterVersion = data.version;
+        if (data.type === "participant_left") {
+          setParticipants((prev) =>
+            prev.filter((p) => !data.usernames.includes(p.username))
+          );
+        } else {
+          const joined = await Promise.all(
+            data.usernames.map(async (username) => {
+              const imageUrl = await fetchParticipantData(username);
+              return { username, imageUrl };
+            })
+          );
+          setParticipants((prev) => [
+            ...prev.filter((p) => !data.usernames.includes(p.username)),
+            ...joined,
+          ]);
+        }
+      } else if (data.type === "typing_batch") {
+        // Everyone typing through one server worker, the server expires idle typists
+        typingByWorker[data.worker] = data.senders;
+        const typing = new Set(Object.values(typingByWorker).flat());
+        typing.delete(username);
+        setTypingUser([...typing].join(", "));
       }
     };
 
     //Logs when the connection is closed
     ws.onclose = () => {
       console.log("Disconnected from WebSocket");
+      clearInterval(heartbeat);
       if (shouldReconnect) {
         console.log("Reconnecting");
         setTimeout(connectWebSocket, 1000); // Attempt to reconnect after 1 seconds
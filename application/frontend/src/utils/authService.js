@@ -48,8 +48,8 @@ export const refreshToken = async () => {
 };
 
 
-// Function to get an authenticated request
-export const getAuthenticatedRequest = async (url, method = "GET", data = null) => {
+// Sends an authenticated request to an absolute URL and returns the whole axios response
+const authenticatedResponse = async (fullUrl, method = "GET", data = null) => {
     let token = getAccessToken();
 
     if (!token || isTokenExpired(token)) {
@@ -59,16 +59,47 @@ export const getAuthenticatedRequest = async (url, method = "GET", data = null)
 
     try {
         const headers = { Authorization: `Bearer ${token}` };
-        const config = { method, url: `${API_BASE_URL}${url}`, headers, data };
-        console.log(`${API_BASE_URL}${url}`)
+        const config = { method, url: fullUrl, headers, data };
+        console.log(fullUrl)
 
-        const response = await axios(config);
-        return response.data;
+        return await axios(config);
     } catch (error) {
-        console.error(`Error making authenticated request to ${url}:`, error);
+        console.error(`Error making authenticated request to ${fullUrl}:`, error);
         if (error.response && error.response.status === 401) {
             logoutUser();
         }
         throw error;
     }
+};
+
+// Function to get an authenticated request
+export const getAuthenticatedRequest = async (url, method = "GET", data = null) => {
+    const response = await authenticatedResponse(`${API_BASE_URL}${url}`, method, data);
+    return response.data;
+};
+
+// The URL in a Link: <url>; rel="next" header, or null on the last page
+const nextPageUrl = (link) => {
+    const match = link && link.match(/<([^>]+)>;\s*rel="next"/);
+    return match ? match[1] : null;
+};
+
+// One page of a paginated list: { data, next } where next is the URL of the next page or null.
+// Pass the next URL back in to get the following page.
+export const getPage = async (urlOrNext) => {
+    const fullUrl = urlOrNext.startsWith("http") ? urlOrNext : `${API_BASE_URL}${urlOrNext}`;
+    const response = await authenticatedResponse(fullUrl);
+    return { data: response.data, next: nextPageUrl(response.headers.link) };
+};
+
+// Every row of a paginated list, following the next page links
+export const getAllPages = async (url) => {
+    const rows = [];
+    let next = url;
+    while (next) {
+        const page = await getPage(next);
+        rows.push(...page.data);
+        next = page.next;
+    }
+    return rows;
 };
\ No newline at end of file